@@ -7,6 +7,10 @@ except Exception:
     CORS = None
 
 from .src.config import Config
+from .src.jobs import JOB_POOL
+from .src.metrics import EXPORTER, METRICS
+from .src.registry import SERVICES
+from .src import warmup
 from .routes.health import bp as health_bp
 from .routes.playlists import bp as playlists_bp
 from .routes.catalog import bp as catalog_bp
@@ -21,14 +25,27 @@ def create_app():
         origins = Config.CORS_ORIGINS if hasattr(Config, 'CORS_ORIGINS') else '*'
         CORS(app, resources={r"/*": {"origins": origins}}, supports_credentials=True)
 
+    # Servicios de larga vida del worker, construidos una sola vez
+    app.extensions["services"] = SERVICES
+
     app.register_blueprint(health_bp)
     app.register_blueprint(playlists_bp, url_prefix="/playlists")
     app.register_blueprint(catalog_bp, url_prefix="/catalog")
     app.register_blueprint(auth_bp, url_prefix="/auth")
 
+    # Workers de la cola de trabajos (creación asíncrona de playlists), uno por proceso
+    if JOB_POOL is not None:
+        JOB_POOL.start()
+    # Volcado periódico de métricas al almacén compartido entre workers
+    EXPORTER.start()
+
     # Logging simple de todas las peticiones entrantes
     logging.basicConfig(level=logging.DEBUG if getattr(Config, 'DEBUG', True) else logging.INFO)
 
+    # Warm-up antes de aceptar tráfico: tokens, conexiones y almacenes locales listos
+    # (sin --preload en gunicorn, cada worker ejecuta create_app y se calienta a sí mismo)
+    app.extensions["warmup"] = warmup.run(warmup.configured_steps()) if Config.WARMUP_ENABLED else None
+
     @app.before_request
     def _log_start():
         g._start_time = time.time()
@@ -38,6 +55,10 @@ def create_app():
         try:
             started = getattr(g, '_start_time', None)
             dur_ms = int((time.time() - started) * 1000) if started else -1
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            METRICS.inc("moodtune_http_requests_total", {"route": route, "method": request.method, "status": resp.status_code})
+            if started:
+                METRICS.observe("moodtune_http_request_duration_seconds", time.time() - started, {"route": route, "method": request.method})
             logging.info(
                 "%s %s -> %s (%d ms) ip=%s",
                 request.method,
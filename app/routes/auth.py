@@ -3,18 +3,19 @@ import os
 import secrets
 import hashlib
 import base64
-import time
-from typing import Dict, Tuple, Optional
+from typing import Tuple, Optional
 
 import requests
 from flask import Blueprint, jsonify, request
 
 from ..src.config import Config
+from ..src.state_store import build_state_store
+from ..src.transport import TRANSPORT
 
 
 bp = Blueprint("auth", __name__)
 
-PKCE_STORE: Dict[str, Tuple[str, float, Optional[str]]] = {}  # state -> (verifier, expires_at, callback_url)
+PKCE_STORE = build_state_store()  # state -> {verifier, callback_url}, compartido entre workers
 PKCE_TTL_SECONDS = 600  # 10 minutos
 
 
@@ -28,22 +29,14 @@ def _code_challenge(verifier: str) -> str:
 
 
 def _remember_state(state: str, verifier: str, callback_url: Optional[str] = None) -> None:
-    now = time.time()
-    # Limpieza simple
-    expired = [k for k, (_, exp, _) in PKCE_STORE.items() if exp < now]
-    for key in expired:
-        PKCE_STORE.pop(key, None)
-    PKCE_STORE[state] = (verifier, now + PKCE_TTL_SECONDS, callback_url)
+    PKCE_STORE.put(state, {"verifier": verifier, "callback_url": callback_url}, PKCE_TTL_SECONDS)
 
 
 def _pop_state_data(state: str) -> Optional[Tuple[str, Optional[str]]]:
-    item = PKCE_STORE.pop(state, None)
+    item = PKCE_STORE.pop(state)
     if not item:
         return None
-    verifier, expires_at, callback_url = item
-    if time.time() > expires_at:
-        return None
-    return (verifier, callback_url)
+    return (item.get("verifier"), item.get("callback_url"))
 
 
 @bp.get("/amazon")
@@ -125,7 +118,7 @@ def spotify_callback():
     print(f"  Received state: {state} (length: {len(state) if state else 0})")
     print(f"  Received code: {code[:20] if code else None}...")
     print(f"  Received error: {error}")
-    print(f"  PKCE_STORE keys: {list(PKCE_STORE.keys())}")
+    print(f"  PKCE_STORE backend: {type(PKCE_STORE).__name__}")
     print("=" * 80)
 
     # Default frontend callback URL
@@ -167,7 +160,7 @@ def spotify_callback():
     if Config.SPOTIFY_CLIENT_SECRET:
         auth = (Config.SPOTIFY_CLIENT_ID, Config.SPOTIFY_CLIENT_SECRET)
     try:
-        resp = requests.post("https://accounts.spotify.com/api/token", data=data, auth=auth, timeout=20)
+        resp = TRANSPORT.post("https://accounts.spotify.com/api/token", data=data, auth=auth)
         if resp.status_code >= 500:
             return flask_redirect(f"{frontend_callback}?error=spotify_server_error")
         resp.raise_for_status()
@@ -215,7 +208,7 @@ def spotify_refresh():
         auth = (Config.SPOTIFY_CLIENT_ID, Config.SPOTIFY_CLIENT_SECRET)
 
     try:
-        resp = requests.post("https://accounts.spotify.com/api/token", data=data, auth=auth, timeout=20)
+        resp = TRANSPORT.post("https://accounts.spotify.com/api/token", data=data, auth=auth)
         if resp.status_code >= 500:
             return jsonify({"error": "Spotify token endpoint error", "detail": resp.text}), 502
         resp.raise_for_status()
@@ -4,14 +4,26 @@ Estos endpoints encapsulan la lógica de conexión a Spotify para que otros
 servicios (p. ej., moodtune_rag) no dependan directamente de la API de Spotify.
 """
 
-from flask import Blueprint, jsonify, request
-from typing import List, Dict, Any, Optional
-
-from ..src.services.amazon_music_service import AmazonMusicService
-from ..src.services.spotify_service import SpotifyService
-from ..src.services.itunes_service import ItunesService
+import json
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from typing import Iterator, List, Dict, Any, Optional, Tuple
+
+from ..src.batch import Outcome, arun_bounded, iter_bounded, run_bounded
+from ..src.catalog_index import CATALOG_INDEX
+from ..src.circuit import CircuitOpenError
+from ..src.ratelimit import RateLimited
+from ..src.registry import SERVICES
+from ..src.services.base import ServiceProvider, UpstreamError
+from ..src.emotion_ranking import rank_by_emotion
 from ..src.emotions import EMOTION_PARAMS
+from ..src.feature_store import FEATURE_STORE
 from ..src.config import Config
+from ..src.matching import match_key
+from ..src.resolver import aresolve_multi, aresolve_normalized, catalog_service, resolve_normalized, resolve_options
+from ..src.transport import run_async
+from ..src.utils import NDJSON_MIMETYPE, ndjson, wants_ndjson
+from .errors import upstream_failed
 
 
 bp = Blueprint("catalog", __name__)
@@ -21,6 +33,11 @@ def _emotion_params(emotion: str) -> Dict[str, tuple[float, float]]:
     return EMOTION_PARAMS.get(emotion.lower(), {"valence": (0.4, 0.6), "energy": (0.4, 0.6)})
 
 
+def _features_service(provider: Optional[str]) -> ServiceProvider:
+    provider_name = (provider or Config.DEFAULT_PROVIDER or "spotify").lower()
+    return SERVICES.catalog("amazon_music" if provider_name == "amazon_music" else "spotify")
+
+
 @bp.post("/audio-features")
 def audio_features():
     try:
@@ -28,126 +45,118 @@ def audio_features():
         ids: List[str] = p.get("ids") or []
         if not ids:
             return jsonify({"error": "ids requerido"}), 400
-        provider_name = (p.get("provider") or Config.DEFAULT_PROVIDER or "spotify").lower()
-        if provider_name == "amazon_music":
-            svc = AmazonMusicService()
-        else:
-            svc = SpotifyService()
-        feats = svc.audio_features(ids)
+        svc = _features_service(p.get("provider"))
+        feats = run_async(svc.aaudio_features(ids)) if _use_async(p) else svc.audio_features(ids)
         # devolver solo campos de interés
         data = {k: {"valence": v.get("valence"), "energy": v.get("energy")} for k, v in feats.items()}
         return jsonify({"items": data}), 200
+    except (UpstreamError, RateLimited, CircuitOpenError) as e:
+        return upstream_failed(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@bp.post("/rank")
+def rank_by_emotion_route():
+    """Filtra y rankea pistas candidatas según los rangos valence/energy de una emoción.
+
+    Body: { ids: [str], emotion: str, top_k?: int, strict?: bool, provider?: str }
+    Respuesta: { emotion, params, items: [ { id, valence, energy, distance, score, in_range } ], candidates, returned }
+    """
+    try:
+        p = request.get_json(force=True) or {}
+        ids: List[str] = p.get("ids") or []
+        emotion = (p.get("emotion") or "").strip()
+        if not ids or not emotion:
+            return jsonify({"error": "ids y emotion requeridos"}), 400
+        top_k = int(p.get("top_k") or 20)
+        strict = p.get("strict", True) is not False
+        params = _emotion_params(emotion)
+        svc = _features_service(p.get("provider"))
+        feats = run_async(svc.aaudio_features(ids)) if _use_async(p) else svc.audio_features(ids)
+        items = rank_by_emotion(ids, feats, params, top_k=top_k, strict=strict)
+        return jsonify({
+            "emotion": emotion.lower(),
+            "params": params,
+            "items": items,
+            "candidates": len(ids),
+            "returned": len(items),
+        }), 200
+    except (UpstreamError, RateLimited, CircuitOpenError) as e:
+        return upstream_failed(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@bp.post("/audio-features/preload")
+def audio_features_preload():
+    """Precarga masiva del FeatureStore desde un volcado offline.
+
+    Body JSON: { provider?: str, items: [{ id, valence, energy, ... }] }
+    o bien NDJSON (``Content-Type: application/x-ndjson``), un registro por línea.
+    """
+    try:
+        if FEATURE_STORE is None:
+            return jsonify({"error": "FEATURE_STORE_PATH no configurado"}), 400
+        provider_name = (request.args.get("provider") or "spotify").lower()
+        if request.mimetype == NDJSON_MIMETYPE:
+            lines = request.get_data(as_text=True).splitlines()
+            records = (json.loads(line) for line in lines if line.strip())
+        else:
+            p = request.get_json(force=True) or {}
+            provider_name = (p.get("provider") or provider_name).lower()
+            records = p.get("items") or []
+        loaded = FEATURE_STORE.preload(provider_name, records)
+        return jsonify({"provider": provider_name, "loaded": loaded}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@bp.post("/index/import")
+def catalog_index_import():
+    """Importación masiva al índice local del catálogo.
+
+    Body JSON: { provider?: str, region?: str, items: [{ external_id|id, title, artist, uri?, image_url?, ... }] }
+    o bien NDJSON (``Content-Type: application/x-ndjson``), un track por línea;
+    cada registro puede traer su propio ``provider`` y ``region`` (mercado/país).
+    Sin región, el track se devuelve en cualquier mercado.
+    """
+    try:
+        if CATALOG_INDEX is None:
+            return jsonify({"error": "CATALOG_INDEX_PATH no configurado"}), 400
+        provider_name = (request.args.get("provider") or Config.DEFAULT_PROVIDER or "spotify").lower()
+        region = request.args.get("region")
+        if request.mimetype == NDJSON_MIMETYPE:
+            lines = request.get_data(as_text=True).splitlines()
+            records = (json.loads(line) for line in lines if line.strip())
+        else:
+            p = request.get_json(force=True) or {}
+            provider_name = (p.get("provider") or provider_name).lower()
+            region = p.get("region") or region
+            records = p.get("items") or []
+        loaded = CATALOG_INDEX.import_records(provider_name, records, region=region)
+        return jsonify({"provider": provider_name, "loaded": loaded}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
 
-def _normalize_itunes_result(it: Dict[str, Any]) -> Dict[str, Any]:
-    track_id = it.get("trackId")
-    return {
-        "id": f"itunes-{track_id}" if track_id else None,
-        "external_id": str(track_id) if track_id else None,
-        "provider": "itunes",
-        "source": "itunes_search",
-        "title": it.get("trackName"),
-        "artist": it.get("artistName"),
-        "uri": it.get("trackViewUrl") or (f"itunes:track:{track_id}" if track_id else None),
-        "preview_url": it.get("previewUrl"),
-        "artworkUrl100": it.get("artworkUrl100"),
-        "image_url": it.get("artworkUrl100"),
-        "thumbnail_url": it.get("artworkUrl60") or it.get("artworkUrl100"),
-    }
-
-def _normalize_spotify_result(t: Dict[str, Any]) -> Dict[str, Any]:
-    track_id = t.get("id")
-    images = ((t.get("album") or {}).get("images") or [])
-    image_url = images[0].get("url") if images else None
-    thumb_url = images[-1].get("url") if images else image_url
-    artists = t.get("artists") or []
-    first_artist = artists[0].get("name") if artists else None
-    return {
-        "id": f"spotify-{track_id}" if track_id else None,
-        "external_id": track_id,
-        "provider": "spotify",
-        "source": "spotify_search",
-        "title": t.get("name"),
-        "artist": first_artist,
-        "uri": t.get("uri"),
-        "preview_url": t.get("preview_url"),
-        "image_url": image_url,
-        "thumbnail_url": thumb_url,
-    }
-
-
-def _first_value(item: Optional[Dict[str, Any]], *keys: str) -> Optional[str]:
-    if not item:
-        return None
-    for key in keys:
-        value = item.get(key)
-        if value is None:
-            continue
-        if isinstance(value, str):
-            cleaned = value.strip()
-            if cleaned:
-                return cleaned
-            continue
-        return value
-    return None
-
-
-def _extract_artist_name(item: Dict[str, Any]) -> Optional[str]:
-    artists = item.get("artists") or item.get("artist") or item.get("primary_artist")
-    if isinstance(artists, list):
-        for artist in artists:
-            if isinstance(artist, dict):
-                name = _first_value(
-                    artist, "name", "artistName", "artist", "primaryArtist"
-                )
-                if name:
-                    return name
-            elif isinstance(artist, str):
-                return artist.strip() or None
-    if isinstance(artists, dict):
-        return _first_value(artists, "name", "artistName", "artist", "primaryArtist")
-    return _first_value(item, "artist", "artistName", "artist_name", "primaryArtist")
-
-
-def _extract_image_urls(item: Dict[str, Any]) -> tuple[Optional[str], Optional[str]]:
-    candidates = item.get("images") or item.get("image") or item.get("artwork")
-    if isinstance(candidates, dict):
-        return (
-            _first_value(candidates, "url", "uri"),
-            _first_value(candidates, "thumbnail", "url", "uri"),
-        )
-    if isinstance(candidates, list):
-        def _url(entry: Any) -> Optional[str]:
-            if isinstance(entry, dict):
-                return _first_value(entry, "url", "uri", "thumbnail")
-            if isinstance(entry, str):
-                return entry.strip() or None
-            return None
-        first = candidates[0] if candidates else None
-        last = candidates[-1] if candidates else first
-        return _url(first), _url(last)
-    return None, None
-
-
-def _normalize_amazon_result(item: Dict[str, Any]) -> Dict[str, Any]:
-    track_id = _first_value(item, "id", "asin", "trackId", "track_id", "itemId")
-    image_url, thumb_url = _extract_image_urls(item)
-    return {
-        "id": f"amazon_music-{track_id}" if track_id else None,
-        "external_id": str(track_id) if track_id is not None else None,
-        "provider": "amazon_music",
-        "source": "amazon_music_search",
-        "title": _first_value(item, "title", "name", "trackName"),
-        "artist": _extract_artist_name(item),
-        "uri": _first_value(item, "uri", "url", "permalink", "link", "trackUrl"),
-        "preview_url": _first_value(
-            item, "preview_url", "previewUrl", "preview", "sampleUrl"
-        ),
-        "image_url": image_url,
-        "thumbnail_url": thumb_url or image_url,
-    }
+@bp.get("/index/export")
+def catalog_index_export():
+    """Exporta el índice local del catálogo como NDJSON (``?provider=`` opcional)."""
+    if CATALOG_INDEX is None:
+        return jsonify({"error": "CATALOG_INDEX_PATH no configurado"}), 400
+    provider_name = request.args.get("provider")
+    return Response(ndjson(CATALOG_INDEX.export(provider_name)), mimetype=NDJSON_MIMETYPE)
+
+
+@bp.get("/audio-features/export")
+def audio_features_export():
+    """Exporta el FeatureStore como NDJSON (``?provider=`` opcional)."""
+    if FEATURE_STORE is None:
+        return jsonify({"error": "FEATURE_STORE_PATH no configurado"}), 400
+    provider_name = request.args.get("provider")
+    return Response(ndjson(FEATURE_STORE.export(provider_name)), mimetype=NDJSON_MIMETYPE)
+
 
 @bp.post("/search-itunes")
 def search_itunes_route():
@@ -163,8 +172,10 @@ def search_itunes_route():
         limit = int(p.get("limit") or 1)
         if not title or not artist:
             return jsonify({"error": "title y artist requeridos"}), 400
-        items = ItunesService().search_tracks(title, artist, limit=max(1, min(limit, 5)))
+        items = SERVICES.catalog("itunes").search_tracks(title, artist, limit=max(1, min(limit, 5)))
         return jsonify({"items": items, "returned": len(items)}), 200
+    except (UpstreamError, RateLimited, CircuitOpenError) as e:
+        return upstream_failed(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -182,9 +193,11 @@ def search_spotify_route():
         limit = int(p.get("limit") or 1)
         if not title or not artist:
             return jsonify({"error": "title y artist requeridos"}), 400
-        svc = SpotifyService()
+        svc = SERVICES.catalog("spotify")
         items = svc.search_tracks(title, artist, limit=max(1, min(limit, 5)))
         return jsonify({"items": items, "returned": len(items)}), 200
+    except (UpstreamError, RateLimited, CircuitOpenError) as e:
+        return upstream_failed(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -199,9 +212,11 @@ def search_amazon_route():
         limit = int(p.get("limit") or 1)
         if not title or not artist:
             return jsonify({"error": "title y artist requeridos"}), 400
-        svc = AmazonMusicService()
+        svc = SERVICES.catalog("amazon_music")
         items = svc.search_tracks(title, artist, limit=max(1, min(limit, 5)))
         return jsonify({"items": items, "returned": len(items)}), 200
+    except (UpstreamError, RateLimited, CircuitOpenError) as e:
+        return upstream_failed(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -225,12 +240,28 @@ def emotion_params(emotion: str):
         return jsonify({"error": str(e)}), 400
 
 
+def _use_async(p: Dict[str, Any]) -> bool:
+    """Camino asíncrono (httpx + asyncio) si el body trae ``async`` o ``CATALOG_ASYNC`` está activo."""
+    flag = p.get("async")
+    return Config.CATALOG_ASYNC if flag is None else bool(flag)
+
+
 @bp.post("/resolve")
 def resolve_track_title_artist():
     """Resuelve título+artista a un objeto normalizado de track.
 
-    Body: { title: str, artist: str, limit?: int }
-    Respuesta: { items: [ { id, external_id, provider, source, title, artist, uri, preview_url, artworkUrl100, image_url, thumbnail_url } ] }
+    Se piden ``MATCH_CANDIDATES`` candidatos al proveedor, se puntúan contra la
+    consulta (``match_score``, ver ``matching``) y se devuelven los ``limit``
+    mejores con puntaje >= ``min_score`` (default ``MATCH_MIN_SCORE``).
+
+    Con ``mode: "race"`` se consultan en paralelo los proveedores de
+    ``providers`` (o ``RESOLVE_PROVIDERS``) y gana el primero con una
+    coincidencia confiable;
+    con ``mode: "hedge"`` se consulta el primero y se suma el siguiente si no
+    respondió en ``hedge_ms``. Las llamadas más lentas se cancelan.
+
+    Body: { title: str, artist: str, limit?: int, min_score?: float, async?: bool, mode?: "single"|"race"|"hedge", providers?: [str], hedge_ms?: int }
+    Respuesta: { items: [ { id, external_id, provider, source, title, artist, uri, preview_url, artworkUrl100, image_url, thumbnail_url, match_score } ], provider?, attempts? }
     """
     try:
         p = request.get_json(force=True) or {}
@@ -239,58 +270,112 @@ def resolve_track_title_artist():
         limit = int(p.get("limit") or 1)
         if not title or not artist:
             return jsonify({"error": "title y artist requeridos"}), 400
-        provider = Config.DEFAULT_PROVIDER
-        items: List[Dict[str, Any]] = []
-        if provider == "itunes":
-            raw = ItunesService().search_tracks(title, artist, limit=max(1, min(limit, 5)))
-            items = [_normalize_itunes_result(x) for x in (raw or [])]
-        elif provider == "amazon_music":
-            svc = AmazonMusicService()
-            raw_amz = svc.search_tracks(title, artist, limit=max(1, min(limit, 5)))
-            items = [_normalize_amazon_result(x) for x in (raw_amz or [])]
+        opts = resolve_options(p)
+        if opts["mode"] != "single":
+            resolved = run_async(aresolve_multi(title, artist, limit, opts))
+            return jsonify({**resolved, "returned": len(resolved["items"])}), 200
+        svc = catalog_service(Config.DEFAULT_PROVIDER)
+        if _use_async(p):
+            items = run_async(aresolve_normalized(svc, title, artist, limit, opts["min_score"]))
         else:
-            svc = SpotifyService()
-            raw_sp = svc.search_tracks(title, artist, limit=max(1, min(limit, 5)))
-            items = [_normalize_spotify_result(x) for x in (raw_sp or [])]
-        items = [i for i in items if (i.get("title") and i.get("artist"))]
+            items = resolve_normalized(svc, title, artist, limit, opts["min_score"])
         return jsonify({"items": items, "returned": len(items)}), 200
+    except (UpstreamError, RateLimited, CircuitOpenError) as e:
+        return upstream_failed(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
 
+def _batch_entry(idx: int, title: str, artist: str, outcome: Optional[Outcome]) -> Dict[str, Any]:
+    entry: Dict[str, Any] = {"index": idx, "title": title, "artist": artist, "items": []}
+    if outcome is not None:
+        if outcome.ok:
+            entry["items"] = outcome.value
+        else:
+            entry["error"] = outcome.error
+    return entry
+
+
 @bp.post("/resolve-batch")
 def resolve_batch():
     """Resuelve en lote una lista de {title, artist} a objetos normalizados.
 
-    Body: { items: [{ title, artist }...], per_item_limit?: int }
-    Respuesta: { items: [ { index, title, artist, items: [normalized...] } ], returned: number }
+    Los elementos se resuelven en paralelo (máximo ``RESOLVE_BATCH_CONCURRENCY``)
+    con un deadline por lote; los que fallan o no terminan a tiempo se devuelven
+    con ``items: []`` y ``error`` sin retrasar el resto. Con ``async`` (o
+    ``CATALOG_ASYNC``) el lote corre sobre asyncio y el límite es
+    ``RESOLVE_BATCH_ASYNC_CONCURRENCY``.
+
+    Con ``Accept: application/x-ndjson`` (o ``stream``) la respuesta es NDJSON:
+    una línea ``{"type": "item", ...}`` por elemento en cuanto se resuelve (en
+    orden de llegada, usar ``index``) y una línea final ``{"type": "done", ...}``.
+
+    ``mode``/``providers``/``hedge_ms``/``min_score`` aplican a cada elemento
+    igual que en ``/resolve``; cada item normalizado indica su ``provider``.
+    Los elementos con la misma clave normalizada (título+artista) se resuelven
+    una sola vez (``unique``) y comparten el resultado.
+
+    Body: { items: [{ title, artist }...], per_item_limit?: int, concurrency?: int, deadline_ms?: int, async?: bool, stream?: bool, mode?: str, providers?: [str], hedge_ms?: int, min_score?: float }
+    Respuesta: { items: [ { index, title, artist, items: [normalized...], error? } ], returned: number, unique: number, partial: bool }
     """
     try:
         p = request.get_json(force=True) or {}
         items_in: List[Dict[str, Any]] = p.get("items") or []
         per_item_limit = int(p.get("per_item_limit") or 1)
-        out: List[Dict[str, Any]] = []
-        provider = Config.DEFAULT_PROVIDER
-        for idx, it in enumerate(items_in):
-            title = (it.get("title") or "").strip()
-            artist = (it.get("artist") or "").strip()
-            if not title or not artist:
-                out.append({"index": idx, "title": title, "artist": artist, "items": []})
-                continue
-            if provider == "itunes":
-                raw = ItunesService().search_tracks(title, artist, limit=max(1, min(per_item_limit, 5)))
-                norm = [_normalize_itunes_result(x) for x in (raw or [])]
-            elif provider == "amazon_music":
-                svc = AmazonMusicService()
-                raw_amz = svc.search_tracks(title, artist, limit=max(1, min(per_item_limit, 5)))
-                norm = [_normalize_amazon_result(x) for x in (raw_amz or [])]
-            else:
-                svc = SpotifyService()
-                raw_sp = svc.search_tracks(title, artist, limit=max(1, min(per_item_limit, 5)))
-                norm = [_normalize_spotify_result(x) for x in (raw_sp or [])]
-            norm = [i for i in norm if (i.get("title") and i.get("artist"))]
-            out.append({"index": idx, "title": title, "artist": artist, "items": norm})
-        return jsonify({"items": out, "returned": len(out)}), 200
+        stream = wants_ndjson(request, p)
+        use_async = _use_async(p) and not stream
+        max_concurrency = Config.RESOLVE_BATCH_ASYNC_CONCURRENCY if use_async else Config.RESOLVE_BATCH_CONCURRENCY
+        concurrency = max(1, min(int(p.get("concurrency") or max_concurrency), max_concurrency))
+        deadline = Config.RESOLVE_BATCH_DEADLINE_SECONDS
+        if p.get("deadline_ms"):
+            deadline = min(deadline, int(p["deadline_ms"]) / 1000.0)
+
+        opts = resolve_options(p)
+        multi = opts["mode"] != "single"
+
+        pairs = [((it.get("title") or "").strip(), (it.get("artist") or "").strip()) for it in items_in]
+        # índice por clave normalizada: los duplicados del lote se resuelven una sola vez
+        groups: Dict[Tuple[str, str], List[int]] = {}
+        for idx, (title, artist) in enumerate(pairs):
+            if title and artist:
+                groups.setdefault(match_key(title, artist), []).append(idx)
+        members = {idxs[0]: idxs for idxs in groups.values()}
+        pending = list(members)
+        svc = catalog_service(Config.DEFAULT_PROVIDER) if pending and not multi else None
+
+        def _resolve(idx: int) -> List[Dict[str, Any]]:
+            title, artist = pairs[idx]
+            if multi:
+                return run_async(aresolve_multi(title, artist, per_item_limit, opts))["items"]
+            return resolve_normalized(svc, title, artist, per_item_limit, opts["min_score"])
+
+        async def _aresolve(idx: int) -> List[Dict[str, Any]]:
+            title, artist = pairs[idx]
+            if multi:
+                return (await aresolve_multi(title, artist, per_item_limit, opts))["items"]
+            return await aresolve_normalized(svc, title, artist, per_item_limit, opts["min_score"])
+
+        if stream:
+            def _records() -> Iterator[Dict[str, Any]]:
+                partial = False
+                for idx, (title, artist) in enumerate(pairs):
+                    if not (title and artist):
+                        yield {"type": "item", **_batch_entry(idx, title, artist, None)}
+                for outcome in iter_bounded(_resolve, pending, concurrency, deadline):
+                    partial = partial or not outcome.ok
+                    for idx in members[pending[outcome.index]]:
+                        yield {"type": "item", **_batch_entry(idx, *pairs[idx], outcome)}
+                yield {"type": "done", "returned": len(pairs), "unique": len(pending), "partial": partial}
+
+            return Response(stream_with_context(ndjson(_records())), mimetype=NDJSON_MIMETYPE)
+
+        if use_async:
+            results = run_async(arun_bounded(_aresolve, pending, concurrency, deadline))
+        else:
+            results = run_bounded(_resolve, pending, concurrency, deadline)
+        outcomes = {idx: outcome for first, outcome in zip(pending, results) for idx in members[first]}
+        out = [_batch_entry(idx, title, artist, outcomes.get(idx)) for idx, (title, artist) in enumerate(pairs)]
+        partial = any("error" in entry for entry in out)
+        return jsonify({"items": out, "returned": len(out), "unique": len(pending), "partial": partial}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
-
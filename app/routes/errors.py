@@ -0,0 +1,36 @@
+"""Respuestas de error compartidas por los blueprints.
+
+Los errores con momento de reintento conocido (circuito abierto, presupuesto
+agotado, escritura en curso) responden con ``Retry-After``.
+"""
+
+from typing import Any, Dict
+
+from flask import jsonify
+
+from ..src.circuit import CircuitOpenError
+from ..src.playlist_writer import PlaylistWriteBusy
+from ..src.ratelimit import RateLimited
+
+
+def retry_later(body: Dict[str, Any], status: int, retry_after: float):
+    resp = jsonify(body)
+    resp.headers["Retry-After"] = str(max(1, int(round(retry_after))))
+    return resp, status
+
+
+def upstream_failed(exc: Exception):
+    """Error del proveedor: 503/429 con ``Retry-After`` si se sabe cuándo reintentar, si no 502."""
+    if isinstance(exc, CircuitOpenError):
+        body = {"error": "Proveedor no disponible, reintenta más tarde", "detail": str(exc)}
+        return retry_later(body, 503, exc.retry_after)
+    if isinstance(exc, RateLimited):
+        body = {"error": "Proveedor saturado, reintenta más tarde", "detail": str(exc)}
+        return retry_later(body, 429, exc.retry_after)
+    return jsonify({"error": "Error del proveedor", "detail": str(exc)}), 502
+
+
+def write_busy(exc: PlaylistWriteBusy):
+    """409 con ``Retry-After`` cuando otro request está escribiendo la misma idempotency key."""
+    body = {"error": "La escritura con esta idempotency_key está en curso", "idempotency_key": exc.idempotency_key}
+    return retry_later(body, 409, exc.retry_after)
@@ -1,5 +1,16 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, Response, current_app, jsonify
+from ..src.cache import PLAYLIST_CACHE, RESOLVE_CACHE
+from ..src.catalog_index import CATALOG_INDEX
+from ..src.circuit import BREAKERS
 from ..src.config import Config
+from ..src.feature_store import FEATURE_STORE
+from ..src.jobs import JOB_POOL
+from ..src.metrics import CONTENT_TYPE, EXPORTER
+from ..src.microbatch import batchers_stats
+from ..src.ratelimit import SCHEDULER
+from ..src.registry import SERVICES
+from ..src.singleflight import FEATURES_FLIGHT, SEARCH_FLIGHT
+from ..src.transport import TRANSPORT
 
 
 bp = Blueprint("health", __name__)
@@ -11,5 +22,26 @@ def health():
         "status": "ok",
         "service": "moodtune_music",
         "debug": Config.DEBUG,
+        "http": TRANSPORT.stats(),
+        "rate_limits": SCHEDULER.stats(),
+        "circuits": BREAKERS.stats(),
+        "coalescing": {
+            "search": SEARCH_FLIGHT.stats(),
+            "audio_features": FEATURES_FLIGHT.stats(),
+        },
+        "microbatch": batchers_stats(),
+        "jobs": JOB_POOL.stats() if JOB_POOL else None,
+        "services": SERVICES.stats(),
+        "warmup": current_app.extensions.get("warmup"),
+        "caches": {
+            "resolve": RESOLVE_CACHE.stats(),
+            "playlists": PLAYLIST_CACHE.stats(),
+            "catalog_index": CATALOG_INDEX.stats() if CATALOG_INDEX else None,
+            "audio_features": FEATURE_STORE.stats() if FEATURE_STORE else None,
+        },
     }), 200
 
+
+@bp.get("/metrics")
+def metrics():
+    return Response(EXPORTER.exposition(), content_type=CONTENT_TYPE)
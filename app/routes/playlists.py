@@ -1,21 +1,24 @@
-from flask import Blueprint, jsonify, request
-from typing import List, Optional
+import hashlib
+from itertools import chain
 
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from typing import Any, Dict, Iterator, List, Optional
+
+from ..src.circuit import CircuitOpenError
 from ..src.config import Config
-from ..src.providers.spotify import SpotifyProvider
-from ..src.services.spotify_auth import SpotifyClientCredentials
-from ..src.services.amazon_music_service import AmazonClientCredentials
-from ..src.services.apple_music_token import AppleMusicStaticToken
+from ..src.jobs import JOB_POOL
+from ..src.playlist_writer import PlaylistWriteBusy, PlaylistWriteError, PlaylistWriter
+from ..src.ratelimit import RateLimited
+from ..src.registry import SERVICES
+from ..src.utils import NDJSON_MIMETYPE, ndjson, wants_ndjson
+from .errors import upstream_failed, write_busy
 
 
 bp = Blueprint("playlists", __name__)
 
 
 def _provider_client(name: str):
-    name = (name or Config.DEFAULT_PROVIDER).lower()
-    if name == "spotify":
-        return SpotifyProvider()
-    raise ValueError("Proveedor no soportado")
+    return SERVICES.playlists(name)
 
 def _resolve_provider_token(provider_name: str, override: Optional[str]) -> str:
     if override:
@@ -26,8 +29,7 @@ def _resolve_provider_token(provider_name: str, override: Optional[str]) -> str:
         if token:
             return token
         try:
-            auth = SpotifyClientCredentials()
-            return auth.token()
+            return SERVICES.credentials("spotify").token()
         except Exception as exc:
             raise ValueError(f"No fue posible obtener token de Spotify (configura SPOTIFY_USER_TOKEN o client credentials válidos): {exc}") from exc
     if name == "amazon_music":
@@ -35,13 +37,7 @@ def _resolve_provider_token(provider_name: str, override: Optional[str]) -> str:
         if token:
             return token
         try:
-            auth = AmazonClientCredentials(
-                client_id=Config.AMAZON_MUSIC_CLIENT_ID,
-                client_secret=Config.AMAZON_MUSIC_CLIENT_SECRET,
-                token_url=Config.AMAZON_MUSIC_TOKEN_URL,
-                scope=Config.AMAZON_MUSIC_TOKEN_SCOPE,
-            )
-            return auth.token()
+            return SERVICES.credentials("amazon_music").token()
         except Exception as exc:
             raise ValueError(f"No fue posible obtener token de Amazon Music (configura AMAZON_MUSIC_USER_TOKEN o client credentials válidos): {exc}") from exc
     if name == "apple_music":
@@ -49,30 +45,71 @@ def _resolve_provider_token(provider_name: str, override: Optional[str]) -> str:
         if token:
             return token
         try:
-            return AppleMusicStaticToken().token()
+            return SERVICES.credentials("apple_music").token()
         except Exception as exc:
             raise ValueError(f"APPLE_MUSIC_USER_TOKEN no configurado (o inválido): {exc}") from exc
     raise ValueError(f"Proveedor {provider_name} no soportado para autenticación gestionada")
 
-def _create_playlist_in_provider(provider_name: str, access_token: str, title: str, description: str, uris: List[str], provider_user_id: Optional[str] = None):
+def _create_playlist_in_provider(provider_name: str, access_token: str, title: str, description: str, uris: List[str], provider_user_id: Optional[str] = None, idempotency_key: Optional[str] = None, on_progress=None):
+    """Crea la playlist y agrega las pistas vía ``PlaylistWriter`` (chunks en paralelo, reanudable)."""
     provider = _provider_client(provider_name)
-    created = provider.create_playlist(access_token, title, description, provider_user_id=provider_user_id)
-    playlist_id = created.get("id") or created.get("uri", "").split(":")[-1]
-    if not playlist_id:
-        raise ValueError("No se pudo obtener ID de playlist del proveedor")
-
-    for i in range(0, len(uris), 100):
-        provider.add_tracks(access_token, playlist_id, uris[i:i+100])
-
-    deeplink = provider.make_deeplink(playlist_id)
-    return {
-        "provider": provider.name,
-        "external_playlist_id": playlist_id,
-        "deep_link_url": deeplink,
+    writer = PlaylistWriter(provider)
+    return writer.write(
+        access_token, title, description, uris,
+        provider_user_id=provider_user_id, idempotency_key=idempotency_key, on_progress=on_progress,
+    )
+
+
+def _idempotency_key(p: Dict[str, Any]) -> Optional[str]:
+    return request.headers.get("Idempotency-Key") or p.get("idempotency_key")
+
+
+PLAYLIST_JOB = "playlist.create"
+
+
+def _wants_async(p: Dict[str, Any]) -> bool:
+    """Modo job: ``async: true``, ``?async=1`` o ``Prefer: respond-async``."""
+    if p.get("async") is True or request.args.get("async", "").lower() in ("1", "true"):
+        return True
+    return "respond-async" in request.headers.get("Prefer", "")
+
+
+def _run_playlist_job(payload: Dict[str, Any], report, job_id: str) -> Dict[str, Any]:
+    access_token = _resolve_provider_token(payload["provider"], payload.get("provider_access_token"))
+    result = _create_playlist_in_provider(
+        payload["provider"], access_token, payload["title"], payload["description"], payload["uris"],
+        provider_user_id=payload.get("provider_user_id"),
+        # el job_id como key: si el worker muere, el reintento reanuda la misma playlist
+        idempotency_key=payload.get("idempotency_key") or job_id,
+        on_progress=report,
+    )
+    result.update(payload.get("extra") or {})
+    return result
+
+
+if JOB_POOL is not None:
+    JOB_POOL.register(PLAYLIST_JOB, _run_playlist_job)
+
+
+def _enqueue_playlist(p: Dict[str, Any], provider_name: str, title: str, description: str, uris: List[str], extra: Optional[Dict[str, Any]] = None):
+    if JOB_POOL is None:
+        raise ValueError("Modo asíncrono deshabilitado (JOB_QUEUE_PATH vacío)")
+    _provider_client(provider_name)
+    job_id = JOB_POOL.submit(PLAYLIST_JOB, {
+        "provider": provider_name,
+        "provider_user_id": p.get("provider_user_id"),
         "title": title,
         "description": description,
-        "tracks_added": len(uris),
-    }
+        "uris": uris,
+        "idempotency_key": _idempotency_key(p),
+        "extra": extra or {},
+    }, secrets={
+        # solo el token provisto por el cliente; el gestionado se obtiene en el worker
+        "provider_access_token": p.get("provider_access_token"),
+    })
+    resp = jsonify({"job_id": job_id, "status": "queued", "status_url": f"/playlists/jobs/{job_id}"})
+    resp.headers["Location"] = f"/playlists/jobs/{job_id}"
+    return resp, 202
 
 
 @bp.post("")
@@ -89,12 +126,24 @@ def create_playlist():
             return jsonify({"error": "title requerido"}), 400
         if not uris:
             return jsonify({"error": "uris requerido (lista de tracks)"}), 400
+        # en modo job el token gestionado se obtiene en el worker (ver _run_playlist_job)
+        if _wants_async(p):
+            return _enqueue_playlist(p, provider_name, title, description, uris)
         access_token = _resolve_provider_token(provider_name, provided_token)
 
-        payload = _create_playlist_in_provider(provider_name, access_token, title, description, uris, provider_user_id=p.get("provider_user_id"))
+        payload = _create_playlist_in_provider(
+            provider_name, access_token, title, description, uris,
+            provider_user_id=p.get("provider_user_id"), idempotency_key=_idempotency_key(p),
+        )
         return jsonify(payload), 201
     except ValueError as ve:
         return jsonify({"error": str(ve)}), 400
+    except (RateLimited, CircuitOpenError) as e:
+        return upstream_failed(e)
+    except PlaylistWriteBusy as busy:
+        return write_busy(busy)
+    except PlaylistWriteError as pw:
+        return jsonify({"error": "No se pudo completar la playlist", "detail": str(pw), **pw.as_dict()}), 502
     except Exception as e:
         return jsonify({"error": "No se pudo crear la playlist", "detail": str(e)}), 502
 
@@ -117,9 +166,15 @@ def create_playlist_for_moodtune():
             return jsonify({"error": "title requerido"}), 400
         if not uris:
             return jsonify({"error": "uris requerido (lista de tracks)"}), 400
+        if _wants_async(p):
+            extra = {"user_id": user_id, "inference_id": inference_id, "intention": intention, "emotion": emotion}
+            return _enqueue_playlist(p, provider_name, title, description, uris, extra)
         access_token = _resolve_provider_token(provider_name, p.get("provider_access_token"))
 
-        payload = _create_playlist_in_provider(provider_name, access_token, title, description, uris, provider_user_id=p.get("provider_user_id"))
+        payload = _create_playlist_in_provider(
+            provider_name, access_token, title, description, uris,
+            provider_user_id=p.get("provider_user_id"), idempotency_key=_idempotency_key(p),
+        )
         payload.update({
             "user_id": user_id,
             "inference_id": inference_id,
@@ -129,13 +184,68 @@ def create_playlist_for_moodtune():
         return jsonify(payload), 201
     except ValueError as ve:
         return jsonify({"error": str(ve)}), 400
+    except (RateLimited, CircuitOpenError) as e:
+        return upstream_failed(e)
+    except PlaylistWriteBusy as busy:
+        return write_busy(busy)
+    except PlaylistWriteError as pw:
+        return jsonify({"error": "No se pudo completar la playlist", "detail": str(pw), **pw.as_dict()}), 502
     except Exception as e:
         return jsonify({"error": "No se pudo crear la playlist", "detail": str(e)}), 502
 
 
+@bp.get("/jobs/<job_id>")
+def get_playlist_job(job_id: str):
+    """Estado de un trabajo de creación: queued, running, done (con ``result``) o failed."""
+    if JOB_POOL is None:
+        return jsonify({"error": "Modo asíncrono deshabilitado"}), 404
+    job = JOB_POOL.queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "job no encontrado"}), 404
+    return jsonify(job), 200
+
+
+def _stream_playlist(parts: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    count = 0
+    try:
+        for part in parts:
+            count += len(part.get("tracks") or [])
+            yield part
+    except Exception as e:
+        yield {"type": "error", "error": "No se pudo obtener la playlist", "detail": str(e)}
+        return
+    yield {"type": "done", "tracks": count}
+
+
+def _content_etag(provider_name: str, playlist_id: str, snapshot_id: Optional[str], fmt: str) -> Optional[str]:
+    """ETag de la representación: cambia con el ``snapshot_id`` y con el formato (JSON/NDJSON)."""
+    if not snapshot_id:
+        return None
+    raw = "\x1f".join((provider_name.lower(), playlist_id, snapshot_id, fmt))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _conditional(resp: Response, etag: Optional[str]) -> Response:
+    if etag:
+        resp.set_etag(etag)
+        # el frontend revalida siempre; un 304 cuesta solo la consulta del snapshot
+        resp.headers["Cache-Control"] = "private, no-cache"
+        resp.vary.add("Accept")
+    return resp
+
+
 @bp.post("/content")
 def fetch_playlist_content():
-    """Recupera una playlist del proveedor externo para mostrarla en frontend."""
+    """Recupera una playlist del proveedor externo para mostrarla en frontend.
+
+    Con ``Accept: application/x-ndjson`` (o ``stream``) la respuesta es NDJSON:
+    una línea ``playlist`` con los metadatos, una línea ``page`` por cada página
+    de tracks en cuanto llega (con su ``offset``) y una línea final ``done``.
+
+    La respuesta lleva ``ETag`` derivado del ``snapshot_id``; con
+    ``If-None-Match`` solo se consulta el snapshot y, si no cambió, se responde
+    304 sin cuerpo.
+    """
     try:
         p = request.get_json(force=True) or {}
         provider_name = p.get("provider", Config.DEFAULT_PROVIDER)
@@ -146,9 +256,25 @@ def fetch_playlist_content():
         provider = _provider_client(provider_name)
         if not hasattr(provider, "fetch_playlist"):
             return jsonify({"error": f"Proveedor {provider_name} no soporta lectura de playlists"}), 400
-        payload = provider.fetch_playlist(access_token, playlist_id)
-        return jsonify(payload), 200
+        stream = wants_ndjson(request, p) and hasattr(provider, "iter_playlist")
+        fmt = "ndjson" if stream else "json"
+        snapshot_id = provider.playlist_snapshot(access_token, playlist_id) if request.if_none_match else None
+        etag = _content_etag(provider_name, playlist_id, snapshot_id, fmt)
+        if etag and request.if_none_match.contains_weak(etag):
+            return _conditional(Response(status=304), etag)
+        if stream:
+            parts = provider.iter_playlist(access_token, playlist_id, snapshot_id=snapshot_id)
+            # la cabecera se pide antes de responder para poder devolver 502 si falla
+            first = next(parts)
+            records = _stream_playlist(chain([first], parts))
+            resp = Response(stream_with_context(ndjson(records)), mimetype=NDJSON_MIMETYPE)
+            return _conditional(resp, _content_etag(provider_name, playlist_id, first.get("snapshot_id"), fmt))
+        payload = provider.fetch_playlist(access_token, playlist_id, snapshot_id=snapshot_id)
+        resp = jsonify(payload)
+        return _conditional(resp, _content_etag(provider_name, playlist_id, payload.get("snapshot_id"), fmt)), 200
     except ValueError as ve:
         return jsonify({"error": str(ve)}), 400
+    except (RateLimited, CircuitOpenError) as e:
+        return upstream_failed(e)
     except Exception as e:
         return jsonify({"error": "No se pudo obtener la playlist", "detail": str(e)}), 502
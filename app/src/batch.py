@@ -0,0 +1,110 @@
+"""Ejecución concurrente acotada para operaciones en lote (p. ej. resolve-batch).
+
+Cada elemento se procesa en un pool de threads con un límite de paralelismo y un
+deadline global por lote. Los elementos que fallan o no terminan a tiempo se
+devuelven como resultados parciales en lugar de bloquear el lote completo.
+
+``arun_bounded`` es la variante asyncio: la concurrencia se limita con un
+semáforo y las tareas pendientes al vencer el deadline se cancelan.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence
+
+
+@dataclass
+class Outcome:
+    index: int
+    value: Any = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def iter_bounded(
+    fn: Callable[[Any], Any],
+    items: Sequence[Any],
+    max_workers: int,
+    deadline: Optional[float] = None,
+) -> Iterator[Outcome]:
+    """Aplica ``fn`` a cada elemento y produce ``Outcome`` a medida que terminan.
+
+    ``deadline`` es el tiempo máximo (segundos) del lote completo; al vencer se
+    emite un ``Outcome(error="timeout")`` por cada elemento pendiente y los que
+    aún no empezaron se cancelan.
+    """
+    if not items:
+        return
+    workers = max(1, min(max_workers, len(items)))
+    expires_at = time.monotonic() + deadline if deadline else None
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch")
+    pending: Dict[Future, int] = {executor.submit(fn, item): idx for idx, item in enumerate(items)}
+    try:
+        while pending:
+            timeout = None
+            if expires_at is not None:
+                timeout = max(0.0, expires_at - time.monotonic())
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for fut in done:
+                idx = pending.pop(fut)
+                try:
+                    yield Outcome(idx, value=fut.result())
+                except Exception as exc:
+                    yield Outcome(idx, error=str(exc) or exc.__class__.__name__)
+        for idx in sorted(pending.values()):
+            yield Outcome(idx, error="timeout")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def run_bounded(
+    fn: Callable[[Any], Any],
+    items: Sequence[Any],
+    max_workers: int,
+    deadline: Optional[float] = None,
+) -> List[Outcome]:
+    """Igual que ``iter_bounded`` pero devuelve los resultados en el orden de entrada."""
+    outcomes: List[Optional[Outcome]] = [None] * len(items)
+    for outcome in iter_bounded(fn, items, max_workers, deadline):
+        outcomes[outcome.index] = outcome
+    return [o if o is not None else Outcome(i, error="timeout") for i, o in enumerate(outcomes)]
+
+
+async def arun_bounded(
+    fn: Callable[[Any], Awaitable[Any]],
+    items: Sequence[Any],
+    max_concurrency: int,
+    deadline: Optional[float] = None,
+) -> List[Outcome]:
+    """Versión asyncio de ``run_bounded``: resultados en el orden de entrada."""
+    if not items:
+        return []
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def _one(item: Any) -> Any:
+        async with semaphore:
+            return await fn(item)
+
+    tasks = [asyncio.ensure_future(_one(item)) for item in items]
+    _, not_done = await asyncio.wait(tasks, timeout=deadline)
+    for task in not_done:
+        task.cancel()
+    outcomes: List[Outcome] = []
+    for idx, task in enumerate(tasks):
+        if task in not_done:
+            outcomes.append(Outcome(idx, error="timeout"))
+        elif task.exception() is not None:
+            exc = task.exception()
+            outcomes.append(Outcome(idx, error=str(exc) or exc.__class__.__name__))
+        else:
+            outcomes.append(Outcome(idx, value=task.result()))
+    return outcomes
@@ -0,0 +1,236 @@
+"""Cache multinivel para resoluciones título+artista.
+
+- Nivel 1: LRU en memoria con TTL (por proceso).
+- Nivel 2 (opcional): tabla SQLite compartida por todos los workers de gunicorn.
+
+Los resultados vacíos se guardan como negativos con un TTL más corto para no
+repetir búsquedas sin resultado, sin fijar por mucho tiempo un fallo puntual.
+
+``aget``/``aset`` son para corrutinas: el nivel SQLite puede esperar el
+``busy_timeout`` y se consulta en un thread para no frenar el event loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterator, Optional, Tuple
+
+from .config import Config
+from .metrics import METRICS
+from .storage import SqliteStore
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """LRU en memoria con expiración por entrada y contadores de uso."""
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = max(1, maxsize)
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            expires_at, value = item
+            if expires_at <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (time.time() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SqliteCacheTier(SqliteStore):
+    """Nivel compartido: tabla clave/valor JSON con expiración."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS cache_entries (
+        namespace TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value TEXT NOT NULL,
+        expires_at REAL NOT NULL,
+        PRIMARY KEY (namespace, key)
+    );
+    CREATE INDEX IF NOT EXISTS cache_entries_expiry ON cache_entries (expires_at);
+    """
+
+    PURGE_EVERY = 500
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def get(self, namespace: str, key: str) -> Tuple[Any, float]:
+        try:
+            rows = self.query(
+                "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, time.time()),
+            )
+        except Exception:
+            self.errors += 1
+            return _MISSING, 0.0
+        if not rows:
+            self.misses += 1
+            return _MISSING, 0.0
+        self.hits += 1
+        return json.loads(rows[0]["value"]), rows[0]["expires_at"]
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float) -> None:
+        now = time.time()
+        try:
+            self.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), now + ttl),
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,))
+        except Exception:
+            self.errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": self.path, "hits": self.hits, "misses": self.misses, "errors": self.errors}
+
+
+class TieredCache:
+    """Combina ``TTLCache`` y, si está configurado, ``SqliteCacheTier``."""
+
+    def __init__(
+        self,
+        namespace: str,
+        maxsize: int = 10000,
+        ttl: float = 86400.0,
+        negative_ttl: float = 300.0,
+        shared: Optional[SqliteCacheTier] = None,
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.memory = TTLCache(maxsize)
+        self.shared = shared
+        self.negative_hits = 0
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        return "\x1f".join(" ".join(str(p if p is not None else "").casefold().split()) for p in parts)
+
+    def get(self, key: str) -> Any:
+        """Devuelve el valor cacheado o ``None`` si no existe (los negativos son ``[]``)."""
+        value = self.memory.get(key, _MISSING)
+        if value is _MISSING and self.shared is not None:
+            value = self._get_shared(key)
+        return self._found(value)
+
+    def _get_shared(self, key: str) -> Any:
+        assert self.shared is not None
+        value, expires_at = self.shared.get(self.namespace, key)
+        if value is not _MISSING:
+            self.memory.set(key, value, max(1.0, expires_at - time.time()))
+        return value
+
+    def _found(self, value: Any) -> Any:
+        if value is _MISSING:
+            return None
+        if not value:
+            self.negative_hits += 1
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        ttl = self.ttl if value else self.negative_ttl
+        if ttl <= 0:
+            return
+        self.memory.set(key, value, ttl)
+        if self.shared is not None:
+            self.shared.set(self.namespace, key, value, ttl)
+
+    async def aget(self, key: str) -> Any:
+        value = self.memory.get(key, _MISSING)
+        if value is _MISSING and self.shared is not None:
+            value = await asyncio.to_thread(self._get_shared, key)
+        return self._found(value)
+
+    async def aset(self, key: str, value: Any) -> None:
+        if self.shared is None:
+            self.set(key, value)
+        else:
+            await asyncio.to_thread(self.set, key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"memory": self.memory.stats(), "negative_hits": self.negative_hits}
+        if self.shared is not None:
+            out["shared"] = self.shared.stats()
+        return out
+
+    def metric_samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        """Contadores de aciertos/fallos por nivel para ``METRICS``."""
+        name = "moodtune_cache_events_total"
+        yield name, {"cache": self.namespace, "tier": "memory", "event": "hit"}, self.memory.hits
+        yield name, {"cache": self.namespace, "tier": "memory", "event": "miss"}, self.memory.misses
+        yield name, {"cache": self.namespace, "tier": "memory", "event": "eviction"}, self.memory.evictions
+        yield name, {"cache": self.namespace, "tier": "any", "event": "negative_hit"}, self.negative_hits
+        if self.shared is not None:
+            yield name, {"cache": self.namespace, "tier": "shared", "event": "hit"}, self.shared.hits
+            yield name, {"cache": self.namespace, "tier": "shared", "event": "miss"}, self.shared.misses
+
+
+RESOLVE_CACHE = TieredCache(
+    "resolve",
+    maxsize=Config.RESOLVE_CACHE_MAXSIZE,
+    ttl=Config.RESOLVE_CACHE_TTL_SECONDS,
+    negative_ttl=Config.RESOLVE_CACHE_NEGATIVE_TTL_SECONDS,
+    shared=SqliteCacheTier(Config.RESOLVE_CACHE_PATH) if Config.RESOLVE_CACHE_PATH else None,
+)
+METRICS.register_collector(RESOLVE_CACHE.metric_samples)
+
+# Contenido transformado de playlists; la clave incluye el snapshot_id, así que una
+# entrada nunca queda desactualizada (el TTL solo acota el espacio)
+PLAYLIST_CACHE = TieredCache(
+    "playlist",
+    maxsize=Config.PLAYLIST_CACHE_MAXSIZE,
+    ttl=Config.PLAYLIST_CACHE_TTL_SECONDS,
+    negative_ttl=0,
+    shared=SqliteCacheTier(Config.PLAYLIST_CACHE_PATH) if Config.PLAYLIST_CACHE_PATH else None,
+)
+METRICS.register_collector(PLAYLIST_CACHE.metric_samples)
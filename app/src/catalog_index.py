@@ -0,0 +1,235 @@
+"""Índice local del catálogo para resolver título+artista sin llamar al proveedor.
+
+Guarda los tracks normalizados (IDs, URIs, artwork) indexados por proveedor,
+región (``market``/``country`` del servicio, como ``flight_scope``) y clave
+normalizada ``match_key`` (título, artista): un track aprendido en un mercado no
+se devuelve en otro donde quizá no esté disponible. Las filas con región vacía
+(importaciones sin región) valen para cualquier mercado. ``/catalog/resolve`` y
+``/catalog/resolve-batch`` consultan aquí antes de ir upstream; cada respuesta
+upstream se escribe de vuelta con la clave propia de cada candidato, así el
+índice crece con el tráfico. También admite importación masiva (JSON lines) y
+exportación para sembrarlo en otro despliegue.
+
+La tabla es ``WITHOUT ROWID`` con la clave como primary key (una búsqueda es un
+solo recorrido del B-tree) y las conexiones usan ``mmap_size``, de modo que el
+archivo se mapea en memoria y las lecturas no copian páginas al cache de SQLite.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .config import Config
+from .matching import match_key
+from .metrics import METRICS
+from .storage import SqliteStore
+
+
+# campos de la consulta o de la importación, no del track: la región va en su columna
+_NOT_STORED = frozenset({"match_score", "region", "market", "country"})
+
+
+class CatalogIndex(SqliteStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS catalog_tracks (
+        provider TEXT NOT NULL,
+        title_key TEXT NOT NULL,
+        artist_key TEXT NOT NULL,
+        region TEXT NOT NULL,
+        external_id TEXT NOT NULL,
+        item TEXT NOT NULL,
+        origin TEXT NOT NULL,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (provider, title_key, artist_key, region, external_id)
+    ) WITHOUT ROWID;
+    """
+
+    # el origen de la primera escritura se conserva (una importación no pasa a "traffic")
+    _UPSERT = """
+    INSERT INTO catalog_tracks (provider, title_key, artist_key, region, external_id, item, origin, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (provider, title_key, artist_key, region, external_id)
+    DO UPDATE SET item = excluded.item, updated_at = excluded.updated_at
+    """
+
+    def __init__(self, path: str, mmap_bytes: int = 256 * 1024 * 1024):
+        super().__init__(path)
+        self.mmap_bytes = max(0, mmap_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def _open(self) -> sqlite3.Connection:
+        conn = super()._open()
+        if self.mmap_bytes and self.path != ":memory:":
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_bytes)}")
+        self._migrate(conn)
+        return conn
+
+    def _migrate(self, conn: sqlite3.Connection) -> None:
+        """Índices creados antes de la columna ``region``: se conservan las
+        importaciones (como región vacía) y se descarta lo aprendido del tráfico,
+        cuyo mercado no se conoce."""
+        if not self._is_legacy(conn):
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self._is_legacy(conn):  # otro worker pudo migrar mientras esperábamos el lock
+                conn.execute("ALTER TABLE catalog_tracks RENAME TO catalog_tracks_legacy")
+                conn.execute(self.SCHEMA)
+                conn.execute(
+                    "INSERT INTO catalog_tracks (provider, title_key, artist_key, region, external_id, item, origin, updated_at) "
+                    "SELECT provider, title_key, artist_key, '', external_id, item, origin, updated_at "
+                    "FROM catalog_tracks_legacy WHERE origin = 'import'"
+                )
+                conn.execute("DROP TABLE catalog_tracks_legacy")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _is_legacy(conn: sqlite3.Connection) -> bool:
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(catalog_tracks)")}
+        return bool(columns) and "region" not in columns
+
+    def lookup(self, provider: str, title: str, artist: str, region: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Tracks guardados para la clave normalizada de la consulta en ``region``
+        (o sin región); vacío si no hay."""
+        title_key, artist_key = match_key(title, artist)
+        region = (region or "").upper()
+        rows = self.query(
+            "SELECT external_id, item FROM catalog_tracks WHERE provider = ? AND title_key = ? AND artist_key = ? "
+            "AND region IN (?, '') ORDER BY region DESC",
+            (provider, title_key, artist_key, region),
+        )
+        if rows:
+            self.hits += 1
+        else:
+            self.misses += 1
+        # la fila de la región gana sobre la genérica del mismo track
+        items: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            items.setdefault(row["external_id"], json.loads(row["item"]))
+        return list(items.values())
+
+    def _row(
+        self, provider: str, region: str, item: Dict[str, Any], origin: str, now: float
+    ) -> Optional[Tuple[Any, ...]]:
+        external_id = item.get("external_id")
+        title, artist = item.get("title"), item.get("artist")
+        if not external_id or not title or not artist:
+            return None
+        title_key, artist_key = match_key(title, artist)
+        if not title_key or not artist_key:
+            return None
+        item = {k: v for k, v in item.items() if k not in _NOT_STORED}
+        item_json = json.dumps(item, ensure_ascii=False)
+        return (provider, title_key, artist_key, region, str(external_id), item_json, origin, now)
+
+    def add(
+        self, provider: str, items: Iterable[Dict[str, Any]], origin: str = "traffic", region: Optional[str] = None
+    ) -> int:
+        """Guarda tracks normalizados con la clave propia de cada uno, en ``region``
+        (vacía: válidos en cualquier mercado)."""
+        now = time.time()
+        region = (region or "").upper()
+        rows = [row for row in (self._row(provider, region, item, origin, now) for item in items) if row]
+        if rows:
+            self.executemany(self._UPSERT, rows)
+            self.writes += len(rows)
+        return len(rows)
+
+    def import_records(
+        self,
+        provider: str,
+        records: Iterable[Dict[str, Any]],
+        batch_size: int = 1000,
+        region: Optional[str] = None,
+    ) -> int:
+        """Carga masiva de tracks normalizados ``{external_id|id, title, artist, uri, image_url, ...}``.
+
+        ``provider`` y ``region`` se usan cuando el registro no trae los suyos
+        (``region``, ``market`` o ``country``); sin región el track vale para
+        cualquier mercado.
+        """
+        total = 0
+        batches: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for rec in records:
+            name = (rec.get("provider") or provider).lower()
+            item = _import_item(name, rec)
+            if item is None:
+                continue
+            rec_region = (rec.get("region") or rec.get("market") or rec.get("country") or region or "").upper()
+            batch = batches.setdefault((name, rec_region), [])
+            batch.append(item)
+            if len(batch) >= batch_size:
+                total += self.add(name, batch, origin="import", region=rec_region)
+                batch.clear()
+        for (name, rec_region), batch in batches.items():
+            if batch:
+                total += self.add(name, batch, origin="import", region=rec_region)
+        return total
+
+    def export(self, provider: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Itera todos los tracks del índice (opcionalmente de un proveedor), con su ``region``."""
+        sql = "SELECT region, item FROM catalog_tracks"
+        params: tuple = ()
+        if provider:
+            sql += " WHERE provider = ?"
+            params = (provider,)
+        self.connection()  # asegura el esquema
+        # conexión dedicada: el cursor se consume de forma incremental
+        conn = self._open()
+        try:
+            for row in conn.execute(sql, params):
+                item = json.loads(row["item"])
+                if row["region"]:
+                    item["region"] = row["region"]
+                yield item
+        finally:
+            conn.close()
+
+    def entries(self) -> Optional[float]:
+        """Tracks del índice; el ``COUNT(*)`` recorre la tabla, así que se cachea."""
+        return self.cached_scalar("SELECT COUNT(*) FROM catalog_tracks", Config.METRICS_COUNT_TTL_SECONDS)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": self.path, "hits": self.hits, "misses": self.misses, "writes": self.writes}
+
+    def metric_samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        """Contadores de aciertos/fallos y tamaño del índice para ``METRICS``."""
+        yield "moodtune_cache_events_total", {"cache": "catalog_index", "tier": "shared", "event": "hit"}, self.hits
+        yield "moodtune_cache_events_total", {"cache": "catalog_index", "tier": "shared", "event": "miss"}, self.misses
+        entries = self.entries()
+        if entries is not None:
+            yield "moodtune_store_entries", {"store": "catalog_index"}, entries
+
+
+def _import_item(provider: str, rec: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    external_id = rec.get("external_id") or rec.get("track_id") or rec.get("id")
+    if external_id is None:
+        return None
+    external_id = str(external_id)
+    prefix = f"{provider}-"
+    if external_id.startswith(prefix):
+        external_id = external_id[len(prefix):]
+    return {
+        **rec,
+        "id": f"{provider}-{external_id}",
+        "external_id": external_id,
+        "provider": provider,
+        "source": rec.get("source") or "catalog_import",
+    }
+
+
+CATALOG_INDEX: Optional[CatalogIndex] = (
+    CatalogIndex(Config.CATALOG_INDEX_PATH, mmap_bytes=Config.CATALOG_INDEX_MMAP_MB * 1024 * 1024)
+    if Config.CATALOG_INDEX_PATH
+    else None
+)
+if CATALOG_INDEX is not None:
+    METRICS.register_collector(CATALOG_INDEX.metric_samples)
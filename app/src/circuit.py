@@ -0,0 +1,181 @@
+"""Circuit breaker por host upstream.
+
+Cuando un proveedor se degrada (timeouts, 5xx) cada llamada espera el timeout
+completo y ocupa un worker. El breaker de cada host lleva una ventana móvil
+(``CIRCUIT_WINDOW_SECONDS``) de resultados y latencias:
+
+- ``closed``: las llamadas pasan; si en la ventana hay al menos
+  ``CIRCUIT_MIN_CALLS`` y la proporción de fallos (errores de red, 5xx o
+  llamadas más lentas que ``CIRCUIT_SLOW_CALL_SECONDS``) alcanza
+  ``CIRCUIT_FAILURE_RATIO``, se abre.
+- ``open``: las llamadas fallan de inmediato con ``CircuitOpenError`` durante
+  ``CIRCUIT_OPEN_SECONDS``.
+- ``half_open``: se deja pasar una sola llamada de prueba; si funciona el
+  circuito se cierra, si falla vuelve a abrirse.
+
+Los 429 no cuentan como fallo (los gestiona ``ratelimit``).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import requests
+
+from .config import Config
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(requests.RequestException):
+    """El circuito del host está abierto; reintentar tras ``retry_after``."""
+
+    def __init__(self, host: str, retry_after: float):
+        super().__init__(f"Circuito abierto para {host}; reintentar en {retry_after:.1f}s")
+        self.host = host
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        host: str,
+        window: float = 30.0,
+        min_calls: int = 5,
+        failure_ratio: float = 0.5,
+        slow_call_seconds: float = 5.0,
+        open_seconds: float = 30.0,
+    ):
+        self.host = host
+        self.window = window
+        self.min_calls = max(1, min_calls)
+        self.failure_ratio = failure_ratio
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.opens = 0
+        self.rejected = 0
+        self._calls: Deque[Tuple[float, bool, float]] = deque()
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float) -> None:
+        while self._calls and self._calls[0][0] < now - self.window:
+            self._calls.popleft()
+
+    def _open(self, now: float) -> None:
+        self.state = OPEN
+        self.opened_at = now
+        self.opens += 1
+        self._calls.clear()
+
+    def before(self) -> bool:
+        """Autoriza una llamada o lanza ``CircuitOpenError``; ``True`` si es la llamada de prueba."""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == OPEN:
+                left = self.opened_at + self.open_seconds - now
+                if left > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.host, left)
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.host, self.open_seconds)
+                self._probing = True
+                return True
+            return False
+
+    def record(self, ok: Optional[bool], elapsed: float, probe: bool = False) -> None:
+        """Registra el resultado de una llamada autorizada (``None``: no llegó a completarse)."""
+        now = time.monotonic()
+        with self._lock:
+            if probe:
+                self._probing = False
+            if ok is None:
+                return
+            failed = not ok or elapsed > self.slow_call_seconds
+            if probe:
+                if failed:
+                    self._open(now)
+                else:
+                    self.state = CLOSED
+                    self._calls.clear()
+                return
+            if self.state != CLOSED:
+                return
+            self._calls.append((now, failed, elapsed))
+            self._prune(now)
+            failures = sum(1 for _, f, _ in self._calls if f)
+            if len(self._calls) >= self.min_calls and failures / len(self._calls) >= self.failure_ratio:
+                self._open(now)
+
+    def is_open(self) -> bool:
+        with self._lock:
+            return self.state == OPEN and time.monotonic() < self.opened_at + self.open_seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            calls = list(self._calls)
+            state = self.state
+            if state == OPEN and now >= self.opened_at + self.open_seconds:
+                state = HALF_OPEN
+            latencies = sorted(e for _, _, e in calls)
+        return {
+            "state": state,
+            "calls": len(calls),
+            "failures": sum(1 for _, f, _ in calls if f),
+            "p50_ms": int(latencies[len(latencies) // 2] * 1000) if latencies else None,
+            "max_ms": int(latencies[-1] * 1000) if latencies else None,
+            "opens": self.opens,
+            "rejected": self.rejected,
+            "retry_in": round(max(0.0, self.opened_at + self.open_seconds - now), 1) if state == OPEN else None,
+        }
+
+
+class CircuitBreakers:
+    """Breakers por host, creados a demanda con la configuración común."""
+
+    def __init__(self, enabled: bool = True, **settings: Any):
+        self.enabled = enabled
+        self.settings = settings
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, host: str) -> Optional[CircuitBreaker]:
+        if not self.enabled or not host:
+            return None
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(host)
+                if breaker is None:
+                    breaker = self._breakers[host] = CircuitBreaker(host, **self.settings)
+        return breaker
+
+    def is_open(self, host: Optional[str]) -> bool:
+        breaker = self._breakers.get(host or "")
+        return breaker is not None and breaker.is_open()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {host: b.snapshot() for host, b in sorted(self._breakers.items())}
+
+
+BREAKERS = CircuitBreakers(
+    enabled=Config.CIRCUIT_BREAKER_ENABLED,
+    window=Config.CIRCUIT_WINDOW_SECONDS,
+    min_calls=Config.CIRCUIT_MIN_CALLS,
+    failure_ratio=Config.CIRCUIT_FAILURE_RATIO,
+    slow_call_seconds=Config.CIRCUIT_SLOW_CALL_SECONDS,
+    open_seconds=Config.CIRCUIT_OPEN_SECONDS,
+)
@@ -11,6 +11,15 @@ class Config:
     # Proveedor por defecto para operaciones (e.g., playlists, resolución)
     DEFAULT_PROVIDER = os.getenv("DEFAULT_PROVIDER", "spotify")
 
+    # Registro de servicios por worker: recarga de credenciales al cambiar el .env (0 = deshabilitado)
+    SERVICE_ENV_FILE = os.getenv("SERVICE_ENV_FILE", ".env")
+    SERVICE_RELOAD_SECONDS = float(os.getenv("SERVICE_RELOAD_SECONDS", "30"))
+    # Warm-up del worker en create_app (pasos: services, tokens, connections, caches)
+    WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+    WARMUP_STEPS = os.getenv("WARMUP_STEPS", "services,tokens,connections,caches")
+    # filas leídas por tabla de cada almacén SQLite en el paso ``caches``
+    WARMUP_CACHE_ROWS = int(os.getenv("WARMUP_CACHE_ROWS", "50000"))
+
     # Spotify Client Credentials (para catálogo)
     SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
     SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
@@ -28,10 +37,112 @@ class Config:
     AMAZON_MUSIC_COUNTRY = os.getenv("AMAZON_MUSIC_COUNTRY", "US")
     AMAZON_MUSIC_AUTH_SCOPE = os.getenv("AMAZON_MUSIC_AUTH_SCOPE", "music::library:read")
     AMAZON_MUSIC_AUTH_REDIRECT_URI = os.getenv("AMAZON_MUSIC_AUTH_REDIRECT_URI")
+    # Mapeo Amazon -> Spotify para audio-features
+    AMAZON_MAPPING_CONCURRENCY = int(os.getenv("AMAZON_MAPPING_CONCURRENCY", "16"))
+    AMAZON_MAPPING_DEADLINE_SECONDS = float(os.getenv("AMAZON_MAPPING_DEADLINE_SECONDS", "25"))
+    CROSSWALK_PATH = os.getenv("CROSSWALK_PATH", "data/crosswalk.sqlite3")
 
     # Spotify OAuth (Authorization Code + PKCE)
     SPOTIFY_AUTH_REDIRECT_URI = os.getenv("SPOTIFY_AUTH_REDIRECT_URI")
     SPOTIFY_AUTH_SCOPES = os.getenv("SPOTIFY_AUTH_SCOPES", "playlist-modify-public playlist-modify-private")
+    # Estado PKCE compartido entre workers: memory | sqlite | redis
+    PKCE_STORE_BACKEND = os.getenv("PKCE_STORE_BACKEND", "sqlite")
+    PKCE_STORE_PATH = os.getenv("PKCE_STORE_PATH", "data/oauth_state.sqlite3")
+    PKCE_REDIS_URL = os.getenv("PKCE_REDIS_URL", "redis://localhost:6379/0")
+
+    # Cache de tokens client credentials (compartido por proceso)
+    TOKEN_EXPIRY_MARGIN_SECONDS = float(os.getenv("TOKEN_EXPIRY_MARGIN_SECONDS", "30"))
+    TOKEN_REFRESH_AHEAD_SECONDS = float(os.getenv("TOKEN_REFRESH_AHEAD_SECONDS", "300"))
+
+    # Transporte HTTP compartido (pool keep-alive por host upstream)
+    HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))
+    HTTP_KEEPALIVE = os.getenv("HTTP_KEEPALIVE", "true").lower() == "true"
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+    HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "20"))
+    HTTP_ASYNC_MAX_CONNECTIONS = int(os.getenv("HTTP_ASYNC_MAX_CONNECTIONS", "200"))
+    # Formato: host=connect:read separados por coma
+    HTTP_HOST_TIMEOUTS = os.getenv("HTTP_HOST_TIMEOUTS", "itunes.apple.com=5:15")
+
+    # Presupuesto por host upstream (token bucket) y reintentos de 429/5xx
+    # Formato: host=peticiones_por_segundo:burst separados por coma
+    RATE_LIMITS = os.getenv(
+        "RATE_LIMITS",
+        "api.spotify.com=20:40,accounts.spotify.com=5:10,itunes.apple.com=5:20,api.music.amazon.dev=10:20",
+    )
+    # Espera máxima por turno/Retry-After antes de descartar la petición
+    RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv("RATE_LIMIT_MAX_WAIT_SECONDS", "10"))
+    HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+    HTTP_RETRY_BACKOFF_SECONDS = float(os.getenv("HTTP_RETRY_BACKOFF_SECONDS", "0.5"))
+    # Circuit breaker por host upstream (ventana móvil de errores/latencias)
+    CIRCUIT_BREAKER_ENABLED = os.getenv("CIRCUIT_BREAKER_ENABLED", "true").lower() == "true"
+    CIRCUIT_WINDOW_SECONDS = float(os.getenv("CIRCUIT_WINDOW_SECONDS", "30"))
+    CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "5"))
+    CIRCUIT_FAILURE_RATIO = float(os.getenv("CIRCUIT_FAILURE_RATIO", "0.5"))
+    CIRCUIT_SLOW_CALL_SECONDS = float(os.getenv("CIRCUIT_SLOW_CALL_SECONDS", "5"))
+    CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+    # Métricas Prometheus (/metrics) agregadas entre workers vía SQLite (vacío = solo el proceso)
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_PATH = os.getenv("METRICS_PATH", "data/metrics.sqlite3")
+    METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+    METRICS_RETENTION_SECONDS = float(os.getenv("METRICS_RETENTION_SECONDS", "86400"))
+    # cada cuánto se recuentan las entradas de los almacenes SQLite (gauge moodtune_store_entries)
+    METRICS_COUNT_TTL_SECONDS = float(os.getenv("METRICS_COUNT_TTL_SECONDS", "300"))
+
+    # Resolución en lote (/catalog/resolve-batch)
+    RESOLVE_BATCH_CONCURRENCY = int(os.getenv("RESOLVE_BATCH_CONCURRENCY", "8"))
+    RESOLVE_BATCH_DEADLINE_SECONDS = float(os.getenv("RESOLVE_BATCH_DEADLINE_SECONDS", "25"))
+    # Camino asíncrono (httpx + asyncio) para rutas de catálogo
+    CATALOG_ASYNC = os.getenv("CATALOG_ASYNC", "false").lower() == "true"
+    RESOLVE_BATCH_ASYNC_CONCURRENCY = int(os.getenv("RESOLVE_BATCH_ASYNC_CONCURRENCY", "64"))
+    # Resolución multi-proveedor (mode "race"/"hedge"): orden de preferencia y escalonamiento
+    RESOLVE_PROVIDERS = os.getenv("RESOLVE_PROVIDERS", "spotify,itunes,amazon_music")
+    RESOLVE_HEDGE_MS = int(os.getenv("RESOLVE_HEDGE_MS", "300"))
+    RESOLVE_RACE_DEADLINE_SECONDS = float(os.getenv("RESOLVE_RACE_DEADLINE_SECONDS", "8"))
+    # Puntaje de coincidencia de /catalog/resolve*: candidatos por consulta, umbral y alias de artistas
+    MATCH_CANDIDATES = int(os.getenv("MATCH_CANDIDATES", "5"))
+    MATCH_MIN_SCORE = float(os.getenv("MATCH_MIN_SCORE", "0.7"))
+    MATCH_ARTIST_ALIASES = os.getenv("MATCH_ARTIST_ALIASES", "")
+
+    # Cache de resoluciones título+artista (LRU en memoria + SQLite opcional compartido)
+    RESOLVE_CACHE_MAXSIZE = int(os.getenv("RESOLVE_CACHE_MAXSIZE", "20000"))
+    RESOLVE_CACHE_TTL_SECONDS = float(os.getenv("RESOLVE_CACHE_TTL_SECONDS", "86400"))
+    RESOLVE_CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv("RESOLVE_CACHE_NEGATIVE_TTL_SECONDS", "300"))
+    RESOLVE_CACHE_PATH = os.getenv("RESOLVE_CACHE_PATH", "")
+
+    # Índice local del catálogo (título+artista normalizados -> tracks; vacío = deshabilitado)
+    CATALOG_INDEX_PATH = os.getenv("CATALOG_INDEX_PATH", "data/catalog_index.sqlite3")
+    CATALOG_INDEX_MMAP_MB = int(os.getenv("CATALOG_INDEX_MMAP_MB", "256"))
+
+    # Almacén persistente de audio-features (vacío = deshabilitado)
+    FEATURE_STORE_PATH = os.getenv("FEATURE_STORE_PATH", "data/audio_features.sqlite3")
+    FEATURE_STORE_NEGATIVE_TTL_SECONDS = float(os.getenv("FEATURE_STORE_NEGATIVE_TTL_SECONDS", "86400"))
+
+    # Micro-batching de /audio-features entre requests concurrentes (0 = deshabilitado)
+    AUDIO_FEATURES_BATCH_WINDOW_MS = float(os.getenv("AUDIO_FEATURES_BATCH_WINDOW_MS", "5"))
+    AUDIO_FEATURES_BATCH_CONCURRENCY = int(os.getenv("AUDIO_FEATURES_BATCH_CONCURRENCY", "4"))
+
+    # Escritura de playlists: progreso reanudable por idempotency key (vacío = deshabilitado)
+    PLAYLIST_PROGRESS_PATH = os.getenv("PLAYLIST_PROGRESS_PATH", "data/playlist_writes.sqlite3")
+    PLAYLIST_PROGRESS_TTL_SECONDS = float(os.getenv("PLAYLIST_PROGRESS_TTL_SECONDS", "604800"))
+    # Lease de escritura por idempotency key (se renueva tras cada chunk)
+    PLAYLIST_WRITE_LEASE_SECONDS = float(os.getenv("PLAYLIST_WRITE_LEASE_SECONDS", "120"))
+    # 1 = secuencial; 2 = los chunks crecen desde el centro hacia ambos extremos
+    PLAYLIST_WRITE_CONCURRENCY = int(os.getenv("PLAYLIST_WRITE_CONCURRENCY", "2"))
+
+    # Cola de trabajos persistente (creación asíncrona de playlists)
+    JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "data/jobs.sqlite3")
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "600"))
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+    JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+
+    # Lectura de playlists (/playlists/content)
+    PLAYLIST_PAGE_CONCURRENCY = int(os.getenv("PLAYLIST_PAGE_CONCURRENCY", "8"))
+    PLAYLIST_FIELDS_PROJECTION = os.getenv("PLAYLIST_FIELDS_PROJECTION", "true").lower() == "true"
+    # Cache de contenido por (playlist, snapshot_id): LRU en memoria + SQLite compartido (TTL 0 = deshabilitado)
+    PLAYLIST_CACHE_MAXSIZE = int(os.getenv("PLAYLIST_CACHE_MAXSIZE", "256"))
+    PLAYLIST_CACHE_TTL_SECONDS = float(os.getenv("PLAYLIST_CACHE_TTL_SECONDS", "604800"))
+    PLAYLIST_CACHE_PATH = os.getenv("PLAYLIST_CACHE_PATH", "data/playlist_cache.sqlite3")
 
     # Tokens de usuario/servicio para crear playlists en proveedores
     SPOTIFY_USER_TOKEN = os.getenv("SPOTIFY_USER_TOKEN")
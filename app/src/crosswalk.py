@@ -0,0 +1,57 @@
+"""Tabla persistente de equivalencias de IDs entre proveedores.
+
+Se usa, por ejemplo, para recordar qué pista de Spotify corresponde a cada ID de
+Amazon Music y así calcular cada mapeo (metadata + búsqueda) una sola vez. Los
+nombres de proveedor pueden llevar la región (``amazon_music:US``) cuando el
+mapeo depende de ella.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Dict, Iterable, Optional
+
+from .config import Config
+from .storage import SqliteStore
+
+
+class Crosswalk(SqliteStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS id_crosswalk (
+        source_provider TEXT NOT NULL,
+        source_id TEXT NOT NULL,
+        target_provider TEXT NOT NULL,
+        target_id TEXT NOT NULL,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (source_provider, source_id, target_provider)
+    );
+    """
+
+    _CHUNK = 500
+
+    def get_many(self, source: str, target: str, ids: Iterable[str]) -> Dict[str, str]:
+        unique = list(dict.fromkeys(i for i in ids if i))
+        out: Dict[str, str] = {}
+        for i in range(0, len(unique), self._CHUNK):
+            chunk = unique[i:i + self._CHUNK]
+            marks = ",".join("?" * len(chunk))
+            rows = self.query(
+                "SELECT source_id, target_id FROM id_crosswalk "
+                f"WHERE source_provider = ? AND target_provider = ? AND source_id IN ({marks})",
+                (source, target, *chunk),
+            )
+            out.update({row["source_id"]: row["target_id"] for row in rows})
+        return out
+
+    def put_many(self, source: str, target: str, mapping: Dict[str, str]) -> None:
+        now = time.time()
+        rows = [(source, sid, target, tid, now) for sid, tid in mapping.items() if sid and tid]
+        if rows:
+            self.executemany(
+                "INSERT OR REPLACE INTO id_crosswalk "
+                "(source_provider, source_id, target_provider, target_id, updated_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+
+
+CROSSWALK: Optional[Crosswalk] = Crosswalk(Config.CROSSWALK_PATH) if Config.CROSSWALK_PATH else None
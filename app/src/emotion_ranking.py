@@ -0,0 +1,76 @@
+"""Filtrado y ranking vectorizado de pistas según los rangos de ``EMOTION_PARAMS``.
+
+Todas las pistas candidatas se evalúan en una sola pasada NumPy: se normaliza la
+distancia de (valence, energy) al centroide del rango de la emoción y se
+devuelven las ``top_k`` más cercanas.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+def _feature_matrix(ids: Sequence[str], features: Dict[str, Dict[str, Any]]) -> np.ndarray:
+    """Matriz (n, 2) con valence/energy; NaN donde falte el dato."""
+    def _value(tid: str, key: str) -> float:
+        value = (features.get(tid) or {}).get(key)
+        return float(value) if isinstance(value, (int, float)) else np.nan
+
+    n = len(ids)
+    valence = np.fromiter((_value(t, "valence") for t in ids), dtype=np.float64, count=n)
+    energy = np.fromiter((_value(t, "energy") for t in ids), dtype=np.float64, count=n)
+    return np.column_stack((valence, energy))
+
+
+def rank_by_emotion(
+    ids: Sequence[str],
+    features: Dict[str, Dict[str, Any]],
+    params: Dict[str, Tuple[float, float]],
+    top_k: int = 20,
+    strict: bool = True,
+) -> List[Dict[str, Any]]:
+    """Ordena ``ids`` por cercanía al centroide (valence, energy) de la emoción.
+
+    - ``strict``: solo considera pistas dentro de ambos rangos; si es ``False``
+      rankea todas las pistas con features, incluidas las fuera de rango.
+    - ``score`` va de 1 (centroide exacto) a 0 (en la esquina del rango o más lejos).
+    """
+    ids = list(dict.fromkeys(ids))
+    if not ids or top_k <= 0:
+        return []
+    bounds = np.array([params["valence"], params["energy"]], dtype=np.float64)  # (2, 2): lo, hi
+    lo, hi = bounds[:, 0], bounds[:, 1]
+    center = (lo + hi) / 2.0
+    half = np.maximum((hi - lo) / 2.0, 1e-6)
+
+    matrix = _feature_matrix(ids, features)
+    valid = ~np.isnan(matrix).any(axis=1)
+    in_range = valid & ((matrix >= lo) & (matrix <= hi)).all(axis=1)
+    mask = in_range if strict else valid
+
+    distance = np.linalg.norm((matrix - center) / half, axis=1)
+    score = np.clip(1.0 - distance / np.sqrt(2.0), 0.0, 1.0)
+
+    candidates = np.flatnonzero(mask)
+    if candidates.size == 0:
+        return []
+    k = min(top_k, candidates.size)
+    cand_dist = distance[candidates]
+    if k < candidates.size:
+        part = np.argpartition(cand_dist, k - 1)[:k]
+        candidates, cand_dist = candidates[part], cand_dist[part]
+    order = candidates[np.argsort(cand_dist, kind="stable")]
+
+    return [
+        {
+            "id": ids[i],
+            "valence": float(matrix[i, 0]),
+            "energy": float(matrix[i, 1]),
+            "distance": round(float(distance[i]), 6),
+            "score": round(float(score[i]), 6),
+            "in_range": bool(in_range[i]),
+        }
+        for i in order
+    ]
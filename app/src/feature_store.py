@@ -0,0 +1,144 @@
+"""Almacén persistente de audio-features por ID de pista.
+
+Los audio-features (valence, energy, ...) de una pista no cambian, así que se
+guardan en SQLite la primera vez que se obtienen y las consultas posteriores no
+necesitan red. Los IDs que Spotify no reconoce se guardan como negativos durante
+``FEATURE_STORE_NEGATIVE_TTL_SECONDS`` para no volver a pedirlos. Soporta precarga masiva y exportación (JSON lines) para sembrarlo
+desde un volcado offline.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .config import Config
+from .metrics import METRICS
+from .storage import SqliteStore
+
+
+class FeatureStore(SqliteStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS audio_features (
+        provider TEXT NOT NULL,
+        track_id TEXT NOT NULL,
+        features TEXT NOT NULL,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (provider, track_id)
+    );
+    """
+
+    # límite conservador de parámetros por statement en SQLite
+    _CHUNK = 500
+
+    def __init__(self, path: str, negative_ttl: float = 86400.0):
+        super().__init__(path)
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, provider: str, track_ids: List[str]) -> Tuple[Dict[str, Dict[str, Any]], Set[str]]:
+        """Devuelve ``(encontrados, negativos_vigentes)`` para los IDs pedidos."""
+        found: Dict[str, Dict[str, Any]] = {}
+        negative: Set[str] = set()
+        negative_since = time.time() - self.negative_ttl
+        unique = list(dict.fromkeys(t for t in track_ids if t))
+        for i in range(0, len(unique), self._CHUNK):
+            chunk = unique[i:i + self._CHUNK]
+            marks = ",".join("?" * len(chunk))
+            rows = self.query(
+                f"SELECT track_id, features, updated_at FROM audio_features WHERE provider = ? AND track_id IN ({marks})",
+                (provider, *chunk),
+            )
+            for row in rows:
+                feat = json.loads(row["features"])
+                if feat:
+                    found[row["track_id"]] = feat
+                elif row["updated_at"] >= negative_since:
+                    negative.add(row["track_id"])
+        self.hits += len(found) + len(negative)
+        self.misses += len(unique) - len(found) - len(negative)
+        return found, negative
+
+    def get_many(self, provider: str, track_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        return self.lookup(provider, track_ids)[0]
+
+    def put_missing(self, provider: str, track_ids: Iterable[str]) -> None:
+        now = time.time()
+        rows = [(provider, tid, "null", now) for tid in track_ids if tid]
+        if rows:
+            self.executemany(
+                "INSERT OR REPLACE INTO audio_features (provider, track_id, features, updated_at) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+
+    def put_many(self, provider: str, features: Dict[str, Dict[str, Any]]) -> int:
+        now = time.time()
+        rows = [(provider, tid, json.dumps(feat), now) for tid, feat in features.items() if tid and feat]
+        if rows:
+            self.executemany(
+                "INSERT OR REPLACE INTO audio_features (provider, track_id, features, updated_at) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def preload(self, provider: str, records: Iterable[Dict[str, Any]], batch_size: int = 1000) -> int:
+        """Carga masiva de registros ``{"id": ..., "valence": ..., "energy": ...}``."""
+        total = 0
+        batch: Dict[str, Dict[str, Any]] = {}
+        for rec in records:
+            track_id = rec.get("id") or rec.get("track_id")
+            if not track_id:
+                continue
+            batch[str(track_id)] = rec
+            if len(batch) >= batch_size:
+                total += self.put_many(provider, batch)
+                batch = {}
+        if batch:
+            total += self.put_many(provider, batch)
+        return total
+
+    def export(self, provider: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Itera todos los registros guardados (opcionalmente de un proveedor)."""
+        sql = "SELECT provider, track_id, features FROM audio_features WHERE features != 'null'"
+        params: tuple = ()
+        if provider:
+            sql += " AND provider = ?"
+            params = (provider,)
+        self.connection()  # asegura el esquema
+        # conexión dedicada: el cursor se consume de forma incremental
+        conn = self._open()
+        try:
+            for row in conn.execute(sql + " ORDER BY provider, track_id", params):
+                feat = json.loads(row["features"])
+                feat.setdefault("id", row["track_id"])
+                yield {"provider": row["provider"], **feat}
+        finally:
+            conn.close()
+
+    def entries(self) -> Optional[float]:
+        """Audio-features guardados (sin los negativos); el ``COUNT(*)`` se cachea."""
+        return self.cached_scalar(
+            "SELECT COUNT(*) FROM audio_features WHERE features != 'null'", Config.METRICS_COUNT_TTL_SECONDS
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": self.path, "hits": self.hits, "misses": self.misses}
+
+    def metric_samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        """Contadores de aciertos/fallos y tamaño del almacén para ``METRICS``."""
+        yield "moodtune_cache_events_total", {"cache": "audio_features", "tier": "shared", "event": "hit"}, self.hits
+        yield "moodtune_cache_events_total", {"cache": "audio_features", "tier": "shared", "event": "miss"}, self.misses
+        entries = self.entries()
+        if entries is not None:
+            yield "moodtune_store_entries", {"store": "audio_features"}, entries
+
+
+FEATURE_STORE: Optional[FeatureStore] = (
+    FeatureStore(Config.FEATURE_STORE_PATH, negative_ttl=Config.FEATURE_STORE_NEGATIVE_TTL_SECONDS)
+    if Config.FEATURE_STORE_PATH
+    else None
+)
+if FEATURE_STORE is not None:
+    METRICS.register_collector(FEATURE_STORE.metric_samples)
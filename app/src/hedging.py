@@ -0,0 +1,115 @@
+"""Carrera entre proveedores: primer resultado aceptable, con hedging escalonado.
+
+``race_first`` lanza una llamada por candidato y devuelve el primer resultado
+que cumpla ``accept``; las llamadas que siguen en vuelo se cancelan.
+
+- ``hedge_after=0``: todas las llamadas arrancan a la vez (carrera pura).
+- ``hedge_after>0``: arranca el primer candidato y el siguiente solo si no hubo
+  un resultado aceptable en ``hedge_after`` segundos (o si el anterior falló o
+  vino vacío), de modo que el caso normal cuesta una sola llamada y la cola de
+  latencia queda acotada por el proveedor más rápido.
+
+Cada intento queda registrado en ``attempts`` (estado y latencia) para
+diagnóstico.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Generic, List, Optional, Sequence, Tuple, TypeVar
+
+
+T = TypeVar("T")
+
+
+@dataclass
+class RaceResult(Generic[T]):
+    winner: Optional[str] = None
+    value: Optional[T] = None
+    attempts: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+
+async def race_first(
+    calls: Sequence[Tuple[str, Callable[[], Awaitable[T]]]],
+    accept: Callable[[T], bool],
+    hedge_after: float = 0.0,
+    deadline: Optional[float] = None,
+) -> RaceResult[T]:
+    """Ejecuta ``calls`` (``(nombre, fábrica de corrutina)``) en orden de preferencia.
+
+    Si ningún candidato entrega un resultado aceptable, ``value`` es el último
+    resultado no aceptado (p. ej. una lista vacía) o ``None`` si todos fallaron.
+    """
+    result: RaceResult[T] = RaceResult()
+    if not calls:
+        return result
+    started = time.monotonic()
+    expires_at = started + deadline if deadline else None
+    queue = list(calls)
+    running: Dict[asyncio.Task, Tuple[str, float]] = {}
+
+    def _launch() -> None:
+        name, factory = queue.pop(0)
+        result.attempts[name] = {"status": "running", "elapsed_ms": None}
+        running[asyncio.ensure_future(factory())] = (name, time.monotonic())
+
+    def _finish(name: str, t0: float, status: str, error: Optional[str] = None) -> None:
+        entry = {"status": status, "elapsed_ms": int((time.monotonic() - t0) * 1000)}
+        if error:
+            entry["error"] = error
+        result.attempts[name] = entry
+
+    try:
+        _launch()
+        while hedge_after <= 0 and queue:
+            _launch()
+        while running:
+            timeout = hedge_after if queue else None
+            if expires_at is not None:
+                left = max(0.0, expires_at - time.monotonic())
+                timeout = left if timeout is None else min(timeout, left)
+            done, _ = await asyncio.wait(list(running), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                if expires_at is not None and time.monotonic() >= expires_at:
+                    break
+                _launch()  # hedge: el candidato actual tarda más de ``hedge_after``
+                continue
+            for task in done:
+                name, t0 = running.pop(task)
+                exc = task.exception()
+                if exc is not None:
+                    _finish(name, t0, "error", str(exc) or exc.__class__.__name__)
+                    continue
+                value = task.result()
+                if accept(value):
+                    _finish(name, t0, "won")
+                    result.winner, result.value = name, value
+                    return result
+                _finish(name, t0, "empty")
+                result.value = value
+            if queue and not running:
+                _launch()
+        return result
+    finally:
+        for task, (name, t0) in running.items():
+            task.cancel()
+            _finish(name, t0, "cancelled" if result.winner else "timeout")
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+        for name, _ in queue:
+            result.attempts[name] = {"status": "skipped", "elapsed_ms": None}
+
+
+def parse_providers(value: Any, default: List[str]) -> List[str]:
+    """Lista de proveedores desde ``"a,b"`` o ``["a", "b"]`` (sin duplicados, en orden)."""
+    if not value:
+        return list(default)
+    items = value.split(",") if isinstance(value, str) else list(value)
+    seen: List[str] = []
+    for item in items:
+        name = str(item).strip().lower()
+        if name and name not in seen:
+            seen.append(name)
+    return seen
@@ -0,0 +1,316 @@
+"""Cola de trabajos persistente (SQLite) con pool de workers locales.
+
+Las operaciones lentas contra proveedores (p. ej. crear una playlist y agregar
+cientos de pistas) se encolan y el request responde de inmediato con un
+``job_id``; los workers de cada proceso toman trabajos de la misma base, por lo
+que la cola sobrevive a reinicios y se reparte entre workers de gunicorn.
+
+- ``claim`` toma un trabajo de forma atómica (``BEGIN IMMEDIATE``) y le asigna un
+  lease; si el proceso muere, al vencer el lease otro worker lo retoma, salvo
+  que ya lleve ``JOB_MAX_ATTEMPTS`` intentos: un trabajo que tumba o cuelga a su
+  worker se marca ``failed`` en vez de reintentarse sin fin. Cada
+  reporte de progreso renueva el lease, y ``progress``/``complete``/``fail``
+  solo aplican si el trabajo sigue asignado a ese worker: uno que perdió el
+  lease no pisa el resultado del que lo retomó (``LeaseLost``).
+- Los errores transitorios se reintentan hasta ``JOB_MAX_ATTEMPTS`` con backoff;
+  ``ValueError`` y los 4xx del proveedor fallan de inmediato.
+- Las credenciales del trabajo (p. ej. el token del proveedor enviado por el
+  cliente) van en la columna ``secrets``, aparte del payload: solo las recibe el
+  handler, nunca aparecen en ``get`` y se borran al llegar a ``done``/``failed``.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import requests
+
+from .config import Config
+from .metrics import METRICS
+from .storage import SqliteStore
+
+
+logger = logging.getLogger(__name__)
+
+ProgressFn = Callable[[Dict[str, Any]], None]
+JobHandler = Callable[[Dict[str, Any], ProgressFn, str], Dict[str, Any]]
+
+
+class LeaseLost(RuntimeError):
+    """El trabajo fue retomado por otro worker (lease vencido)."""
+
+
+class JobQueue(SqliteStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        secrets TEXT,
+        status TEXT NOT NULL,
+        progress TEXT,
+        result TEXT,
+        error TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        available_at REAL NOT NULL,
+        lease_until REAL,
+        worker TEXT,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, available_at);
+    """
+
+    def _open(self) -> sqlite3.Connection:
+        conn = super()._open()
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if columns and "secrets" not in columns:  # colas creadas antes de la columna
+            try:
+                conn.execute("ALTER TABLE jobs ADD COLUMN secrets TEXT")
+            except sqlite3.OperationalError:
+                pass  # otro worker la agregó primero
+        return conn
+
+    def enqueue(
+        self, kind: str, payload: Dict[str, Any], job_id: Optional[str] = None, secrets: Optional[Dict[str, Any]] = None
+    ) -> str:
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        secrets = {k: v for k, v in (secrets or {}).items() if v}
+        self.execute(
+            "INSERT INTO jobs (id, kind, payload, secrets, status, available_at, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, 'queued', ?, ?, ?)",
+            (
+                job_id, kind, json.dumps(payload, ensure_ascii=False),
+                json.dumps(secrets) if secrets else None, now, now, now,
+            ),
+        )
+        return job_id
+
+    def claim(self, worker: str, lease_seconds: float, max_attempts: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Toma el siguiente trabajo listo (o uno con lease vencido) para ``worker``.
+
+        Los trabajos con lease vencido que ya agotaron ``max_attempts`` se marcan
+        ``failed`` (sin payload) en lugar de retomarse.
+        """
+        conn = self.connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if max_attempts is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, payload = '{}', secrets = NULL, lease_until = NULL, "
+                    "updated_at = ? WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                    (f"Lease vencido tras {max_attempts} intentos (el worker murió o se colgó)", now, now, max_attempts),
+                )
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE (status = 'queued' AND available_at <= ?) "
+                "OR (status = 'running' AND lease_until < ?) ORDER BY available_at LIMIT 1",
+                (now, now),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, lease_until = ?, attempts = attempts + 1, "
+                "updated_at = ? WHERE id = ?",
+                (worker, now + lease_seconds, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        job = self.get(row["id"], include_payload=True)
+        if job is not None:
+            job["worker"] = worker
+            secrets = self.query("SELECT secrets FROM jobs WHERE id = ?", (row["id"],))
+            job["secrets"] = json.loads(secrets[0]["secrets"]) if secrets and secrets[0]["secrets"] else {}
+        return job
+
+    def progress(self, job_id: str, worker: str, progress: Dict[str, Any], lease_seconds: float) -> None:
+        """Guarda el progreso y extiende el lease; ``LeaseLost`` si el trabajo ya no es de ``worker``."""
+        now = time.time()
+        cur = self.execute(
+            "UPDATE jobs SET progress = ?, lease_until = ?, updated_at = ? "
+            "WHERE id = ? AND worker = ? AND status = 'running'",
+            (json.dumps(progress, ensure_ascii=False), now + lease_seconds, now, job_id, worker),
+        )
+        if cur.rowcount != 1:
+            raise LeaseLost(f"El trabajo {job_id} fue retomado por otro worker")
+
+    def complete(self, job_id: str, worker: str, result: Dict[str, Any]) -> bool:
+        # ni credenciales ni payload se conservan tras terminar
+        cur = self.execute(
+            "UPDATE jobs SET status = 'done', result = ?, payload = '{}', secrets = NULL, lease_until = NULL, "
+            "updated_at = ? "
+            "WHERE id = ? AND worker = ? AND status = 'running'",
+            (json.dumps(result, ensure_ascii=False), time.time(), job_id, worker),
+        )
+        return cur.rowcount == 1
+
+    def fail(self, job_id: str, worker: str, error: str, retry_in: Optional[float] = None) -> bool:
+        now = time.time()
+        if retry_in is not None:
+            cur = self.execute(
+                "UPDATE jobs SET status = 'queued', error = ?, available_at = ?, lease_until = NULL, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (error, now + retry_in, now, job_id, worker),
+            )
+            return cur.rowcount == 1
+        cur = self.execute(
+            "UPDATE jobs SET status = 'failed', error = ?, payload = '{}', secrets = NULL, lease_until = NULL, "
+            "updated_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (error, now, job_id, worker),
+        )
+        return cur.rowcount == 1
+
+    def get(self, job_id: str, include_payload: bool = False) -> Optional[Dict[str, Any]]:
+        rows = self.query("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return None
+        row = rows[0]
+        job = {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "progress": json.loads(row["progress"]) if row["progress"] else None,
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+        if include_payload:
+            job["payload"] = json.loads(row["payload"])
+        return job
+
+    def metric_samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        """Jobs por estado para ``METRICS``; el conteo recorre la tabla, así que se cachea."""
+        rows = self.cached_rows("SELECT status, COUNT(*) FROM jobs GROUP BY status", Config.METRICS_COUNT_TTL_SECONDS)
+        for status, n in rows or ():
+            yield "moodtune_jobs", {"status": status}, n
+
+
+def _permanent(exc: Optional[BaseException]) -> bool:
+    """``ValueError`` o 4xx del proveedor (también como causa encadenada): no se reintenta."""
+    while exc is not None:
+        if isinstance(exc, ValueError):
+            return True
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+        if isinstance(exc, requests.HTTPError) and status is not None and 400 <= status < 500 and status != 429:
+            return True
+        exc = exc.__cause__
+    return False
+
+
+class JobWorkerPool:
+    """Threads que procesan la cola; uno por ``workers``, iniciados por proceso."""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        workers: int = 2,
+        lease_seconds: float = 600.0,
+        max_attempts: int = 3,
+        poll_seconds: float = 1.0,
+    ):
+        self.queue = queue
+        self.workers = max(0, workers)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.poll_seconds = poll_seconds
+        self.handlers: Dict[str, JobHandler] = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        self.handlers[kind] = handler
+
+    def submit(self, kind: str, payload: Dict[str, Any], secrets: Optional[Dict[str, Any]] = None) -> str:
+        """Encola el trabajo; ``secrets`` se entrega al handler junto al payload pero no se expone."""
+        if kind not in self.handlers:
+            raise ValueError(f"Tipo de trabajo desconocido: {kind}")
+        job_id = self.queue.enqueue(kind, payload, secrets=secrets)
+        self.start()
+        self._wake.set()
+        return job_id
+
+    def start(self) -> None:
+        with self._lock:
+            if self._pid == os.getpid() or self.workers == 0:
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._threads = [
+                threading.Thread(target=self._loop, args=(f"{os.getpid()}-{i}",), name=f"jobs-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def _loop(self, worker: str) -> None:
+        while not self._stop.is_set():
+            try:
+                job = self.queue.claim(worker, self.lease_seconds, self.max_attempts)
+            except Exception:
+                logger.exception("No se pudo leer la cola de trabajos")
+                job = None
+            if job is None:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+                continue
+            self.run_one(job)
+
+    def run_one(self, job: Dict[str, Any]) -> None:
+        job_id, worker = job["job_id"], job["worker"]
+        handler = self.handlers.get(job["kind"])
+        if handler is None:
+            self.queue.fail(job_id, worker, f"Tipo de trabajo desconocido: {job['kind']}")
+            return
+
+        def _progress(progress: Dict[str, Any]) -> None:
+            self.queue.progress(job_id, worker, progress, self.lease_seconds)
+
+        try:
+            result = handler({**job["payload"], **job.get("secrets", {})}, _progress, job_id)
+        except Exception as exc:
+            retry = not _permanent(exc) and job["attempts"] < self.max_attempts
+            logger.warning("Trabajo %s falló (intento %s): %s", job_id, job["attempts"], exc)
+            if not self.queue.fail(job_id, worker, str(exc) or exc.__class__.__name__, retry_in=2.0 ** job["attempts"] if retry else None):
+                logger.warning("Trabajo %s: lease perdido, el resultado queda a cargo del otro worker", job_id)
+            return
+        if not self.queue.complete(job_id, worker, result):
+            logger.warning("Trabajo %s: lease perdido, el resultado queda a cargo del otro worker", job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"workers": self.workers if self._pid == os.getpid() else 0}
+
+
+JOB_QUEUE: Optional[JobQueue] = JobQueue(Config.JOB_QUEUE_PATH) if Config.JOB_QUEUE_PATH else None
+JOB_POOL: Optional[JobWorkerPool] = (
+    JobWorkerPool(
+        JOB_QUEUE,
+        workers=Config.JOB_WORKERS,
+        lease_seconds=Config.JOB_LEASE_SECONDS,
+        max_attempts=Config.JOB_MAX_ATTEMPTS,
+        poll_seconds=Config.JOB_POLL_SECONDS,
+    )
+    if JOB_QUEUE is not None
+    else None
+)
+if JOB_QUEUE is not None:
+    METRICS.register_collector(JOB_QUEUE.metric_samples)
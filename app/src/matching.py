@@ -0,0 +1,155 @@
+"""Puntaje de coincidencia entre una consulta título+artista y candidatos normalizados.
+
+Los proveedores devuelven los primeros N resultados de su búsqueda, que no
+siempre son la pista pedida (versiones en vivo, covers, karaoke...). Aquí se
+compara cada candidato con la consulta usando claves normalizadas:
+
+- minúsculas, sin acentos ni puntuación;
+- sin sufijos de edición ("Remastered 2011", "- Radio Edit", "(Live)") ni
+  invitados entre paréntesis o como sufijo ("(feat. X)", "- ft. X"); un "with"
+  suelto es parte del título ("Stay With Me");
+- artistas con alias (``MATCH_ARTIST_ALIASES``) y sin artículo inicial ("The").
+  El nombre completo se conserva ("Earth, Wind & Fire", "Lil Nas X"); el
+  primer nombre de una lista ("Wisin y Yandel" -> "wisin") solo se usa como
+  alternativa al puntuar.
+
+La similitud por campo es la mejor entre la razón de tokens ordenados
+(``difflib``) y la contención de tokens, proporcional a la fracción de tokens
+cubiertos ("love" frente a "love story" vale la mitad); el puntaje final
+pondera título y artista, de modo que un título exacto de otro artista
+(covers, karaoke) queda bajo el umbral por defecto (``MATCH_MIN_SCORE``). La normalización se memoiza,
+así que lotes de miles de elementos procesan cada texto una sola vez;
+``match_key`` también sirve como clave de deduplicación.
+"""
+
+from __future__ import annotations
+
+import re
+import unicodedata
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import Config
+
+
+TITLE_WEIGHT = 0.6
+
+_BRACKETS = re.compile(r"[\(\[][^\)\]]*[\)\]]")
+_EDITION = re.compile(
+    r"\s-\s.*\b(remaster(ed)?|live|version|edit|mix|mono|stereo|acoustic|demo|deluxe|bonus|single)\b.*$"
+)
+# los "(feat. X)" ya los quita _BRACKETS; aquí solo el sufijo "- feat X"
+_TITLE_FEAT = re.compile(r"\s-\s*(feat|ft|featuring)\b.*$")
+_ARTIST_FEAT = re.compile(r"\s(feat|ft|featuring)\b.*$")
+_PUNCT = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+_ARTIST_SPLIT = re.compile(r"\s*(?:,|&|\bx\b|\band\b|\by\b|/|;)\s*")
+
+
+def parse_aliases(raw: Optional[str]) -> Dict[str, str]:
+    """Parsea ``"alias=canónico,alias2=canónico"`` (ambos lados se normalizan)."""
+    out: Dict[str, str] = {}
+    for part in (raw or "").split(","):
+        alias, _, canonical = part.partition("=")
+        if alias.strip() and canonical.strip():
+            out[_clean(alias)] = _clean(canonical)
+    return out
+
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+
+def _clean(text: str) -> str:
+    text = _PUNCT.sub(" ", _fold(text).replace("&", " and "))
+    return _SPACES.sub(" ", text).strip()
+
+
+_ALIASES = parse_aliases(Config.MATCH_ARTIST_ALIASES)
+
+
+@lru_cache(maxsize=65536)
+def normalize_title(title: str) -> str:
+    text = _fold(title)
+    text = _BRACKETS.sub(" ", text)
+    text = _EDITION.sub("", text)
+    text = _TITLE_FEAT.sub("", text)
+    return _clean(text) or _clean(title)
+
+
+def _artist_name(text: str) -> str:
+    name = _clean(text)
+    name = _ALIASES.get(name, name)
+    if name.startswith("the "):
+        name = name[4:]
+    return name
+
+
+@lru_cache(maxsize=65536)
+def normalize_artist(artist: str) -> str:
+    """Artista normalizado completo (sin invitados "feat.", con alias aplicado)."""
+    return _artist_name(_ARTIST_FEAT.sub("", _fold(artist))) or _artist_name(artist)
+
+
+@lru_cache(maxsize=65536)
+def artist_variants(artist: str) -> Tuple[str, ...]:
+    """El artista completo y, si es una lista ("A, B", "A & B", "A y B"), también el primero."""
+    full = normalize_artist(artist)
+    text = _ARTIST_FEAT.sub("", _fold(artist))
+    main = _artist_name(_ARTIST_SPLIT.split(text)[0]) if text else ""
+    return (full, main) if main and main != full else (full,)
+
+
+def match_key(title: str, artist: str) -> Tuple[str, str]:
+    """Clave normalizada (título, artista) para puntuar y deduplicar."""
+    return normalize_title(title), normalize_artist(artist)
+
+
+@lru_cache(maxsize=65536)
+def similarity(a: str, b: str) -> float:
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    ta, tb = a.split(), b.split()
+    # textos sin relación rondan 0.4-0.5 en difflib: se reescala para que valgan ~0
+    ratio = max(0.0, 2 * SequenceMatcher(None, " ".join(sorted(ta)), " ".join(sorted(tb))).ratio() - 1)
+    shorter, longer = (set(ta), set(tb)) if len(ta) <= len(tb) else (set(tb), set(ta))
+    # todos los tokens de un lado presentes en el otro, escalado por la fracción cubierta
+    contained = 0.9 * len(shorter) / len(longer) if shorter <= longer else 0.0
+    return max(ratio, contained)
+
+
+def _artist_similarity(query: Tuple[str, ...], cand: Tuple[str, ...]) -> float:
+    return max(similarity(a, b) for a in query for b in cand)
+
+
+def score(query: Tuple[str, Tuple[str, ...]], item: Dict[str, Any]) -> float:
+    """``query``: (título normalizado, ``artist_variants`` del artista)."""
+    title = normalize_title(item.get("title") or "")
+    artists = artist_variants(item.get("artist") or "")
+    return round(
+        TITLE_WEIGHT * similarity(query[0], title) + (1 - TITLE_WEIGHT) * _artist_similarity(query[1], artists), 3
+    )
+
+
+def rank_matches(
+    title: str,
+    artist: str,
+    items: List[Dict[str, Any]],
+    min_score: Optional[float] = None,
+    limit: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Copias de ``items`` con ``match_score``, de mejor a peor, sin las bajo ``min_score``.
+
+    Se copian los dicts porque ``items`` puede venir del cache de resoluciones.
+    """
+    threshold = Config.MATCH_MIN_SCORE if min_score is None else min_score
+    query = (normalize_title(title), artist_variants(artist))
+    scored = [{**item, "match_score": score(query, item)} for item in items]
+    # sort estable: a igual puntaje se respeta el orden del proveedor
+    scored.sort(key=lambda item: item["match_score"], reverse=True)
+    ranked = [item for item in scored if item["match_score"] >= threshold]
+    return ranked[:limit] if limit else ranked
@@ -0,0 +1,345 @@
+"""Métricas del camino caliente en formato de texto Prometheus.
+
+Cada proceso acumula contadores e histogramas en memoria (``METRICS``); las
+observaciones solo toman un lock y suman, sin I/O. Para agregar entre workers
+de gunicorn, un thread por proceso vuelca cada ``METRICS_FLUSH_SECONDS`` sus
+valores acumulados a un SQLite compartido (``METRICS_PATH``), una fila por
+proceso y serie; ``/metrics`` vuelca los del proceso actual y suma todas las
+filas (los gauges, que describen estado compartido como un archivo SQLite, toman
+el máximo en vez de sumarse). Los procesos que no escriben en
+``METRICS_RETENTION_SECONDS`` se purgan.
+
+Las familias se declaran en ``FAMILIES``; las rutas upstream se reducen a una
+plantilla (``/v1/playlists/{id}/tracks``) para acotar la cardinalidad.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from .config import Config
+from .storage import SqliteStore
+
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+COUNTER = "counter"
+GAUGE = "gauge"
+HISTOGRAM = "histogram"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# nombre -> (tipo, ayuda)
+FAMILIES: Dict[str, Tuple[str, str]] = {
+    "moodtune_upstream_requests_total": (COUNTER, "Peticiones upstream por host, endpoint, método y status (error = fallo de red)"),
+    "moodtune_upstream_request_duration_seconds": (HISTOGRAM, "Latencia de cada intento upstream, sin la espera del rate limiter"),
+    "moodtune_upstream_wait_seconds": (HISTOGRAM, "Espera de turno en el rate limiter por host"),
+    "moodtune_upstream_retries_total": (COUNTER, "Reintentos upstream (429/5xx) por host y endpoint"),
+    "moodtune_upstream_rejected_total": (COUNTER, "Peticiones no enviadas por circuito abierto o presupuesto agotado"),
+    "moodtune_upstream_request_bytes_total": (COUNTER, "Bytes enviados en el cuerpo de las peticiones upstream"),
+    "moodtune_upstream_response_bytes_total": (COUNTER, "Bytes recibidos en el cuerpo de las respuestas upstream"),
+    "moodtune_token_fetches_total": (COUNTER, "Renovaciones de tokens client credentials por host y resultado"),
+    "moodtune_token_fetch_duration_seconds": (HISTOGRAM, "Duración de la renovación de tokens client credentials"),
+    "moodtune_cache_events_total": (COUNTER, "Aciertos y fallos de los caches locales"),
+    "moodtune_jobs": (GAUGE, "Trabajos de la cola persistente por estado (recontados cada METRICS_COUNT_TTL_SECONDS)"),
+    "moodtune_store_entries": (GAUGE, "Entradas de los almacenes SQLite locales (recontadas cada METRICS_COUNT_TTL_SECONDS)"),
+    "moodtune_http_requests_total": (COUNTER, "Peticiones atendidas por ruta, método y status"),
+    "moodtune_http_request_duration_seconds": (HISTOGRAM, "Duración de las peticiones atendidas por ruta"),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+SeriesKey = Tuple[str, Labels]
+Collector = Callable[[], Iterable[Tuple[str, Dict[str, str], float]]]
+
+_ID_SEGMENT = re.compile(r"^(?=.*\d).{8,}$|^[A-Za-z0-9_-]{21,}$")
+_ID_PARENTS = frozenset({"users", "playlists", "tracks", "albums", "artists", "shows", "episodes"})
+
+
+def endpoint_of(url: str) -> str:
+    """Plantilla de la ruta: los segmentos que parecen IDs pasan a ``{id}``."""
+    out: List[str] = []
+    for segment in urlsplit(url).path.split("/"):
+        if not segment:
+            continue
+        if _ID_SEGMENT.match(segment):
+            out.append("{id}")
+        elif out and out[-1] in _ID_PARENTS:
+            out.append("{id}")
+        else:
+            out.append(segment)
+    return "/" + "/".join(out)
+
+
+def _labels(labels: Optional[Dict[str, Any]]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in (labels or {}).items()))
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self.buckets, value)
+        if i < len(self.counts):
+            self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+    def series(self, name: str, labels: Labels) -> Iterable[Tuple[SeriesKey, float]]:
+        cumulative = 0
+        for bound, n in zip(self.buckets, self.counts):
+            cumulative += n
+            yield (f"{name}_bucket", labels + (("le", _fmt(bound)),)), float(cumulative)
+        yield (f"{name}_bucket", labels + (("le", "+Inf"),)), float(self.count)
+        yield (f"{name}_sum", labels), self.total
+        yield (f"{name}_count", labels), float(self.count)
+
+
+class MetricsRegistry:
+    """Contadores e histogramas en memoria del proceso actual."""
+
+    def __init__(self, enabled: bool = True, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(sorted(buckets))
+        self._counters: Dict[SeriesKey, float] = {}
+        self._histograms: Dict[SeriesKey, _Histogram] = {}
+        self._collectors: List[Collector] = []
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, labels: Optional[Dict[str, Any]] = None, value: float = 1.0) -> None:
+        if not self.enabled:
+            return
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, Any]] = None) -> None:
+        if not self.enabled:
+            return
+        key = (name, _labels(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = _Histogram(self.buckets)
+            hist.observe(value)
+
+    def register_collector(self, collector: Collector) -> None:
+        """``collector`` devuelve ``(nombre, labels, valor)`` de contadores que ya lleva otro componente."""
+        self._collectors.append(collector)
+
+    def samples(self) -> Dict[SeriesKey, float]:
+        """Todas las series del proceso (histogramas expandidos en ``_bucket``/``_sum``/``_count``)."""
+        with self._lock:
+            out = dict(self._counters)
+            for (name, labels), hist in self._histograms.items():
+                out.update(hist.series(name, labels))
+        for collector in self._collectors if self.enabled else ():
+            try:
+                for name, labels, value in collector():
+                    out[(name, _labels(labels))] = float(value)
+            except Exception:
+                logger.debug("Collector de métricas falló", exc_info=True)
+        return out
+
+    def clear(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+class SharedMetrics(SqliteStore):
+    """Valores acumulados de cada proceso, para sumarlos entre workers."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS metric_samples (
+        process TEXT NOT NULL,
+        name TEXT NOT NULL,
+        labels TEXT NOT NULL,
+        value REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (process, name, labels)
+    );
+    CREATE INDEX IF NOT EXISTS metric_samples_updated ON metric_samples (updated_at);
+    """
+
+    def write(self, process: str, samples: Dict[SeriesKey, float]) -> None:
+        now = time.time()
+        self.executemany(
+            "INSERT OR REPLACE INTO metric_samples (process, name, labels, value, updated_at) VALUES (?, ?, ?, ?, ?)",
+            ((process, name, _encode(labels), value, now) for (name, labels), value in samples.items()),
+        )
+
+    def purge(self, older_than: float) -> None:
+        self.execute("DELETE FROM metric_samples WHERE updated_at < ?", (older_than,))
+
+    def totals(self) -> Dict[SeriesKey, float]:
+        rows = self.query(
+            "SELECT name, labels, SUM(value) AS total, MAX(value) AS peak FROM metric_samples GROUP BY name, labels"
+        )
+        return {
+            (row["name"], _decode(row["labels"])): row["peak"] if _is_gauge(row["name"]) else row["total"]
+            for row in rows
+        }
+
+
+def _encode(labels: Labels) -> str:
+    return "\x1f".join(f"{k}\x1e{v}" for k, v in labels)
+
+
+def _decode(raw: str) -> Labels:
+    if not raw:
+        return ()
+    return tuple(tuple(part.split("\x1e", 1)) for part in raw.split("\x1f"))  # type: ignore[misc]
+
+
+def _is_gauge(name: str) -> bool:
+    return FAMILIES.get(name, (COUNTER, ""))[0] == GAUGE
+
+
+def _fmt(value: float) -> str:
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _family_of(name: str) -> str:
+    if name in FAMILIES:
+        return name
+    for suffix in ("_bucket", "_sum", "_count"):
+        if name.endswith(suffix) and name[: -len(suffix)] in FAMILIES:
+            return name[: -len(suffix)]
+    return name
+
+
+def render(samples: Dict[SeriesKey, float]) -> str:
+    """Serializa las series en el formato de exposición de Prometheus."""
+    by_family: Dict[str, List[Tuple[SeriesKey, float]]] = {}
+    for key, value in samples.items():
+        by_family.setdefault(_family_of(key[0]), []).append((key, value))
+    lines: List[str] = []
+    for family in sorted(by_family):
+        kind, help_text = FAMILIES.get(family, ("untyped", ""))
+        if help_text:
+            lines.append(f"# HELP {family} {help_text}")
+        lines.append(f"# TYPE {family} {kind}")
+        for (name, labels), value in sorted(by_family[family], key=_sort_key):
+            label_str = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+            lines.append(f"{name}{{{label_str}}} {_fmt(value)}" if label_str else f"{name} {_fmt(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _sort_key(item: Tuple[SeriesKey, float]) -> Tuple[Any, ...]:
+    (name, labels), _ = item
+    plain = tuple((k, v) for k, v in labels if k != "le")
+    le = next((v for k, v in labels if k == "le"), None)
+    return (plain, name, float("inf") if le == "+Inf" else float(le) if le is not None else 0.0)
+
+
+class MetricsExporter:
+    """Vuelca periódicamente el registro del proceso al almacén compartido."""
+
+    def __init__(
+        self,
+        registry: MetricsRegistry,
+        shared: Optional[SharedMetrics] = None,
+        flush_seconds: float = 5.0,
+        retention_seconds: float = 86400.0,
+    ):
+        self.registry = registry
+        self.shared = shared
+        self.flush_seconds = max(0.5, flush_seconds)
+        self.retention_seconds = retention_seconds
+        self.errors = 0
+        self._process = ""
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Arranca el thread de volcado una vez por proceso (seguro tras el fork de gunicorn)."""
+        if self.shared is None:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            # el pid puede reutilizarse: la identidad incluye el instante de arranque
+            self._process = f"{self._pid}-{time.time():.3f}"
+            threading.Thread(target=self._loop, name="metrics-flush", daemon=True).start()
+
+    def _loop(self) -> None:
+        while True:
+            time.sleep(self.flush_seconds)
+            self.flush()
+
+    def flush(self) -> None:
+        if self.shared is None or self._pid != os.getpid():
+            return
+        try:
+            self.shared.write(self._process, self.registry.samples())
+            self.shared.purge(time.time() - self.retention_seconds)
+        except Exception:
+            self.errors += 1
+            logger.debug("No se pudieron volcar las métricas", exc_info=True)
+
+    def collect(self) -> Dict[SeriesKey, float]:
+        """Series agregadas de todos los workers (o solo las locales sin almacén compartido)."""
+        if self.shared is None:
+            return self.registry.samples()
+        self.start()
+        self.flush()
+        try:
+            return self.shared.totals()
+        except Exception:
+            self.errors += 1
+            return self.registry.samples()
+
+    def exposition(self) -> str:
+        return render(self.collect())
+
+
+METRICS = MetricsRegistry(enabled=Config.METRICS_ENABLED)
+EXPORTER = MetricsExporter(
+    METRICS,
+    shared=SharedMetrics(Config.METRICS_PATH) if Config.METRICS_ENABLED and Config.METRICS_PATH else None,
+    flush_seconds=Config.METRICS_FLUSH_SECONDS,
+    retention_seconds=Config.METRICS_RETENTION_SECONDS,
+)
+
+
+def observe_upstream(
+    host: str,
+    url: str,
+    method: str,
+    status: str,
+    elapsed: float,
+    sent: int = 0,
+    received: int = 0,
+) -> None:
+    """Registra un intento upstream completado (``status`` = código o ``"error"``)."""
+    if not METRICS.enabled:
+        return
+    labels = {"host": host, "endpoint": endpoint_of(url)}
+    METRICS.inc("moodtune_upstream_requests_total", dict(labels, method=method.upper(), status=status))
+    METRICS.observe("moodtune_upstream_request_duration_seconds", elapsed, labels)
+    if sent:
+        METRICS.inc("moodtune_upstream_request_bytes_total", labels, sent)
+    if received:
+        METRICS.inc("moodtune_upstream_response_bytes_total", labels, received)
@@ -0,0 +1,222 @@
+"""Agregador de IDs entre requests concurrentes (micro-batching).
+
+Spotify acepta hasta 100 IDs por llamada a ``/audio-features``, pero los
+llamadores suelen pedir 5–20. ``MicroBatcher`` junta los IDs que llegan durante
+una ventana corta (``AUDIO_FEATURES_BATCH_WINDOW_MS``) y los envía en lotes de
+``max_batch``; cada llamador recibe solo los resultados de sus propios IDs.
+
+Un lote se despacha en cuanto se llena o al vencer la ventana contada desde el
+primer ID pendiente. Los lotes se ejecutan en un pool acotado
+(``AUDIO_FEATURES_BATCH_CONCURRENCY``). ``submit`` devuelve un
+``concurrent.futures.Future`` utilizable desde threads o con
+``asyncio.wrap_future``; ``fetch`` espera como máximo ``timeout`` segundos.
+
+Tras un reload de credenciales ``get_batcher`` reemplaza el batcher y cierra el
+anterior, que despacha lo pendiente y rechaza nuevos IDs con ``BatcherClosed``;
+una instancia con la configuración vieja no recibe batcher y pide directo.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Set, Tuple
+
+
+class BatcherClosed(RuntimeError):
+    """El batcher fue reemplazado (reload); el llamador debe pedir directo."""
+
+
+class _Waiter:
+    __slots__ = ("remaining", "results", "error", "future", "_lock")
+
+    def __init__(self, ids: Sequence[str]):
+        self.remaining = set(t for t in ids if t)
+        self.results: Dict[str, Any] = {}
+        self.error: Optional[BaseException] = None
+        self.future: Future = Future()
+        self.future.set_running_or_notify_cancel()
+        self._lock = threading.Lock()
+
+    def resolve(self, tid: str, result: Dict[str, Any], error: Optional[BaseException]) -> None:
+        with self._lock:
+            if tid in result:
+                self.results[tid] = result[tid]
+            if error is not None and self.error is None:
+                self.error = error
+            self.remaining.discard(tid)
+            if self.remaining:
+                return
+        if self.error is not None:
+            self.future.set_exception(self.error)
+        else:
+            self.future.set_result(self.results)
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        fetch: Callable[[List[str]], Dict[str, Any]],
+        max_batch: int = 100,
+        window: float = 0.005,
+        max_concurrency: int = 4,
+        name: str = "microbatch",
+        timeout: float = 30.0,
+    ):
+        self._fetch = fetch
+        self.max_batch = max(1, max_batch)
+        self.window = max(0.0, window)
+        self.max_concurrency = max(1, max_concurrency)
+        self.name = name
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._pending: Dict[str, List[_Waiter]] = {}
+        self._first_at: Optional[float] = None
+        self._pid: Optional[int] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._closed = False
+        self.callers = 0
+        self.batches = 0
+        self.ids = 0
+
+    def _ensure_started(self) -> None:
+        # perezoso y por proceso: el dispatcher no sobrevive a un fork (gunicorn)
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix=self.name)
+        threading.Thread(target=self._run, name=f"{self.name}-dispatcher", daemon=True).start()
+
+    def submit(self, ids: Sequence[str]) -> Future:
+        """Encola ``ids``; el Future resuelve a ``{id: resultado}`` de esos IDs."""
+        waiter = _Waiter(ids)
+        if not waiter.remaining:
+            waiter.future.set_result({})
+            return waiter.future
+        with self._cond:
+            if self._closed:
+                raise BatcherClosed(f"{self.name} cerrado")
+            self._ensure_started()
+            for tid in waiter.remaining:
+                self._pending.setdefault(tid, []).append(waiter)
+            if self._first_at is None:
+                self._first_at = time.monotonic()
+            self.callers += 1
+            self._cond.notify()
+        return waiter.future
+
+    def fetch(self, ids: Sequence[str], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Como ``submit`` pero bloqueante; ``timeout`` por defecto es el del batcher."""
+        return self.submit(ids).result(self.timeout if timeout is None else timeout)
+
+    def close(self) -> None:
+        """Despacha lo pendiente y termina el dispatcher (p. ej. tras un reload de credenciales)."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def _take_batch(self) -> Optional[Dict[str, List[_Waiter]]]:
+        with self._cond:
+            while not self._pending:
+                if self._closed:
+                    return None
+                self._cond.wait()
+            while len(self._pending) < self.max_batch:
+                left = (self._first_at or 0.0) + self.window - time.monotonic()
+                if left <= 0:
+                    break
+                self._cond.wait(left)
+            batch = {}
+            for tid in list(self._pending)[: self.max_batch]:
+                batch[tid] = self._pending.pop(tid)
+            self._first_at = time.monotonic() if self._pending else None
+            self.batches += 1
+            self.ids += len(batch)
+            return batch
+
+    def _run(self) -> None:
+        assert self._executor is not None
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                self._executor.shutdown(wait=False)
+                return
+            self._executor.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch: Dict[str, List[_Waiter]]) -> None:
+        try:
+            result = self._fetch(list(batch))
+        except Exception as exc:
+            self._dispatch_isolated(batch, exc)
+            return
+        for tid, waiters in batch.items():
+            for waiter in waiters:
+                waiter.resolve(tid, result, None)
+
+    def _dispatch_isolated(self, batch: Dict[str, List[_Waiter]], exc: Exception) -> None:
+        """Si el lote combinado falla (p. ej. 400 por un ID inválido de un llamador),
+        se reintenta por llamador para que el error no afecte a los demás."""
+        groups: Dict[int, List[str]] = {}
+        owners: Dict[int, _Waiter] = {}
+        for tid, waiters in batch.items():
+            for waiter in waiters:
+                groups.setdefault(id(waiter), []).append(tid)
+                owners[id(waiter)] = waiter
+        for key, ids in groups.items():
+            error: Optional[BaseException] = exc
+            result: Dict[str, Any] = {}
+            if len(groups) > 1:
+                try:
+                    result, error = self._fetch(ids), None
+                except Exception as own_exc:
+                    error = own_exc
+            for tid in ids:
+                owners[key].resolve(tid, result, error)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "callers": self.callers,
+            "batches": self.batches,
+            "ids": self.ids,
+            "avg_batch": round(self.ids / self.batches, 2) if self.batches else 0.0,
+            "pending": len(self._pending),
+        }
+
+
+_BATCHERS: Dict[Hashable, Tuple[Hashable, MicroBatcher]] = {}
+_RETIRED: Dict[Hashable, Set[Hashable]] = {}
+_BATCHERS_LOCK = threading.Lock()
+
+
+def get_batcher(
+    key: Hashable, factory: Callable[[], MicroBatcher], version: Hashable = None
+) -> Optional[MicroBatcher]:
+    """Batcher compartido por proceso para ``key`` (p. ej. un client_id de Spotify).
+
+    ``version`` identifica la configuración con la que ``factory`` construye el
+    batcher (p. ej. un hash del secret). Una versión nueva reemplaza el batcher y
+    el anterior se cierra tras despachar lo pendiente; una versión ya reemplazada
+    (instancia vieja aún en uso) recibe ``None`` y no desplaza a la vigente.
+    """
+    entry = _BATCHERS.get(key)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    with _BATCHERS_LOCK:
+        entry = _BATCHERS.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        retired = _RETIRED.setdefault(key, set())
+        if version in retired:
+            return None
+        if entry is not None:
+            retired.add(entry[0])
+            entry[1].close()
+        batcher = factory()
+        _BATCHERS[key] = (version, batcher)
+        return batcher
+
+
+def batchers_stats() -> Dict[str, Dict[str, Any]]:
+    return {str(key): entry[1].stats() for key, entry in list(_BATCHERS.items())}
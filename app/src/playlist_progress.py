@@ -0,0 +1,156 @@
+"""Progreso persistente de escrituras de playlists, indexado por idempotency key.
+
+La key que recibe este almacén ya viene acotada al proveedor y al usuario
+(``PlaylistWriter._scoped_key``); la key del cliente sola no identifica a nadie.
+
+Permite que un reintento del mismo request (misma key) reutilice la playlist ya
+creada y continúe desde el último chunk confirmado en lugar de duplicar pistas.
+
+Solo un escritor a la vez trabaja sobre una key: ``acquire`` toma un lease en
+``playlist_write_leases`` con un único ``UPDATE`` condicional (atómico entre
+workers) y ``renew`` lo extiende tras cada chunk; un segundo request con la
+misma key mientras el primero escribe no obtiene el lease. Las escrituras
+terminadas se borran pasado ``PLAYLIST_PROGRESS_TTL_SECONDS``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+from .config import Config
+from .storage import SqliteStore
+
+
+def uris_digest(uris: List[str]) -> str:
+    return hashlib.sha256("\n".join(uris).encode("utf-8")).hexdigest()
+
+
+class PlaylistProgress(SqliteStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS playlist_writes (
+        idempotency_key TEXT PRIMARY KEY,
+        provider TEXT NOT NULL,
+        playlist_id TEXT,
+        uris_digest TEXT NOT NULL,
+        chunk_size INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        result TEXT,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS playlist_write_chunks (
+        idempotency_key TEXT NOT NULL,
+        chunk_index INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        elapsed_ms INTEGER,
+        snapshot_id TEXT,
+        done_at REAL NOT NULL,
+        PRIMARY KEY (idempotency_key, chunk_index)
+    );
+    CREATE TABLE IF NOT EXISTS playlist_write_leases (
+        idempotency_key TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        lease_until REAL NOT NULL
+    );
+    """
+
+    PURGE_EVERY = 100
+
+    def __init__(self, path: str, ttl_seconds: float = 604800.0):
+        super().__init__(path)
+        self.ttl_seconds = ttl_seconds
+        self._finished = 0
+
+    def begin(self, key: str, provider: str, digest: str, chunk_size: int) -> Dict[str, Any]:
+        """Registra la escritura (si no existe) y devuelve su estado actual.
+
+        Reusar una key con otra lista de URIs es un error del cliente (``ValueError``).
+        """
+        now = time.time()
+        self.execute(
+            "INSERT OR IGNORE INTO playlist_writes "
+            "(idempotency_key, provider, uris_digest, chunk_size, status, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, 'writing', ?, ?)",
+            (key, provider, digest, chunk_size, now, now),
+        )
+        row = self.query("SELECT * FROM playlist_writes WHERE idempotency_key = ?", (key,))[0]
+        if row["uris_digest"] != digest or row["provider"] != provider or row["chunk_size"] != chunk_size:
+            raise ValueError("idempotency_key ya usada con otra playlist")
+        state = dict(row)
+        state["result"] = json.loads(row["result"]) if row["result"] else None
+        return state
+
+    def acquire(self, key: str, owner: str, lease_seconds: float) -> Optional[float]:
+        """Toma el lease de ``key`` para ``owner``; ``None`` si lo obtuvo, si no los segundos que le quedan al otro."""
+        now = time.time()
+        self.execute(
+            "INSERT OR IGNORE INTO playlist_write_leases (idempotency_key, owner, lease_until) VALUES (?, '', 0)",
+            (key,),
+        )
+        if self.renew(key, owner, lease_seconds, now):
+            return None
+        rows = self.query("SELECT lease_until FROM playlist_write_leases WHERE idempotency_key = ?", (key,))
+        return max(0.0, rows[0]["lease_until"] - now) if rows else 0.0
+
+    def renew(self, key: str, owner: str, lease_seconds: float, now: Optional[float] = None) -> bool:
+        """Extiende el lease si sigue siendo de ``owner`` (o está vencido)."""
+        now = time.time() if now is None else now
+        cur = self.execute(
+            "UPDATE playlist_write_leases SET owner = ?, lease_until = ? "
+            "WHERE idempotency_key = ? AND (owner = ? OR lease_until < ?)",
+            (owner, now + lease_seconds, key, owner, now),
+        )
+        return cur.rowcount == 1
+
+    def release(self, key: str, owner: str) -> None:
+        self.execute(
+            "UPDATE playlist_write_leases SET lease_until = 0 WHERE idempotency_key = ? AND owner = ?",
+            (key, owner),
+        )
+
+    def set_playlist(self, key: str, playlist_id: str) -> None:
+        self.execute(
+            "UPDATE playlist_writes SET playlist_id = ?, updated_at = ? WHERE idempotency_key = ?",
+            (playlist_id, time.time(), key),
+        )
+
+    def done_chunks(self, key: str) -> Dict[int, Dict[str, Any]]:
+        rows = self.query(
+            "SELECT chunk_index, size, elapsed_ms, snapshot_id FROM playlist_write_chunks WHERE idempotency_key = ?",
+            (key,),
+        )
+        return {row["chunk_index"]: dict(row) for row in rows}
+
+    def mark_chunk(self, key: str, index: int, size: int, elapsed_ms: Optional[int], snapshot_id: Optional[str]) -> None:
+        self.execute(
+            "INSERT OR REPLACE INTO playlist_write_chunks "
+            "(idempotency_key, chunk_index, size, elapsed_ms, snapshot_id, done_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, index, size, elapsed_ms, snapshot_id, time.time()),
+        )
+
+    def finish(self, key: str, result: Dict[str, Any]) -> None:
+        self.execute(
+            "UPDATE playlist_writes SET status = 'done', result = ?, updated_at = ? WHERE idempotency_key = ?",
+            (json.dumps(result, ensure_ascii=False), time.time(), key),
+        )
+        self._finished += 1
+        if self._finished % self.PURGE_EVERY == 0:
+            self.purge()
+
+    def purge(self) -> int:
+        """Borra las escrituras terminadas hace más de ``ttl_seconds`` (con sus chunks y lease)."""
+        cutoff = time.time() - self.ttl_seconds
+        keys = "SELECT idempotency_key FROM playlist_writes WHERE status = 'done' AND updated_at < ?"
+        self.execute(f"DELETE FROM playlist_write_chunks WHERE idempotency_key IN ({keys})", (cutoff,))
+        self.execute(f"DELETE FROM playlist_write_leases WHERE idempotency_key IN ({keys})", (cutoff,))
+        return self.execute("DELETE FROM playlist_writes WHERE status = 'done' AND updated_at < ?", (cutoff,)).rowcount
+
+
+PLAYLIST_PROGRESS: Optional[PlaylistProgress] = (
+    PlaylistProgress(Config.PLAYLIST_PROGRESS_PATH, ttl_seconds=Config.PLAYLIST_PROGRESS_TTL_SECONDS)
+    if Config.PLAYLIST_PROGRESS_PATH
+    else None
+)
@@ -0,0 +1,366 @@
+"""Pipeline de escritura de playlists: chunks en paralelo, orden correcto y progreso reanudable.
+
+Orden con paralelismo: dos inserts concurrentes con posiciones absolutas
+calculadas de antemano pueden aplicarse en cualquier orden en Spotify y dejar
+las pistas desordenadas. Por eso la playlist crece desde un chunk "semilla"
+central hacia ambos extremos:
+
+- el carril ``prepend`` inserta los chunks anteriores en ``position=0``
+  (del centro hacia el inicio);
+- el carril ``append`` agrega los posteriores al final (del centro hacia el fin).
+
+Ambas operaciones son válidas sin importar cuál se aplique primero, de modo que
+los dos carriles corren en paralelo y la playlist siempre contiene un rango
+contiguo de chunks. Con ``PLAYLIST_WRITE_CONCURRENCY=1`` la semilla es el primer
+chunk y todo se agrega al final, como antes.
+
+Progreso: cada chunk confirmado se registra en ``PlaylistProgress`` bajo la
+idempotency key. Un reintento con la misma key reutiliza la playlist creada y
+continúa desde el rango ya escrito. Si la cantidad de pistas no coincide con el
+progreso guardado (un chunk se aplicó pero su respuesta se perdió), se compara
+el contenido real de la playlist para marcarlo como hecho sin duplicarlo. La
+misma verificación se hace antes de cada reintento interno (``max_rounds``), por
+eso ``add_tracks`` no reintenta por su cuenta.
+
+El progreso solo se guarda cuando hay idempotency key, y mientras se escribe se
+mantiene un lease sobre ella (``PlaylistProgress.acquire``): un request
+concurrente con la misma key recibe ``PlaylistWriteBusy`` en lugar de crear o
+escribir la playlist otra vez.
+
+La key la elige el cliente, así que se guarda acotada al usuario del proveedor
+(``provider_user_id``) o, si no se envía, a un hash del access token: otro
+usuario con la misma key no recibe la playlist de este. Sin ``provider_user_id``,
+un reintento con un token renovado empieza una escritura nueva.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from .batch import run_bounded
+from .circuit import CircuitOpenError
+from .config import Config
+from .playlist_progress import PLAYLIST_PROGRESS, PlaylistProgress, uris_digest
+from .providers.base import ProviderClient
+from .utils import backoff_retry
+
+
+def _retryable(exc: Exception) -> bool:
+    return not isinstance(exc, (requests.HTTPError, CircuitOpenError, PlaylistWriteError))
+
+
+class PlaylistWriteError(RuntimeError):
+    """Escritura incompleta; reintentar con la misma ``idempotency_key`` la reanuda."""
+
+    def __init__(self, message: str, idempotency_key: str, playlist_id: Optional[str], chunks_done: int, chunks_total: int):
+        super().__init__(message)
+        self.idempotency_key = idempotency_key
+        self.playlist_id = playlist_id
+        self.chunks_done = chunks_done
+        self.chunks_total = chunks_total
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "idempotency_key": self.idempotency_key,
+            "external_playlist_id": self.playlist_id,
+            "chunks_done": self.chunks_done,
+            "chunks_total": self.chunks_total,
+        }
+
+
+class PlaylistWriteBusy(RuntimeError):
+    """Otro escritor tiene el lease de la idempotency key; reintentar tras ``retry_after``."""
+
+    def __init__(self, idempotency_key: str, retry_after: float):
+        super().__init__(f"La escritura {idempotency_key} está en curso en otro request")
+        self.idempotency_key = idempotency_key
+        self.retry_after = retry_after
+
+
+class PlaylistWriter:
+    def __init__(
+        self,
+        provider: ProviderClient,
+        progress: Optional[PlaylistProgress] = PLAYLIST_PROGRESS,
+        chunk_size: int = 100,
+        concurrency: Optional[int] = None,
+        max_rounds: int = 3,
+    ):
+        self.provider = provider
+        self.progress = progress
+        self.chunk_size = chunk_size
+        self.concurrency = max(1, min(2, concurrency if concurrency is not None else Config.PLAYLIST_WRITE_CONCURRENCY))
+        self.max_rounds = max(1, max_rounds)
+        self._lock = threading.Lock()
+        self._on_progress: Optional[Callable[[Dict[str, Any]], None]] = None
+        # progreso y lease de la escritura en curso (solo con idempotency key)
+        self._store: Optional[PlaylistProgress] = None
+        self._owner = uuid.uuid4().hex
+        self.lease_seconds = Config.PLAYLIST_WRITE_LEASE_SECONDS
+
+    def write(
+        self,
+        access_token: str,
+        title: str,
+        description: str,
+        uris: List[str],
+        provider_user_id: Optional[str] = None,
+        idempotency_key: Optional[str] = None,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        """Crea la playlist (o retoma una escritura previa) y agrega ``uris`` en orden.
+
+        ``on_progress`` recibe ``{external_playlist_id, chunks_done, chunks_total}``
+        tras crear la playlist y tras cada chunk confirmado.
+        """
+        started = time.monotonic()
+        chunks = [uris[i:i + self.chunk_size] for i in range(0, len(uris), self.chunk_size)]
+        # sin key no hay reintento que reanudar: no se deja progreso persistido
+        self._store = self.progress if idempotency_key else None
+        if self._store is None or not idempotency_key:
+            key = idempotency_key or uuid.uuid4().hex
+            return self._write(access_token, title, description, uris, chunks, key, {}, provider_user_id, on_progress, started)
+        key = self._scoped_key(idempotency_key, provider_user_id, access_token)
+        try:
+            result = self._write_idempotent(
+                access_token, title, description, uris, chunks, key, idempotency_key, provider_user_id, on_progress, started
+            )
+        except PlaylistWriteError as exc:
+            exc.idempotency_key = idempotency_key
+            raise
+        return {**result, "idempotency_key": idempotency_key}
+
+    def _scoped_key(self, idempotency_key: str, provider_user_id: Optional[str], access_token: str) -> str:
+        """Key de almacenamiento: la del cliente acotada a proveedor y usuario (ver docstring del módulo)."""
+        if provider_user_id:
+            owner = f"user:{provider_user_id}"
+        else:
+            owner = "token:" + hashlib.sha256(access_token.encode("utf-8")).hexdigest()[:16]
+        return f"{self.provider.name}:{owner}:{idempotency_key}"
+
+    def _write_idempotent(
+        self,
+        access_token: str,
+        title: str,
+        description: str,
+        uris: List[str],
+        chunks: List[List[str]],
+        key: str,
+        idempotency_key: str,
+        provider_user_id: Optional[str],
+        on_progress: Optional[Callable[[Dict[str, Any]], None]],
+        started: float,
+    ) -> Dict[str, Any]:
+        assert self._store is not None
+        digest = uris_digest(uris)
+        state = self._store.begin(key, self.provider.name, digest, self.chunk_size)
+        if state["status"] == "done" and state["result"]:
+            return {**state["result"], "resumed": True}
+        busy_for = self._store.acquire(key, self._owner, self.lease_seconds)
+        if busy_for is not None:
+            raise PlaylistWriteBusy(idempotency_key, busy_for)
+        try:
+            # releído con el lease: el escritor anterior pudo avanzar o terminar
+            state = self._store.begin(key, self.provider.name, digest, self.chunk_size)
+            if state["status"] == "done" and state["result"]:
+                return {**state["result"], "resumed": True}
+            return self._write(access_token, title, description, uris, chunks, key, state, provider_user_id, on_progress, started)
+        finally:
+            self._store.release(key, self._owner)
+
+    def _write(
+        self,
+        access_token: str,
+        title: str,
+        description: str,
+        uris: List[str],
+        chunks: List[List[str]],
+        key: str,
+        state: Dict[str, Any],
+        provider_user_id: Optional[str],
+        on_progress: Optional[Callable[[Dict[str, Any]], None]],
+        started: float,
+    ) -> Dict[str, Any]:
+        playlist_id = state.get("playlist_id")
+        resumed = bool(playlist_id)
+        if not playlist_id:
+            created = self.provider.create_playlist(access_token, title, description, provider_user_id=provider_user_id)
+            playlist_id = created.get("id") or created.get("uri", "").split(":")[-1]
+            if not playlist_id:
+                raise ValueError("No se pudo obtener ID de playlist del proveedor")
+            if self._store is not None:
+                self._store.set_playlist(key, playlist_id)
+
+        done: Dict[int, Dict[str, Any]] = {}
+        timings: List[Dict[str, Any]] = []
+        rounds = {"n": 0}
+        self._on_progress = on_progress
+        self._report(key, playlist_id, 0, len(chunks))
+
+        def _round() -> None:
+            self._hold_lease(key, playlist_id, done, chunks)
+            if resumed and rounds["n"] == 0 and self._store is not None:
+                done.update(self._store.done_chunks(key))
+                timings.extend(self._timing(i, len(chunks[i]), "resumed", None) for i in sorted(done))
+            if resumed or rounds["n"] > 0:
+                self._reconcile(access_token, key, playlist_id, chunks, done, timings)
+            rounds["n"] += 1
+            self._write_chunks(access_token, key, playlist_id, chunks, done, timings)
+
+        try:
+            backoff_retry(_round, max_tries=self.max_rounds, retry_if=_retryable)
+        except PlaylistWriteError:
+            raise
+        except Exception as exc:
+            raise PlaylistWriteError(str(exc), key, playlist_id, len(done), len(chunks)) from exc
+
+        result = {
+            "provider": self.provider.name,
+            "external_playlist_id": playlist_id,
+            "deep_link_url": self.provider.make_deeplink(playlist_id),
+            "title": title,
+            "description": description,
+            "tracks_added": len(uris),
+            "idempotency_key": key,
+            "chunks": sorted(timings, key=lambda t: t["index"]),
+            "elapsed_ms": int((time.monotonic() - started) * 1000),
+        }
+        if self._store is not None:
+            self._store.finish(key, result)
+        return {**result, "resumed": resumed}
+
+    def _report(self, key: str, playlist_id: str, chunks_done: int, chunks_total: int) -> None:
+        """Notifica ``on_progress``; si falla (p. ej. el job perdió su lease) la escritura se detiene sin reintentar."""
+        if self._on_progress is None:
+            return
+        try:
+            self._on_progress(
+                {"external_playlist_id": playlist_id, "chunks_done": chunks_done, "chunks_total": chunks_total}
+            )
+        except Exception as exc:
+            raise PlaylistWriteError(f"Escritura detenida: {exc}", key, playlist_id, chunks_done, chunks_total) from exc
+
+    def _hold_lease(self, key: str, playlist_id: str, done: Dict[int, Any], chunks: List[List[str]]) -> None:
+        """Renueva el lease; si otro escritor lo tomó (lease vencido) se deja de escribir."""
+        if self._store is not None and not self._store.renew(key, self._owner, self.lease_seconds):
+            raise PlaylistWriteError(
+                "Se perdió el lease de la escritura (otro request la retomó)",
+                key, playlist_id, len(done), len(chunks),
+            )
+
+    def _timing(self, index: int, size: int, mode: str, elapsed_ms: Optional[int]) -> Dict[str, Any]:
+        return {"index": index, "offset": index * self.chunk_size, "size": size, "mode": mode, "elapsed_ms": elapsed_ms}
+
+    def _put(
+        self,
+        access_token: str,
+        key: str,
+        playlist_id: str,
+        chunks: List[List[str]],
+        index: int,
+        mode: str,
+        done: Dict[int, Dict[str, Any]],
+        timings: List[Dict[str, Any]],
+    ) -> None:
+        chunk = chunks[index]
+        t0 = time.monotonic()
+        snapshot_id = self.provider.add_tracks(
+            access_token, playlist_id, chunk, position=0 if mode == "prepend" else None
+        )
+        elapsed_ms = int((time.monotonic() - t0) * 1000)
+        if self._store is not None:
+            self._store.mark_chunk(key, index, len(chunk), elapsed_ms, snapshot_id)
+        self._hold_lease(key, playlist_id, done, chunks)
+        with self._lock:
+            done[index] = {"size": len(chunk), "elapsed_ms": elapsed_ms, "snapshot_id": snapshot_id}
+            timings.append(self._timing(index, len(chunk), mode, elapsed_ms))
+            self._report(key, playlist_id, len(done), len(chunks))
+
+    def _write_chunks(
+        self,
+        access_token: str,
+        key: str,
+        playlist_id: str,
+        chunks: List[List[str]],
+        done: Dict[int, Dict[str, Any]],
+        timings: List[Dict[str, Any]],
+    ) -> None:
+        if not chunks:
+            return
+        if not done:
+            seed = len(chunks) // 2 if self.concurrency > 1 else 0
+            self._put(access_token, key, playlist_id, chunks, seed, "append", done, timings)
+        lo, hi = min(done), max(done)
+        if len(done) != hi - lo + 1:
+            raise RuntimeError("Progreso de escritura inconsistente (chunks no contiguos)")
+
+        lanes: List[Tuple[str, range]] = []
+        if lo > 0:
+            lanes.append(("prepend", range(lo - 1, -1, -1)))
+        if hi < len(chunks) - 1:
+            lanes.append(("append", range(hi + 1, len(chunks))))
+
+        errors: List[Exception] = []
+
+        def _lane(lane: Tuple[str, range]) -> None:
+            mode, indexes = lane
+            try:
+                for index in indexes:
+                    self._put(access_token, key, playlist_id, chunks, index, mode, done, timings)
+            except Exception as exc:
+                errors.append(exc)
+
+        run_bounded(_lane, lanes, self.concurrency)
+        if errors:
+            raise errors[0]
+
+    def _reconcile(
+        self,
+        access_token: str,
+        key: str,
+        playlist_id: str,
+        chunks: List[List[str]],
+        done: Dict[int, Dict[str, Any]],
+        timings: List[Dict[str, Any]],
+    ) -> None:
+        """Agrega a ``done`` los chunks aplicados sin confirmación (ver docstring del módulo)."""
+        expected = sum(len(chunks[i]) for i in done)
+        if self.provider.playlist_length(access_token, playlist_id) == expected:
+            return
+        playlist = self.provider.fetch_playlist(access_token, playlist_id)
+        current = [t.get("uri") for t in playlist.get("tracks") or []]
+        found = self._match_range(chunks, done, current)
+        if found is None:
+            raise PlaylistWriteError(
+                "La playlist fue modificada fuera de esta escritura; no se puede reanudar",
+                key, playlist_id, len(done), len(chunks),
+            )
+        for index in range(found[0], found[1] + 1):
+            if index not in done:
+                if self._store is not None:
+                    self._store.mark_chunk(key, index, len(chunks[index]), None, None)
+                done[index] = {"size": len(chunks[index]), "elapsed_ms": None, "snapshot_id": None}
+                timings.append(self._timing(index, len(chunks[index]), "verified", None))
+
+    @staticmethod
+    def _match_range(chunks: List[List[str]], done: Dict[int, Any], current: List[str]) -> Optional[Tuple[int, int]]:
+        """Rango contiguo ``[a, b]`` de chunks cuyo contenido coincide con ``current``.
+
+        Solo puede diferir del progreso guardado en el chunk en vuelo de cada extremo.
+        """
+        last = len(chunks) - 1
+        if done:
+            lo, hi = min(done), max(done)
+            candidates = [(a, b) for a in {max(0, lo - 1), lo} for b in {hi, min(last, hi + 1)}]
+        else:
+            candidates = [(i, i) for i in range(len(chunks))]
+        for a, b in candidates:
+            if [u for chunk in chunks[a:b + 1] for u in chunk] == current:
+                return a, b
+        return None
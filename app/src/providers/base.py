@@ -7,11 +7,19 @@ class ProviderClient:
     def create_playlist(self, access_token: str, title: str, description: str, provider_user_id: Optional[str] = None) -> Dict[str, Any]:
         raise NotImplementedError
 
-    def add_tracks(self, access_token: str, playlist_id: str, uris: List[str]) -> None:
+    def add_tracks(self, access_token: str, playlist_id: str, uris: List[str], position: Optional[int] = None) -> Optional[str]:
+        """Agrega ``uris`` en ``position`` (o al final si es ``None``); devuelve el snapshot si existe."""
+        raise NotImplementedError
+
+    def playlist_length(self, access_token: str, playlist_id: str) -> int:
         raise NotImplementedError
 
     def make_deeplink(self, playlist_id: str) -> str:
         raise NotImplementedError
 
-    def fetch_playlist(self, access_token: str, playlist_id: str) -> Dict[str, Any]:
+    def playlist_snapshot(self, access_token: str, playlist_id: str) -> Optional[str]:
+        """Versión actual de la playlist (``None`` si el proveedor no la expone)."""
+        return None
+
+    def fetch_playlist(self, access_token: str, playlist_id: str, snapshot_id: Optional[str] = None) -> Dict[str, Any]:
         raise NotImplementedError
@@ -1,9 +1,19 @@
-from typing import List, Dict, Any, Optional
+from typing import Iterator, List, Dict, Any, Optional
 import requests
+from ..batch import iter_bounded
+from ..cache import PLAYLIST_CACHE
+from ..circuit import CircuitOpenError
+from ..config import Config
+from ..transport import TRANSPORT
 from ..utils import backoff_retry
 from .base import ProviderClient
 
 
+def _retryable(exc: Exception) -> bool:
+    """Los 4xx (incluido un 429 que el transporte ya reintentó) y un circuito abierto no se repiten aquí."""
+    return not isinstance(exc, (requests.HTTPError, CircuitOpenError))
+
+
 class SpotifyProvider(ProviderClient):
     name = "spotify"
 
@@ -15,7 +25,7 @@ class SpotifyProvider(ProviderClient):
     def _resolve_user_id(self, access_token: str, provider_user_id: Optional[str]) -> str:
         if provider_user_id:
             return provider_user_id
-        r = requests.get(f"{self.API_BASE}/me", headers=self._auth_headers(access_token), timeout=20)
+        r = TRANSPORT.get(f"{self.API_BASE}/me", headers=self._auth_headers(access_token))
         if r.status_code >= 500:
             raise RuntimeError(f"Spotify error {r.status_code}")
         r.raise_for_status()
@@ -28,11 +38,10 @@ class SpotifyProvider(ProviderClient):
     def create_playlist(self, access_token: str, title: str, description: str, provider_user_id: Optional[str] = None) -> Dict[str, Any]:
         def _do():
             user_id = self._resolve_user_id(access_token, provider_user_id)
-            r = requests.post(
+            r = TRANSPORT.post(
                 f"{self.API_BASE}/users/{user_id}/playlists",
                 headers=self._auth_headers(access_token),
                 json={"name": title, "description": description, "public": False},
-                timeout=20,
             )
             if r.status_code >= 500:
                 raise RuntimeError(f"Spotify error {r.status_code}")
@@ -41,76 +50,220 @@ class SpotifyProvider(ProviderClient):
                 raise requests.HTTPError(r.text, response=r)
             return r.json()
 
-        return backoff_retry(_do, max_tries=3)
+        return backoff_retry(_do, max_tries=3, retry_if=_retryable)
+
+    def add_tracks(self, access_token: str, playlist_id: str, uris: List[str], position: Optional[int] = None) -> Optional[str]:
+        body: Dict[str, Any] = {"uris": uris}
+        if position is not None:
+            body["position"] = position
 
-    def add_tracks(self, access_token: str, playlist_id: str, uris: List[str]) -> None:
         def _do():
-            r = requests.post(
+            r = TRANSPORT.post(
                 f"{self.API_BASE}/playlists/{playlist_id}/tracks",
                 headers=self._auth_headers(access_token),
-                json={"uris": uris},
-                timeout=20,
+                json=body,
             )
             if r.status_code >= 500:
                 raise RuntimeError(f"Spotify error {r.status_code}")
             if r.status_code >= 400:
                 raise requests.HTTPError(r.text, response=r)
-            return None
+            return (r.json() or {}).get("snapshot_id") if r.content else None
 
-        return backoff_retry(_do, max_tries=3)
+        # sin reintento propio: un 5xx puede haber insertado las pistas igual;
+        # PlaylistWriter verifica el contenido antes de reintentar
+        return _do()
+
+    def playlist_length(self, access_token: str, playlist_id: str) -> int:
+        data = self._get_json(access_token, f"{self.API_BASE}/playlists/{playlist_id}", {"fields": "tracks.total"})
+        return int((data.get("tracks") or {}).get("total") or 0)
 
     def make_deeplink(self, playlist_id: str) -> str:
         return f"https://open.spotify.com/playlist/{playlist_id}"
 
-    def fetch_playlist(self, access_token: str, playlist_id: str) -> Dict[str, Any]:
-        def _fetch(url: str):
-            r = requests.get(url, headers=self._auth_headers(access_token), params={"market": "US"}, timeout=20)
-            if r.status_code >= 500:
-                raise RuntimeError(f"Spotify error {r.status_code}")
-            r.raise_for_status()
-            return r.json()
+    # Solo los atributos que lee ``_transform`` (y los metadatos de la playlist)
+    TRACK_ITEM_FIELDS = (
+        "items(added_at,track(id,uri,name,duration_ms,preview_url,external_urls,"
+        "artists(name),album(name,images)))"
+    )
+    PLAYLIST_FIELDS = (
+        "id,snapshot_id,name,description,owner(display_name),images,external_urls,"
+        f"tracks(total,limit,next,{TRACK_ITEM_FIELDS})"
+    )
+    PAGE_SIZE = 100
 
-        data = _fetch(f"{self.API_BASE}/playlists/{playlist_id}")
-        playlist_tracks = []
-        tracks_data = data.get("tracks") or {}
-        items = tracks_data.get("items") or []
-        next_url = tracks_data.get("next")
+    @staticmethod
+    def _transform(item: Dict[str, Any]) -> Dict[str, Any]:
+        track = item.get("track") or {}
+        artists = ", ".join(a.get("name") for a in (track.get("artists") or []) if a.get("name"))
+        album = (track.get("album") or {}).get("name")
+        images = (track.get("album") or {}).get("images") or []
+        image_url = images[0]["url"] if images else None
+        return {
+            "id": track.get("id"),
+            "uri": track.get("uri"),
+            "title": track.get("name"),
+            "artist": artists,
+            "album": album,
+            "duration_ms": track.get("duration_ms"),
+            "preview_url": track.get("preview_url"),
+            "image_url": image_url,
+            "external_urls": track.get("external_urls"),
+            "added_at": item.get("added_at"),
+        }
 
-        def _transform(item: Dict[str, Any]) -> Dict[str, Any]:
-            track = item.get("track") or {}
-            artists = ", ".join(a.get("name") for a in (track.get("artists") or []) if a.get("name"))
-            album = (track.get("album") or {}).get("name")
-            images = (track.get("album") or {}).get("images") or []
-            image_url = images[0]["url"] if images else None
-            return {
-                "id": track.get("id"),
-                "uri": track.get("uri"),
-                "title": track.get("name"),
-                "artist": artists,
-                "album": album,
-                "duration_ms": track.get("duration_ms"),
-                "preview_url": track.get("preview_url"),
-                "image_url": image_url,
-                "external_urls": track.get("external_urls"),
-                "added_at": item.get("added_at"),
-            }
-
-        playlist_tracks.extend([_transform(it) for it in items if it.get("track")])
+    def _get_json(self, access_token: str, url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        query = {"market": "US"}
+        query.update(params or {})
+        r = TRANSPORT.get(url, headers=self._auth_headers(access_token), params=query)
+        if r.status_code >= 500:
+            raise RuntimeError(f"Spotify error {r.status_code}")
+        r.raise_for_status()
+        return r.json()
 
-        while next_url:
-            next_data = _fetch(next_url)
-            next_items = (next_data.get("items") or []) if "items" in next_data else []
-            playlist_tracks.extend([_transform(it) for it in next_items if it.get("track")])
-            next_url = next_data.get("next")
+    def _fetch_tracks_page(self, access_token: str, playlist_id: str, offset: int, project_fields: bool) -> List[Dict[str, Any]]:
+        params: Dict[str, Any] = {"offset": offset, "limit": self.PAGE_SIZE}
+        if project_fields:
+            params["fields"] = self.TRACK_ITEM_FIELDS
+        data = self._get_json(access_token, f"{self.API_BASE}/playlists/{playlist_id}/tracks", params)
+        return data.get("items") or []
 
+    def _remaining_offsets(self, tracks_data: Dict[str, Any]) -> List[int]:
+        total = tracks_data.get("total")
+        first_len = len(tracks_data.get("items") or [])
+        if not tracks_data.get("next") or not isinstance(total, int) or first_len == 0:
+            return []
+        return list(range(first_len, total, self.PAGE_SIZE))
+
+    def _playlist_header(self, data: Dict[str, Any], playlist_id: str) -> Dict[str, Any]:
+        tracks_data = data.get("tracks") or {}
         return {
             "provider": self.name,
             "playlist_id": data.get("id") or playlist_id,
+            "snapshot_id": data.get("snapshot_id"),
             "title": data.get("name"),
             "description": data.get("description"),
             "owner": (data.get("owner") or {}).get("display_name"),
-            "tracks": playlist_tracks,
-            "tracks_total": data.get("tracks", {}).get("total", len(playlist_tracks)),
+            "tracks_total": tracks_data.get("total"),
             "images": data.get("images"),
             "external_url": (data.get("external_urls") or {}).get("spotify"),
         }
+
+    CONTENT_KEYS = (
+        "provider", "playlist_id", "snapshot_id", "title", "description", "owner",
+        "tracks", "tracks_total", "images", "external_url",
+    )
+
+    def playlist_snapshot(self, access_token: str, playlist_id: str) -> Optional[str]:
+        """``snapshot_id`` actual (una respuesta de pocos bytes; también valida el acceso del token)."""
+        data = self._get_json(access_token, f"{self.API_BASE}/playlists/{playlist_id}", {"fields": "snapshot_id"})
+        return data.get("snapshot_id")
+
+    def _content_key(self, playlist_id: str, snapshot_id: str) -> str:
+        # sin make_key: los IDs de Spotify distinguen mayúsculas
+        return "\x1f".join((self.name, playlist_id, snapshot_id))
+
+    def iter_playlist(
+        self,
+        access_token: str,
+        playlist_id: str,
+        project_fields: Optional[bool] = None,
+        snapshot_id: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Partes de la playlist desde ``PLAYLIST_CACHE`` o, si cambió, desde Spotify.
+
+        Primero se consulta solo el ``snapshot_id`` (salvo que el llamador ya lo
+        tenga); si hay contenido guardado para ese snapshot se devuelve como una
+        cabecera y una única página. Si no, se descarga (``_iter_upstream``) y al
+        terminar se guarda con el snapshot de la propia descarga.
+        """
+        use_cache = PLAYLIST_CACHE.ttl > 0
+        if use_cache and snapshot_id is None:
+            snapshot_id = self.playlist_snapshot(access_token, playlist_id)
+        cached = PLAYLIST_CACHE.get(self._content_key(playlist_id, snapshot_id)) if use_cache and snapshot_id else None
+        if cached is not None:
+            yield {"type": "playlist", **{k: v for k, v in cached.items() if k != "tracks"}}
+            yield {"type": "page", "offset": 0, "tracks": cached["tracks"]}
+            return
+        header: Dict[str, Any] = {}
+        pages: Dict[int, List[Dict[str, Any]]] = {}
+        for part in self._iter_upstream(access_token, playlist_id, project_fields):
+            if part["type"] == "playlist":
+                header = part
+            else:
+                pages[part["offset"]] = part["tracks"]
+            yield part
+        if use_cache and header.get("snapshot_id"):
+            PLAYLIST_CACHE.set(self._content_key(playlist_id, header["snapshot_id"]), self._assemble(header, pages))
+
+    def _iter_upstream(
+        self, access_token: str, playlist_id: str, project_fields: Optional[bool] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Genera la playlist por partes: primero la cabecera y luego cada página.
+
+        - ``{"type": "playlist", ...metadatos}``
+        - ``{"type": "page", "offset": int, "tracks": [...]}`` a medida que llegan
+          (las páginas paralelas pueden llegar fuera de orden; ``offset`` indica
+          su posición).
+
+        La primera respuesta trae ``tracks.total``; con eso se calculan todos los
+        offsets restantes y las páginas se piden en paralelo (máximo
+        ``PLAYLIST_PAGE_CONCURRENCY``). Con ``project_fields`` solo se descargan
+        los atributos que usa ``_transform``.
+        """
+        if project_fields is None:
+            project_fields = Config.PLAYLIST_FIELDS_PROJECTION
+        params = {"fields": self.PLAYLIST_FIELDS} if project_fields else None
+        data = self._get_json(access_token, f"{self.API_BASE}/playlists/{playlist_id}", params)
+        tracks_data = data.get("tracks") or {}
+        first_items = tracks_data.get("items") or []
+        yield {"type": "playlist", **self._playlist_header(data, playlist_id)}
+        yield {"type": "page", "offset": 0, "tracks": [self._transform(it) for it in first_items if it.get("track")]}
+
+        offsets = self._remaining_offsets(tracks_data)
+        if offsets:
+            outcomes = iter_bounded(
+                lambda offset: self._fetch_tracks_page(access_token, playlist_id, offset, project_fields),
+                offsets,
+                Config.PLAYLIST_PAGE_CONCURRENCY,
+            )
+            for outcome in outcomes:
+                if not outcome.ok:
+                    raise RuntimeError(f"Spotify error al paginar playlist: {outcome.error}")
+                tracks = [self._transform(it) for it in outcome.value if it.get("track")]
+                yield {"type": "page", "offset": offsets[outcome.index], "tracks": tracks}
+            return
+
+        # sin total fiable: seguir los enlaces next de forma secuencial
+        offset = len(first_items)
+        next_url = tracks_data.get("next")
+        while next_url:
+            next_data = self._get_json(access_token, next_url)
+            next_items = next_data.get("items") or []
+            yield {"type": "page", "offset": offset, "tracks": [self._transform(it) for it in next_items if it.get("track")]}
+            offset += len(next_items)
+            next_url = next_data.get("next")
+
+    def fetch_playlist(
+        self,
+        access_token: str,
+        playlist_id: str,
+        project_fields: Optional[bool] = None,
+        snapshot_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Playlist completa (del cache si el snapshot no cambió; si no, páginas en paralelo unidas en orden)."""
+        header: Dict[str, Any] = {}
+        pages: Dict[int, List[Dict[str, Any]]] = {}
+        for part in self.iter_playlist(access_token, playlist_id, project_fields, snapshot_id):
+            if part["type"] == "playlist":
+                header = part
+            else:
+                pages[part["offset"]] = part["tracks"]
+        return self._assemble(header, pages)
+
+    def _assemble(self, header: Dict[str, Any], pages: Dict[int, List[Dict[str, Any]]]) -> Dict[str, Any]:
+        playlist_tracks = [t for offset in sorted(pages) for t in pages[offset]]
+        payload = {k: v for k, v in header.items() if k != "type"}
+        payload["tracks"] = playlist_tracks
+        if payload.get("tracks_total") is None:
+            payload["tracks_total"] = len(playlist_tracks)
+        return {key: payload.get(key) for key in self.CONTENT_KEYS}
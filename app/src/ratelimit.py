@@ -0,0 +1,169 @@
+"""Planificador de peticiones upstream con presupuesto por host.
+
+Cada host (api.spotify.com, itunes.apple.com, ...) tiene un token bucket
+configurable (``RATE_LIMITS``). Antes de cada llamada el transporte reserva un
+token: si la espera necesaria supera ``RATE_LIMIT_MAX_WAIT_SECONDS`` la petición
+se descarta con ``RateLimited`` en lugar de encolarse indefinidamente. Un 429 con
+``Retry-After`` bloquea el host completo hasta ese instante, de modo que todos
+los threads del proceso respetan la misma pausa.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+import requests
+
+from .config import Config
+
+
+class RateLimited(requests.RequestException):
+    """El presupuesto del host está agotado (o bloqueado por Retry-After)."""
+
+    def __init__(self, host: str, retry_after: float):
+        super().__init__(f"Rate limit local para {host}; reintentar en {retry_after:.1f}s")
+        self.host = host
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str], default: float = 1.0) -> float:
+    """Interpreta ``Retry-After`` en segundos o como fecha HTTP."""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+def parse_rate_limits(raw: Optional[str]) -> Dict[str, Tuple[float, float]]:
+    """Parsea ``"host=rate:burst,host2=rate:burst"`` (rate en peticiones/segundo)."""
+    out: Dict[str, Tuple[float, float]] = {}
+    for part in (raw or "").split(","):
+        host, _, values = part.strip().partition("=")
+        if not host or not values:
+            continue
+        rate, _, burst = values.partition(":")
+        try:
+            out[host.strip().lower()] = (float(rate), float(burst or rate))
+        except ValueError:
+            continue
+    return out
+
+
+class TokenBucket:
+    """Token bucket con reservas: los tokens pueden quedar en negativo y la deuda
+    define cuánto debe esperar cada llamador (orden FIFO aproximado).
+
+    ``rate <= 0`` desactiva el límite de tasa y solo aplica bloqueos por Retry-After.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        if self.rate > 0:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Reserva un token y devuelve los segundos a esperar antes de usarlo."""
+        now = time.monotonic()
+        with self._lock:
+            self._refill(now)
+            wait = max(0.0, self.blocked_until - now)
+            if self.rate > 0:
+                self.tokens -= 1
+                if self.tokens < 0:
+                    wait = max(wait, -self.tokens / self.rate)
+            return wait
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self.rate > 0:
+                self.tokens = min(self.capacity, self.tokens + 1)
+
+    def block_for(self, seconds: float) -> None:
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class RateScheduler:
+    def __init__(self, limits: Optional[Dict[str, Tuple[float, float]]] = None, max_wait: float = 10.0):
+        self.limits = dict(limits or {})
+        self.max_wait = max_wait
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+        self.waited = 0
+        self.shed = 0
+        self.throttled = 0
+
+    @classmethod
+    def from_config(cls) -> "RateScheduler":
+        return cls(parse_rate_limits(Config.RATE_LIMITS), Config.RATE_LIMIT_MAX_WAIT_SECONDS)
+
+    def bucket(self, host: str) -> TokenBucket:
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(host)
+                if bucket is None:
+                    rate, burst = self.limits.get(host, (0.0, 1.0))
+                    bucket = self._buckets[host] = TokenBucket(rate, burst)
+        return bucket
+
+    def _count(self, counter: str) -> None:
+        # los contadores se actualizan desde muchos threads: ``+=`` sin lock pierde incrementos
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _reserve(self, host: str) -> float:
+        bucket = self.bucket(host)
+        wait = bucket.reserve()
+        if wait > self.max_wait:
+            bucket.cancel()
+            self._count("shed")
+            raise RateLimited(host, wait)
+        if wait > 0:
+            self._count("waited")
+        return wait
+
+    def acquire(self, host: str) -> None:
+        """Espera (acotado por ``max_wait``) hasta tener turno para ``host``."""
+        wait = self._reserve(host)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, host: str) -> None:
+        wait = self._reserve(host)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def on_throttled(self, host: str, retry_after: float) -> None:
+        """Registra un 429: bloquea el host para todos los llamadores del proceso."""
+        self._count("throttled")
+        self.bucket(host).block_for(retry_after)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "limits": {h: {"rate": r, "burst": b} for h, (r, b) in sorted(self.limits.items())},
+            "waited": self.waited,
+            "shed": self.shed,
+            "throttled": self.throttled,
+        }
+
+
+SCHEDULER = RateScheduler.from_config()
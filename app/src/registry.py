@@ -0,0 +1,211 @@
+"""Registro de servicios y proveedores de larga vida, uno por worker.
+
+Las rutas piden aquí sus instancias (``SERVICES.catalog("spotify")``,
+``SERVICES.playlists("spotify")``, ``SERVICES.credentials("amazon_music")``) en
+lugar de construirlas en cada request: la configuración, la validación de
+credenciales y el armado del objeto ocurren una sola vez y todas las llamadas
+comparten el mismo objeto (y con él, sus sesiones y tokens). Las instancias
+registradas no guardan estado por request, así que son seguras entre threads.
+
+Cada fábrica declara las claves de ``Config`` de las que depende. ``reload``
+relee el ``.env`` (``SERVICE_ENV_FILE``), actualiza esas claves en ``Config`` y
+descarta solo las instancias cuya configuración cambió; con
+``SERVICE_RELOAD_SECONDS`` > 0 se hace automáticamente cuando cambia la fecha
+de modificación del archivo. ``warm_up`` construye de antemano las instancias
+de los proveedores configurados (ver ``warmup``) e informa cuánto tardó cada una.
+
+Los módulos de proveedores opcionales (Amazon Music, Apple Music) se importan
+recién cuando se construye su primera instancia: un proveedor sin credenciales
+no agrega tiempo de import al arranque del worker.
+"""
+
+from __future__ import annotations
+
+import importlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from dotenv import dotenv_values
+
+from .config import Config
+from .providers.spotify import SpotifyProvider
+from .services.base import ServiceProvider
+from .services.itunes_service import ItunesService
+from .services.spotify_auth import SpotifyClientCredentials
+from .services.spotify_service import SpotifyService
+
+
+logger = logging.getLogger(__name__)
+
+Factory = Callable[[], Any]
+
+
+class ServiceRegistry:
+    def __init__(self, env_file: Optional[str] = ".env", reload_seconds: float = 0.0):
+        self.env_file = env_file
+        self.reload_seconds = reload_seconds
+        self._factories: Dict[str, Tuple[Factory, Tuple[str, ...]]] = {}
+        self._required: Dict[str, Tuple[str, ...]] = {}
+        self._instances: Dict[str, Tuple[Tuple[Any, ...], Any]] = {}
+        self._lock = threading.Lock()
+        self._env_mtime = self._mtime()
+        self._next_check = time.monotonic() + reload_seconds
+        self.builds = 0
+        self.reloads = 0
+
+    def register(
+        self, name: str, factory: Factory, config_keys: Iterable[str] = (), required: Iterable[str] = ()
+    ) -> None:
+        """``required``: claves de ``Config`` sin las cuales el servicio no está configurado."""
+        with self._lock:
+            self._factories[name] = (factory, tuple(config_keys))
+            self._required[name] = tuple(required)
+            self._instances.pop(name, None)
+
+    def names(self) -> List[str]:
+        return sorted(self._factories)
+
+    def configured(self, name: str) -> bool:
+        return name in self._factories and all(getattr(Config, key, None) for key in self._required[name])
+
+    def built(self, prefix: str = "") -> Dict[str, Any]:
+        """Instancias ya construidas (sin construir las que faltan)."""
+        return {name: entry[1] for name, entry in list(self._instances.items()) if name.startswith(prefix)}
+
+    @staticmethod
+    def _fingerprint(keys: Tuple[str, ...]) -> Tuple[Any, ...]:
+        return tuple(getattr(Config, key, None) for key in keys)
+
+    def get(self, name: str) -> Any:
+        """Instancia compartida de ``name``; se construye la primera vez (o tras un ``reload``)."""
+        if self.reload_seconds > 0 and time.monotonic() >= self._next_check:
+            self._check_env_file()
+        entry = self._instances.get(name)
+        if entry is not None:
+            return entry[1]
+        if name not in self._factories:
+            raise KeyError(f"Servicio no registrado: {name}")
+        with self._lock:
+            entry = self._instances.get(name)
+            if entry is None:
+                factory, keys = self._factories[name]
+                # las fábricas que fallan (p. ej. sin credenciales) no se cachean
+                entry = (self._fingerprint(keys), factory())
+                self._instances[name] = entry
+                self.builds += 1
+        return entry[1]
+
+    def catalog(self, provider: Optional[str]) -> ServiceProvider:
+        """Servicio de catálogo; los proveedores desconocidos usan Spotify."""
+        name = f"catalog.{(provider or '').lower()}"
+        return self.get(name if name in self._factories else "catalog.spotify")
+
+    def playlists(self, provider: Optional[str]) -> Any:
+        name = f"playlists.{(provider or Config.DEFAULT_PROVIDER or '').lower()}"
+        if name not in self._factories:
+            raise ValueError("Proveedor no soportado")
+        return self.get(name)
+
+    def credentials(self, provider: str) -> Any:
+        return self.get(f"credentials.{provider.lower()}")
+
+    def warm_up(self, names: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """Construye las instancias indicadas (las configuradas por defecto); devuelve ms y error por nombre."""
+        report: Dict[str, Dict[str, Any]] = {}
+        for name in names if names is not None else [n for n in self.names() if self.configured(n)]:
+            started = time.perf_counter()
+            try:
+                self.get(name)
+                report[name] = {"ms": round((time.perf_counter() - started) * 1000, 1)}
+            except Exception as exc:  # p. ej. proveedor sin credenciales: se reintenta al usarlo
+                report[name] = {"ms": round((time.perf_counter() - started) * 1000, 1), "error": str(exc)}
+        return report
+
+    def _mtime(self) -> Optional[float]:
+        try:
+            return os.path.getmtime(self.env_file) if self.env_file else None
+        except OSError:
+            return None
+
+    def _check_env_file(self) -> None:
+        self._next_check = time.monotonic() + self.reload_seconds
+        mtime = self._mtime()
+        if mtime is not None and mtime != self._env_mtime:
+            self._env_mtime = mtime
+            self.reload()
+
+    def reload(self) -> List[str]:
+        """Relee el ``.env`` y descarta las instancias cuya configuración cambió."""
+        values = dotenv_values(self.env_file) if self.env_file and os.path.exists(self.env_file) else {}
+        watched = {key for _, keys in self._factories.values() for key in keys}
+        for key in watched:
+            value = values.get(key)
+            # solo claves de texto (credenciales, URLs, mercados); el resto requiere reiniciar el worker
+            if value is None or not isinstance(getattr(Config, key, None), (str, type(None))):
+                continue
+            os.environ[key] = value
+            setattr(Config, key, value)
+        dropped: List[str] = []
+        with self._lock:
+            for name, (fingerprint, _) in list(self._instances.items()):
+                if fingerprint != self._fingerprint(self._factories[name][1]):
+                    del self._instances[name]
+                    dropped.append(name)
+            self.reloads += 1
+        if dropped:
+            logger.info("Servicios reconstruidos por cambio de configuración: %s", ", ".join(dropped))
+        return dropped
+
+    def stats(self) -> Dict[str, Any]:
+        return {"instances": sorted(self._instances), "builds": self.builds, "reloads": self.reloads}
+
+
+def _lazy(module: str, attr: str) -> Factory:
+    """Fábrica que importa ``module`` (relativo a este paquete) al construir la primera instancia."""
+
+    def _build() -> Any:
+        return getattr(importlib.import_module(module, __package__), attr)()
+
+    return _build
+
+
+def _amazon_credentials() -> Any:
+    from .services.amazon_music_service import AmazonClientCredentials
+
+    return AmazonClientCredentials(
+        client_id=Config.AMAZON_MUSIC_CLIENT_ID,
+        client_secret=Config.AMAZON_MUSIC_CLIENT_SECRET,
+        token_url=Config.AMAZON_MUSIC_TOKEN_URL,
+        scope=Config.AMAZON_MUSIC_TOKEN_SCOPE,
+    )
+
+
+_SPOTIFY_KEYS = ("SPOTIFY_CLIENT_ID", "SPOTIFY_CLIENT_SECRET")
+_AMAZON_KEYS = (
+    "AMAZON_MUSIC_CLIENT_ID",
+    "AMAZON_MUSIC_CLIENT_SECRET",
+    "AMAZON_MUSIC_TOKEN_URL",
+    "AMAZON_MUSIC_TOKEN_SCOPE",
+)
+
+SERVICES = ServiceRegistry(env_file=Config.SERVICE_ENV_FILE, reload_seconds=Config.SERVICE_RELOAD_SECONDS)
+SERVICES.register("catalog.spotify", SpotifyService, _SPOTIFY_KEYS + ("SPOTIFY_MARKET",), required=_SPOTIFY_KEYS)
+SERVICES.register("catalog.itunes", ItunesService, ("ITUNES_COUNTRY",))
+SERVICES.register(
+    "catalog.amazon_music",
+    _lazy(".services.amazon_music_service", "AmazonMusicService"),
+    _AMAZON_KEYS + ("AMAZON_MUSIC_API_BASE", "AMAZON_MUSIC_COUNTRY"),
+    required=_AMAZON_KEYS[:2],
+)
+SERVICES.register("playlists.spotify", SpotifyProvider)
+SERVICES.register("credentials.spotify", SpotifyClientCredentials, _SPOTIFY_KEYS, required=_SPOTIFY_KEYS)
+SERVICES.register("credentials.amazon_music", _amazon_credentials, _AMAZON_KEYS, required=_AMAZON_KEYS[:2])
+SERVICES.register(
+    "credentials.apple_music",
+    _lazy(".services.apple_music_token", "AppleMusicStaticToken"),
+    ("APPLE_MUSIC_USER_TOKEN",),
+    required=("APPLE_MUSIC_USER_TOKEN",),
+)
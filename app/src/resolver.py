@@ -0,0 +1,283 @@
+"""Resolución de título+artista a tracks normalizados.
+
+Núcleo compartido por ``/catalog/resolve``, ``/catalog/resolve-batch`` y la CLI
+de resolución masiva (``resolve_cli.py``):
+
+- normalizadores por proveedor (iTunes, Spotify, Amazon Music) a un formato común;
+- ``resolve_normalized``/``aresolve_normalized``: cache de resoluciones, índice
+  local del catálogo y, si no hay coincidencia, búsqueda en el proveedor con
+  puntaje contra la consulta (``matching``);
+- ``aresolve_multi``: carrera o hedging entre varios proveedores.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from .cache import RESOLVE_CACHE
+from .catalog_index import CATALOG_INDEX
+from .circuit import BREAKERS
+from .config import Config
+from .hedging import parse_providers, race_first
+from .matching import rank_matches
+from .registry import SERVICES
+from .services.base import ServiceProvider
+from .services.itunes_service import ItunesService
+from .services.spotify_service import SpotifyService
+from .transport import HttpTransport
+
+
+def _normalize_itunes_result(it: Dict[str, Any]) -> Dict[str, Any]:
+    track_id = it.get("trackId")
+    return {
+        "id": f"itunes-{track_id}" if track_id else None,
+        "external_id": str(track_id) if track_id else None,
+        "provider": "itunes",
+        "source": "itunes_search",
+        "title": it.get("trackName"),
+        "artist": it.get("artistName"),
+        "uri": it.get("trackViewUrl") or (f"itunes:track:{track_id}" if track_id else None),
+        "preview_url": it.get("previewUrl"),
+        "artworkUrl100": it.get("artworkUrl100"),
+        "image_url": it.get("artworkUrl100"),
+        "thumbnail_url": it.get("artworkUrl60") or it.get("artworkUrl100"),
+    }
+
+def _normalize_spotify_result(t: Dict[str, Any]) -> Dict[str, Any]:
+    track_id = t.get("id")
+    images = ((t.get("album") or {}).get("images") or [])
+    image_url = images[0].get("url") if images else None
+    thumb_url = images[-1].get("url") if images else image_url
+    artists = t.get("artists") or []
+    first_artist = artists[0].get("name") if artists else None
+    return {
+        "id": f"spotify-{track_id}" if track_id else None,
+        "external_id": track_id,
+        "provider": "spotify",
+        "source": "spotify_search",
+        "title": t.get("name"),
+        "artist": first_artist,
+        "uri": t.get("uri"),
+        "preview_url": t.get("preview_url"),
+        "image_url": image_url,
+        "thumbnail_url": thumb_url,
+    }
+
+
+def _first_value(item: Optional[Dict[str, Any]], *keys: str) -> Optional[str]:
+    if not item:
+        return None
+    for key in keys:
+        value = item.get(key)
+        if value is None:
+            continue
+        if isinstance(value, str):
+            cleaned = value.strip()
+            if cleaned:
+                return cleaned
+            continue
+        return value
+    return None
+
+
+def _extract_artist_name(item: Dict[str, Any]) -> Optional[str]:
+    artists = item.get("artists") or item.get("artist") or item.get("primary_artist")
+    if isinstance(artists, list):
+        for artist in artists:
+            if isinstance(artist, dict):
+                name = _first_value(
+                    artist, "name", "artistName", "artist", "primaryArtist"
+                )
+                if name:
+                    return name
+            elif isinstance(artist, str):
+                return artist.strip() or None
+    if isinstance(artists, dict):
+        return _first_value(artists, "name", "artistName", "artist", "primaryArtist")
+    return _first_value(item, "artist", "artistName", "artist_name", "primaryArtist")
+
+
+def _extract_image_urls(item: Dict[str, Any]) -> tuple[Optional[str], Optional[str]]:
+    candidates = item.get("images") or item.get("image") or item.get("artwork")
+    if isinstance(candidates, dict):
+        return (
+            _first_value(candidates, "url", "uri"),
+            _first_value(candidates, "thumbnail", "url", "uri"),
+        )
+    if isinstance(candidates, list):
+        def _url(entry: Any) -> Optional[str]:
+            if isinstance(entry, dict):
+                return _first_value(entry, "url", "uri", "thumbnail")
+            if isinstance(entry, str):
+                return entry.strip() or None
+            return None
+        first = candidates[0] if candidates else None
+        last = candidates[-1] if candidates else first
+        return _url(first), _url(last)
+    return None, None
+
+
+def _normalize_amazon_result(item: Dict[str, Any]) -> Dict[str, Any]:
+    track_id = _first_value(item, "id", "asin", "trackId", "track_id", "itemId")
+    image_url, thumb_url = _extract_image_urls(item)
+    return {
+        "id": f"amazon_music-{track_id}" if track_id else None,
+        "external_id": str(track_id) if track_id is not None else None,
+        "provider": "amazon_music",
+        "source": "amazon_music_search",
+        "title": _first_value(item, "title", "name", "trackName"),
+        "artist": _extract_artist_name(item),
+        "uri": _first_value(item, "uri", "url", "permalink", "link", "trackUrl"),
+        "preview_url": _first_value(
+            item, "preview_url", "previewUrl", "preview", "sampleUrl"
+        ),
+        "image_url": image_url,
+        "thumbnail_url": thumb_url or image_url,
+    }
+
+
+def catalog_service(provider: str) -> ServiceProvider:
+    """Instancia compartida del servicio de catálogo (ver ``registry``)."""
+    return SERVICES.catalog(provider)
+
+
+def _catalog_service_host(provider: str) -> Optional[str]:
+    if provider == "itunes":
+        return HttpTransport.host_of(ItunesService.API_BASE)
+    if provider == "amazon_music":
+        return HttpTransport.host_of(Config.AMAZON_MUSIC_API_BASE or "https://api.music.amazon.dev/v1")
+    return HttpTransport.host_of(SpotifyService.API_BASE)
+
+
+_NORMALIZERS = {
+    "itunes": _normalize_itunes_result,
+    "amazon_music": _normalize_amazon_result,
+    "spotify": _normalize_spotify_result,
+}
+
+
+def _region(svc: ServiceProvider) -> Optional[str]:
+    """Mercado o país del servicio: los resultados de catálogo dependen de él."""
+    return getattr(svc, "market", None) or getattr(svc, "country", None)
+
+
+def _resolve_cache_key(svc: ServiceProvider, title: str, artist: str, limit: int) -> str:
+    return RESOLVE_CACHE.make_key(svc.name, _region(svc), title, artist, limit)
+
+
+def _normalize_items(svc: ServiceProvider, raw: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    normalize = _NORMALIZERS.get(svc.name, _normalize_spotify_result)
+    items = [normalize(x) for x in (raw or [])]
+    return [i for i in items if (i.get("title") and i.get("artist"))]
+
+
+def _candidates_limit(limit: int) -> Tuple[int, int]:
+    """(``limit`` acotado, candidatos a pedir al proveedor para rankear)."""
+    limit = max(1, min(limit, 5))
+    return limit, max(limit, Config.MATCH_CANDIDATES)
+
+
+def _from_index(
+    svc: ServiceProvider, title: str, artist: str, limit: int, min_score: Optional[float]
+) -> Optional[List[Dict[str, Any]]]:
+    """Coincidencias del índice local, o ``None`` si no hay ninguna confiable."""
+    if CATALOG_INDEX is None:
+        return None
+    try:
+        items = CATALOG_INDEX.lookup(svc.name, title, artist, _region(svc))
+    except Exception:
+        logging.warning("Índice local del catálogo no disponible", exc_info=True)
+        return None
+    ranked = rank_matches(title, artist, items, min_score, limit) if items else []
+    return ranked or None
+
+
+def _index_items(svc: ServiceProvider, items: List[Dict[str, Any]]) -> None:
+    """Escribe en el índice local los candidatos obtenidos upstream."""
+    if CATALOG_INDEX is None or not items:
+        return
+    try:
+        CATALOG_INDEX.add(svc.name, items, region=_region(svc))
+    except Exception:
+        logging.warning("No se pudo actualizar el índice local del catálogo", exc_info=True)
+
+
+def resolve_normalized(
+    svc: ServiceProvider, title: str, artist: str, limit: int, min_score: Optional[float] = None
+) -> List[Dict[str, Any]]:
+    """Candidatos normalizados rankeados por coincidencia con título+artista.
+
+    Orden de consulta: cache de resoluciones, índice local del catálogo y, si
+    ninguno responde, el proveedor (cuya respuesta alimenta ambos).
+    """
+    limit, candidates = _candidates_limit(limit)
+    cache_key = _resolve_cache_key(svc, title, artist, candidates)
+    items = RESOLVE_CACHE.get(cache_key)
+    if items is None:
+        indexed = _from_index(svc, title, artist, limit, min_score)
+        if indexed is not None:
+            return indexed
+        # los errores del proveedor se propagan: ``[]`` aquí es un 200 sin resultados (negativo cacheable)
+        items = _normalize_items(svc, svc.search_tracks(title, artist, limit=candidates))
+        RESOLVE_CACHE.set(cache_key, items)
+        _index_items(svc, items)
+    return rank_matches(title, artist, items, min_score, limit)
+
+
+async def aresolve_normalized(
+    svc: ServiceProvider, title: str, artist: str, limit: int, min_score: Optional[float] = None
+) -> List[Dict[str, Any]]:
+    """Versión asíncrona de ``resolve_normalized``; los accesos a SQLite (cache
+    compartido, índice local) van a un thread para no bloquear el event loop."""
+    limit, candidates = _candidates_limit(limit)
+    cache_key = _resolve_cache_key(svc, title, artist, candidates)
+    items = await RESOLVE_CACHE.aget(cache_key)
+    if items is None:
+        indexed = await asyncio.to_thread(_from_index, svc, title, artist, limit, min_score)
+        if indexed is not None:
+            return indexed
+        items = _normalize_items(svc, await svc.asearch_tracks(title, artist, limit=candidates))
+        await RESOLVE_CACHE.aset(cache_key, items)
+        await asyncio.to_thread(_index_items, svc, items)
+    return rank_matches(title, artist, items, min_score, limit)
+
+
+_RESOLVE_MODES = ("single", "race", "hedge")
+
+
+def resolve_options(p: Dict[str, Any]) -> Dict[str, Any]:
+    """``mode``/``providers``/``hedge_ms``/``min_score`` del body; ``single`` usa solo ``DEFAULT_PROVIDER``."""
+    mode = (p.get("mode") or "single").strip().lower()
+    if mode not in _RESOLVE_MODES:
+        raise ValueError(f"mode no soportado: {mode}")
+    providers = parse_providers(p.get("providers"), parse_providers(Config.RESOLVE_PROVIDERS, []))
+    unknown = [name for name in providers if name not in _NORMALIZERS]
+    if unknown:
+        raise ValueError(f"Proveedores no soportados: {', '.join(unknown)}")
+    hedge_ms = Config.RESOLVE_HEDGE_MS if p.get("hedge_ms") is None else max(0, int(p["hedge_ms"]))
+    min_score = None if p.get("min_score") is None else float(p["min_score"])
+    return {
+        "mode": mode,
+        "providers": providers,
+        "hedge_after": 0.0 if mode == "race" else hedge_ms / 1000.0,
+        "min_score": min_score,
+    }
+
+
+async def aresolve_multi(title: str, artist: str, limit: int, opts: Dict[str, Any]) -> Dict[str, Any]:
+    """Consulta varios proveedores (carrera o hedging) y devuelve la primera coincidencia confiable."""
+    calls = []
+    unavailable: Dict[str, Dict[str, Any]] = {}
+    for name in opts["providers"]:
+        try:
+            svc = catalog_service(name)
+        except Exception as exc:  # p. ej. proveedor sin credenciales configuradas
+            unavailable[name] = {"status": "unavailable", "elapsed_ms": None, "error": str(exc)}
+            continue
+        calls.append((name, lambda svc=svc: aresolve_normalized(svc, title, artist, limit, opts["min_score"])))
+    # los proveedores con el circuito abierto pasan al final (fallan rápido si se llega a ellos)
+    calls.sort(key=lambda call: BREAKERS.is_open(_catalog_service_host(call[0])))
+    race = await race_first(calls, bool, opts["hedge_after"], Config.RESOLVE_RACE_DEADLINE_SECONDS)
+    return {"items": race.value or [], "provider": race.winner, "attempts": {**unavailable, **race.attempts}}
@@ -2,13 +2,19 @@
 
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
 from time import time
 
 import requests
 
+from ..batch import arun_bounded, run_bounded
 from ..config import Config
-from .base import ServiceProvider
+from ..crosswalk import CROSSWALK, Crosswalk
+from ..matching import rank_matches
+from ..singleflight import coalesce_ids, coalesce_search
+from ..transport import AIO_TRANSPORT, TRANSPORT
+from .base import ServiceProvider, raise_for_upstream
 from .client_credentials import ClientCredentials
 from .spotify_service import SpotifyService
 
@@ -51,11 +57,10 @@ class AmazonClientCredentials(ClientCredentials):
         }
         if self.scope:
             payload["scope"] = self.scope
-        resp = requests.post(
+        resp = TRANSPORT.post(
             self.token_url,
             data=payload,
             auth=(self.client_id, self.client_secret),
-            timeout=20,
         )
         resp.raise_for_status()
         data = resp.json() or {}
@@ -73,6 +78,7 @@ class AmazonMusicService(ServiceProvider):
         country: str | None = None,
         client_id: str | None = None,
         client_secret: str | None = None,
+        crosswalk: Optional[Crosswalk] = CROSSWALK,
     ):
         self.api_base = (api_base or Config.AMAZON_MUSIC_API_BASE or "").rstrip("/")
         if not self.api_base:
@@ -91,7 +97,7 @@ class AmazonMusicService(ServiceProvider):
             scope=self.scope,
         )
         self.country = (country or Config.AMAZON_MUSIC_COUNTRY or "US").upper()
-        self._spotify: Optional[SpotifyService] = None
+        self.crosswalk = crosswalk
 
     def _auth_headers(self) -> Dict[str, str]:
         return {
@@ -101,19 +107,24 @@ class AmazonMusicService(ServiceProvider):
         }
 
     def _request(self, route: str, *, params: Dict[str, Any] | None = None) -> Dict[str, Any]:
-        try:
-            resp = requests.get(
-                f"{self.api_base}/{route.lstrip('/')}",
-                params=params,
-                headers=self._auth_headers(),
-                timeout=20,
-            )
-            if resp.status_code >= 500:
-                return {}
-            resp.raise_for_status()
-            return resp.json() or {}
-        except requests.RequestException:
-            return {}
+        resp = TRANSPORT.get(
+            f"{self.api_base}/{route.lstrip('/')}",
+            params=params,
+            headers=self._auth_headers(),
+        )
+        raise_for_upstream(self.name, resp)
+        return resp.json() or {}
+
+    async def _arequest(self, route: str, *, params: Dict[str, Any] | None = None) -> Dict[str, Any]:
+        # el token se obtiene de forma bloqueante: fuera del event loop
+        headers = await asyncio.to_thread(self._auth_headers)
+        resp = await AIO_TRANSPORT.get(
+            f"{self.api_base}/{route.lstrip('/')}",
+            params=params,
+            headers=headers,
+        )
+        raise_for_upstream(self.name, resp)
+        return resp.json() or {}
 
     def _ensure_token(self) -> str:
         now = time()
@@ -124,16 +135,16 @@ class AmazonMusicService(ServiceProvider):
                 f"No se pudo obtener token de Amazon Music: {exc}"
             ) from exc
 
-    def search_tracks(self, title: str, artist: str, limit: int = 1) -> List[Dict[str, Any]]:
-        if not title or not artist:
-            return []
-        params = {
+    def _search_params(self, title: str, artist: str, limit: int) -> Dict[str, Any]:
+        return {
             "query": f"{title} {artist}",
             "type": "track",
             "max_results": max(1, min(limit, 50)),
             "country": self.country,
         }
-        data = self._request("search", params=params)
+
+    @staticmethod
+    def _parse_search(data: Dict[str, Any], max_results: int) -> List[Dict[str, Any]]:
         results = data.get("results") or []
         if isinstance(results, dict):
             results = results.get("items") or []
@@ -144,10 +155,29 @@ class AmazonMusicService(ServiceProvider):
             for item in results
             if str(item.get("type", "track")).lower() in ("track", "song", "music", "")
         ]
-        return track_results[: params["max_results"]]
+        return track_results[:max_results]
 
-    def _track_metadata(self, track_id: str) -> Dict[str, Any]:
-        data = self._request("track", params={"id": track_id, "country": self.country})
+    def flight_scope(self):
+        return (self.name, self.country)
+
+    @coalesce_search("search")
+    def search_tracks(self, title: str, artist: str, limit: int = 1) -> List[Dict[str, Any]]:
+        if not title or not artist:
+            return []
+        params = self._search_params(title, artist, limit)
+        data = self._request("search", params=params)
+        return self._parse_search(data, params["max_results"])
+
+    @coalesce_search("search")
+    async def asearch_tracks(self, title: str, artist: str, limit: int = 1) -> List[Dict[str, Any]]:
+        if not title or not artist:
+            return []
+        params = self._search_params(title, artist, limit)
+        data = await self._arequest("search", params=params)
+        return self._parse_search(data, params["max_results"])
+
+    @staticmethod
+    def _parse_metadata(data: Dict[str, Any]) -> Dict[str, Any]:
         payload = data.get("data") or data
         if isinstance(payload, list):
             payload = payload[0] if payload else {}
@@ -155,38 +185,141 @@ class AmazonMusicService(ServiceProvider):
             return {}
         return payload
 
+    def _track_metadata(self, track_id: str) -> Dict[str, Any]:
+        data = self._request("track", params={"id": track_id, "country": self.country})
+        return self._parse_metadata(data)
+
+    async def _atrack_metadata(self, track_id: str) -> Dict[str, Any]:
+        data = await self._arequest("track", params={"id": track_id, "country": self.country})
+        return self._parse_metadata(data)
+
     def _spotify_service(self) -> SpotifyService:
-        if self._spotify is None:
-            self._spotify = SpotifyService()
-        return self._spotify
+        from ..registry import SERVICES  # import diferido: el registro importa este módulo
+
+        return SERVICES.catalog("spotify")
+
+    @staticmethod
+    def _best_spotify_id(title: str, artist: str, results: List[Dict[str, Any]]) -> Optional[str]:
+        """ID del resultado de Spotify que mejor coincide con título+artista (``rank_matches``);
+        ``None`` si ninguno llega a ``MATCH_MIN_SCORE``: un mapeo dudoso no se guarda."""
+        candidates = [
+            {
+                "id": r.get("id"),
+                "title": r.get("name"),
+                "artist": ", ".join(a.get("name") for a in r.get("artists") or [] if a.get("name")),
+            }
+            for r in results
+            if r.get("id")
+        ]
+        ranked = rank_matches(title, artist, candidates, limit=1)
+        return ranked[0]["id"] if ranked else None
 
-    def _match_spotify_track(self, title: Optional[str], artist: Optional[str]) -> Optional[str]:
+    def _map_to_spotify(self, amazon_id: str) -> Optional[str]:
+        metadata = self._track_metadata(amazon_id)
+        title = _first_value(metadata, "title", "name", "trackName")
+        artist = _extract_artist_name(metadata)
         if not title or not artist:
             return None
-        svc = self._spotify_service()
-        results = svc.search_tracks(title, artist, limit=1)
-        if not results:
+        results = self._spotify_service().search_tracks(title, artist, limit=Config.MATCH_CANDIDATES)
+        return self._best_spotify_id(title, artist, results)
+
+    async def _amap_to_spotify(self, amazon_id: str) -> Optional[str]:
+        metadata = await self._atrack_metadata(amazon_id)
+        title = _first_value(metadata, "title", "name", "trackName")
+        artist = _extract_artist_name(metadata)
+        if not title or not artist:
             return None
-        return results[0].get("id")
+        results = await self._spotify_service().asearch_tracks(title, artist, limit=Config.MATCH_CANDIDATES)
+        return self._best_spotify_id(title, artist, results)
 
-    def audio_features(self, track_ids: List[str]) -> Dict[str, Dict[str, Any]]:
-        if not track_ids:
-            return {}
-        amazon_to_spotify: Dict[str, str] = {}
-        for amazon_id in set(track_ids):
-            metadata = self._track_metadata(amazon_id)
-            title = _first_value(metadata, "title", "name", "trackName")
-            artist = _extract_artist_name(metadata)
-            if not title or not artist:
-                continue
-            spotify_id = self._match_spotify_track(title, artist)
-            if spotify_id:
-                amazon_to_spotify[amazon_id] = spotify_id
-        if not amazon_to_spotify:
+    def _crosswalk_scope(self) -> Tuple[str, str]:
+        """Proveedores con su región (``amazon_music:US``, ``spotify:MX``): la metadata
+        depende del país y la disponibilidad del track de Spotify, del mercado."""
+        return f"{self.name}:{self.country}", f"spotify:{self._spotify_service().market}"
+
+    def _known_mappings(self, unique: List[str]) -> Dict[str, str]:
+        if self.crosswalk is None:
             return {}
-        spotify_features = self._spotify_service().audio_features(list(set(amazon_to_spotify.values())))
+        return self.crosswalk.get_many(*self._crosswalk_scope(), unique)
+
+    def _remember_mappings(self, fresh: Dict[str, str]) -> None:
+        if fresh and self.crosswalk is not None:
+            self.crosswalk.put_many(*self._crosswalk_scope(), fresh)
+
+    def map_to_spotify(self, track_ids: List[str]) -> Dict[str, str]:
+        """Mapea IDs de Amazon Music a IDs de Spotify.
+
+        Primero consulta el crosswalk persistente; los IDs sin mapeo se resuelven en
+        paralelo (metadata + búsqueda en Spotify, máximo ``AMAZON_MAPPING_CONCURRENCY``
+        a la vez) y los nuevos mapeos se guardan para no recalcularlos.
+        """
+        unique = list(dict.fromkeys(t for t in track_ids if t))
+        mapping = self._known_mappings(unique)
+        pending = [t for t in unique if t not in mapping]
+        if not pending:
+            return mapping
+        fresh: Dict[str, str] = {}
+        outcomes = run_bounded(
+            self._map_to_spotify,
+            pending,
+            Config.AMAZON_MAPPING_CONCURRENCY,
+            Config.AMAZON_MAPPING_DEADLINE_SECONDS,
+        )
+        for amazon_id, outcome in zip(pending, outcomes):
+            if outcome.ok and outcome.value:
+                fresh[amazon_id] = outcome.value
+        self._remember_mappings(fresh)
+        mapping.update(fresh)
+        return mapping
+
+    async def amap_to_spotify(self, track_ids: List[str]) -> Dict[str, str]:
+        """Versión asíncrona de ``map_to_spotify`` (mismo límite de concurrencia y deadline);
+        el crosswalk (SQLite) se consulta en un thread."""
+        unique = list(dict.fromkeys(t for t in track_ids if t))
+        mapping = await asyncio.to_thread(self._known_mappings, unique)
+        pending = [t for t in unique if t not in mapping]
+        if not pending:
+            return mapping
+        outcomes = await arun_bounded(
+            self._amap_to_spotify,
+            pending,
+            Config.AMAZON_MAPPING_CONCURRENCY,
+            Config.AMAZON_MAPPING_DEADLINE_SECONDS,
+        )
+        fresh = {
+            amazon_id: outcome.value
+            for amazon_id, outcome in zip(pending, outcomes)
+            if outcome.ok and outcome.value
+        }
+        await asyncio.to_thread(self._remember_mappings, fresh)
+        mapping.update(fresh)
+        return mapping
+
+    def _features_by_amazon_id(
+        self, amazon_to_spotify: Dict[str, str], spotify_features: Dict[str, Dict[str, Any]]
+    ) -> Dict[str, Dict[str, Any]]:
         out: Dict[str, Dict[str, Any]] = {}
         for amazon_id, spotify_id in amazon_to_spotify.items():
             if feat := spotify_features.get(spotify_id):
                 out[amazon_id] = feat
         return out
+
+    @coalesce_ids("audio_features")
+    def audio_features(self, track_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        if not track_ids:
+            return {}
+        amazon_to_spotify = self.map_to_spotify(track_ids)
+        if not amazon_to_spotify:
+            return {}
+        spotify_features = self._spotify_service().audio_features(list(set(amazon_to_spotify.values())))
+        return self._features_by_amazon_id(amazon_to_spotify, spotify_features)
+
+    @coalesce_ids("audio_features")
+    async def aaudio_features(self, track_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        if not track_ids:
+            return {}
+        amazon_to_spotify = await self.amap_to_spotify(track_ids)
+        if not amazon_to_spotify:
+            return {}
+        spotify_features = await self._spotify_service().aaudio_features(list(set(amazon_to_spotify.values())))
+        return self._features_by_amazon_id(amazon_to_spotify, spotify_features)
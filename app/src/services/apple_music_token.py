@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import hashlib
 import os
 from typing import Optional, Tuple
 
@@ -18,5 +19,9 @@ class AppleMusicStaticToken(ClientCredentials):
         self._ttl = ttl_seconds
         super().__init__(client_id="apple_music", client_secret="static", token_url="apple_music_static")
 
+    def fingerprint(self) -> str:
+        # token estático: distinguir por contenido para no mezclar tokens distintos
+        return hashlib.sha256(self._static_token.encode("utf-8")).hexdigest()[:16]
+
     def _fetch_token(self) -> Tuple[Optional[str], int]:
         return self._static_token, self._ttl
@@ -1,16 +1,55 @@
 from __future__ import annotations
 
+import asyncio
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List
+from typing import Any, Dict, Hashable, List, Optional
+from urllib.parse import urlsplit
+
+
+class UpstreamError(RuntimeError):
+    """El proveedor respondió con error (HTTP >= 400); no equivale a "sin resultados"."""
+
+    def __init__(self, provider: str, status: int):
+        super().__init__(f"{provider} error {status}")
+        self.provider = provider
+        self.status = status
+
+
+def raise_for_upstream(provider: str, response: Any) -> None:
+    """``UpstreamError`` si la respuesta (requests o httpx) no es exitosa."""
+    if response.status_code >= 400:
+        raise UpstreamError(provider, response.status_code)
 
 
 class ServiceProvider(ABC):
     """Clase base para servicios de catálogo de música.
 
-    Define la interfaz común para búsqueda y (opcionalmente) audio-features.
+    Define la interfaz común para búsqueda y (opcionalmente) audio-features, en
+    versión síncrona y asíncrona (``asearch_tracks``/``aaudio_features``). Las
+    subclases implementan la versión asíncrona sobre ``AIO_TRANSPORT``; por
+    defecto se ejecuta la versión síncrona en un thread.
+
+    Las subclases decoran búsqueda y audio-features con ``singleflight`` para
+    compartir llamadas idénticas en vuelo; ``flight_scope`` distingue instancias
+    que darían resultados distintos (p. ej. otro mercado).
+
+    Las búsquedas devuelven ``[]`` solo cuando el proveedor respondió 200 sin
+    resultados (eso sí se cachea como negativo). Los errores (``UpstreamError``
+    para HTTP >= 400, ``RateLimited``, ``CircuitOpenError``, timeouts) se
+    propagan: la ruta responde el error o prueba otro proveedor, sin cachear un
+    resultado vacío por una falla puntual.
     """
 
     name: str = "provider"
+    API_BASE: str = ""
+
+    def flight_scope(self) -> Hashable:
+        return (self.name,)
+
+    def upstream_host(self) -> Optional[str]:
+        """Host del API de catálogo (clave del circuit breaker)."""
+        base = getattr(self, "api_base", None) or self.API_BASE
+        return (urlsplit(base).hostname or "").lower() or None
 
     @abstractmethod
     def search_tracks(self, title: str, artist: str, limit: int = 1) -> List[Dict[str, Any]]:
@@ -25,3 +64,10 @@ class ServiceProvider(ABC):
         """
         raise NotImplementedError("audio_features no implementado para este proveedor")
 
+    async def asearch_tracks(self, title: str, artist: str, limit: int = 1) -> List[Dict[str, Any]]:
+        """Versión asíncrona de ``search_tracks``."""
+        return await asyncio.to_thread(self.search_tracks, title, artist, limit)
+
+    async def aaudio_features(self, track_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Versión asíncrona de ``audio_features``."""
+        return await asyncio.to_thread(self.audio_features, track_ids)
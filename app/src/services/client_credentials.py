@@ -1,10 +1,127 @@
-"""Base helper for OAuth client credentials token acquisition with caching."""
+"""Base helper for OAuth client credentials token acquisition with caching.
+
+Los tokens se guardan en un registro a nivel de proceso (``TOKEN_REGISTRY``)
+indexado por ``(token_url, client_id, scope, hash del secret)``. Así, aunque cada
+request cree una instancia nueva de ``SpotifyClientCredentials`` o
+``AmazonClientCredentials``, todas comparten el mismo token entre los threads del
+worker, y un secret rotado (reload del ``.env``) no reutiliza el token anterior.
+"""
 
 from __future__ import annotations
 
+import hashlib
+import logging
+import threading
 import time
 from abc import ABC, abstractmethod
-from typing import Optional, Tuple
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from ..config import Config
+from ..metrics import METRICS
+
+
+TokenKey = Tuple[str, str, Optional[str], str]
+TokenFetcher = Callable[[], Tuple[Optional[str], int]]
+
+
+class _TokenEntry:
+    __slots__ = ("token", "expires_at", "lock", "refreshing")
+
+    def __init__(self) -> None:
+        self.token: Optional[str] = None
+        self.expires_at: float = 0.0
+        self.lock = threading.Lock()
+        self.refreshing = False
+
+
+class TokenRegistry:
+    """Cache de tokens compartido por todos los ``ClientCredentials`` del proceso.
+
+    - ``expiry_margin``: segundos antes de ``expires_at`` en los que el token ya no
+      se entrega y la renovación es obligatoria (bloqueante).
+    - ``refresh_ahead``: ventana previa en la que un único thread renueva el token
+      en segundo plano mientras el resto sigue usando el vigente.
+
+    Cada clave tiene su propio lock, de modo que cuando muchos threads piden un
+    token caducado solo uno hace el POST al endpoint de tokens.
+    """
+
+    def __init__(self, expiry_margin: float = 30.0, refresh_ahead: float = 300.0):
+        self.expiry_margin = expiry_margin
+        self.refresh_ahead = max(refresh_ahead, expiry_margin)
+        self._entries: Dict[TokenKey, _TokenEntry] = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, key: TokenKey) -> _TokenEntry:
+        entry = self._entries.get(key)
+        if entry is None:
+            with self._lock:
+                entry = self._entries.setdefault(key, _TokenEntry())
+        return entry
+
+    def _refresh(self, key: TokenKey, entry: _TokenEntry, fetch: TokenFetcher, mode: str) -> str:
+        started = time.time()
+        labels = {"host": (urlsplit(key[0]).hostname or "").lower(), "mode": mode}
+        try:
+            value, expires_in = fetch()
+        except Exception:
+            METRICS.inc("moodtune_token_fetches_total", dict(labels, result="error"))
+            raise
+        finally:
+            METRICS.observe("moodtune_token_fetch_duration_seconds", time.time() - started, labels)
+        METRICS.inc("moodtune_token_fetches_total", dict(labels, result="ok" if value else "empty"))
+        if not value:
+            raise RuntimeError("Client credentials response did not return an access token")
+        entry.token = value
+        entry.expires_at = started + (expires_in or 3600)
+        return value
+
+    def _refresh_in_background(self, key: TokenKey, entry: _TokenEntry, fetch: TokenFetcher) -> None:
+        if entry.refreshing or not entry.lock.acquire(blocking=False):
+            return
+        entry.refreshing = True
+
+        def _run():
+            try:
+                self._refresh(key, entry, fetch, "background")
+            except Exception as exc:  # el token vigente sigue siendo válido
+                logging.warning("Renovación anticipada de token falló: %s", exc)
+            finally:
+                entry.refreshing = False
+                entry.lock.release()
+
+        threading.Thread(target=_run, name="token-refresh", daemon=True).start()
+
+    def get(self, key: TokenKey, fetch: TokenFetcher) -> str:
+        entry = self._entry(key)
+        now = time.time()
+        token = entry.token
+        if token and now < entry.expires_at - self.expiry_margin:
+            if now >= entry.expires_at - self.refresh_ahead:
+                self._refresh_in_background(key, entry, fetch)
+            return token
+        with entry.lock:
+            # otro thread pudo renovarlo mientras esperábamos el lock
+            if entry.token and time.time() < entry.expires_at - self.expiry_margin:
+                return entry.token
+            return self._refresh(key, entry, fetch, "blocking")
+
+    def invalidate(self, key: TokenKey) -> None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.token = None
+            entry.expires_at = 0.0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+TOKEN_REGISTRY = TokenRegistry(
+    expiry_margin=Config.TOKEN_EXPIRY_MARGIN_SECONDS,
+    refresh_ahead=Config.TOKEN_REFRESH_AHEAD_SECONDS,
+)
 
 
 class ClientCredentials(ABC):
@@ -15,19 +132,20 @@ class ClientCredentials(ABC):
         self.client_secret = client_secret
         self.token_url = token_url
         self.scope = scope
-        self._token: Optional[str] = None
-        self._expires_at: float = 0.0
+
+    def fingerprint(self) -> str:
+        """Hash corto del secret: distingue credenciales rotadas sin guardar el secret en claves."""
+        return hashlib.sha256(self.client_secret.encode("utf-8")).hexdigest()[:16]
+
+    def _registry_key(self) -> TokenKey:
+        return (self.token_url, self.client_id, self.scope, self.fingerprint())
 
     def token(self) -> str:
-        now = time.time()
-        if self._token and now < self._expires_at - 30:
-            return self._token
-        value, expires_in = self._fetch_token()
-        if not value:
-            raise RuntimeError("Client credentials response did not return an access token")
-        self._token = value
-        self._expires_at = now + (expires_in or 3600)
-        return self._token
+        return TOKEN_REGISTRY.get(self._registry_key(), self._fetch_token)
+
+    def invalidate(self) -> None:
+        """Descarta el token cacheado (p. ej. tras un 401 del proveedor)."""
+        TOKEN_REGISTRY.invalidate(self._registry_key())
 
     @abstractmethod
     def _fetch_token(self) -> Tuple[Optional[str], int]:
@@ -4,10 +4,11 @@ Centraliza llamadas para evitar dependencias directas a la API desde rutas.
 """
 
 from typing import Dict, Any, List
-import requests
 
 from ..config import Config
-from .base import ServiceProvider
+from ..singleflight import coalesce_search
+from ..transport import AIO_TRANSPORT, TRANSPORT
+from .base import ServiceProvider, raise_for_upstream
 
 
 class ItunesService(ServiceProvider):
@@ -17,6 +18,19 @@ class ItunesService(ServiceProvider):
     def __init__(self, country: str | None = None):
         self.country = (country or Config.ITUNES_COUNTRY).upper()
 
+    def _search_params(self, title: str, artist: str, limit: int) -> Dict[str, Any]:
+        return {
+            "term": f"{title} {artist}",
+            "media": "music",
+            "entity": "song",
+            "limit": max(1, min(limit, 50)),
+            "country": self.country,
+        }
+
+    def flight_scope(self):
+        return (self.name, self.country)
+
+    @coalesce_search("search")
     def search_tracks(self, title: str, artist: str, limit: int = 1) -> List[Dict[str, Any]]:
         """Busca canciones por título + artista usando /search.
 
@@ -24,20 +38,16 @@ class ItunesService(ServiceProvider):
         """
         if not title or not artist:
             return []
-        try:
-            params = {
-                "term": f"{title} {artist}",
-                "media": "music",
-                "entity": "song",
-                "limit": max(1, min(limit, 50)),
-                "country": self.country,
-            }
-            r = requests.get(f"{self.API_BASE}/search", params=params, timeout=15)
-            if r.status_code >= 500:
-                return []
-            r.raise_for_status()
-            data = r.json() or {}
-            return data.get("results") or []
-        except Exception:
-            return []
+        r = TRANSPORT.get(f"{self.API_BASE}/search", params=self._search_params(title, artist, limit))
+        raise_for_upstream(self.name, r)
+        data = r.json() or {}
+        return data.get("results") or []
 
+    @coalesce_search("search")
+    async def asearch_tracks(self, title: str, artist: str, limit: int = 1) -> List[Dict[str, Any]]:
+        if not title or not artist:
+            return []
+        r = await AIO_TRANSPORT.get(f"{self.API_BASE}/search", params=self._search_params(title, artist, limit))
+        raise_for_upstream(self.name, r)
+        data = r.json() or {}
+        return data.get("results") or []
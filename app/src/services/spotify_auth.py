@@ -10,9 +10,9 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Dict, Optional
 import os
-import requests
 
 from ..config import Config
+from ..transport import TRANSPORT
 from .client_credentials import ClientCredentials
 
 
@@ -31,11 +31,10 @@ class SpotifyClientCredentials(ClientCredentials):
 
     def _fetch_token(self):
         payload = {"grant_type": "client_credentials", "scope": "playlist-modify-public"}
-        resp = requests.post(
+        resp = TRANSPORT.post(
             self.token_url,
             data=payload,
             auth=(self.client_id, self.client_secret),
-            timeout=20,
         )
         resp.raise_for_status()
         data = resp.json() or {}
@@ -3,68 +3,204 @@
 Usa Client Credentials; no requiere tokens de usuario.
 """
 
-from typing import Dict, Any, List
-import requests
+import asyncio
+from typing import Dict, Any, List, Optional, Set, Tuple
 
 from ..config import Config
+from ..feature_store import FEATURE_STORE, FeatureStore
+from ..microbatch import BatcherClosed, MicroBatcher, get_batcher
+from ..singleflight import coalesce_ids, coalesce_search
+from ..transport import AIO_TRANSPORT, TRANSPORT
 from .spotify_auth import SpotifyClientCredentials
-from .base import ServiceProvider
+from .base import ServiceProvider, raise_for_upstream
 
 
 class SpotifyService(ServiceProvider):
     API_BASE = "https://api.spotify.com/v1"
     name = "spotify"
 
-    def __init__(self, client_id: str | None = None, client_secret: str | None = None, market: str | None = None):
+    def __init__(
+        self,
+        client_id: str | None = None,
+        client_secret: str | None = None,
+        market: str | None = None,
+        feature_store: Optional[FeatureStore] = FEATURE_STORE,
+    ):
         self.market = (market or Config.SPOTIFY_MARKET).upper()
         self.auth = SpotifyClientCredentials(client_id=client_id, client_secret=client_secret)
+        self.feature_store = feature_store
 
+    def flight_scope(self):
+        return (self.name, self.market)
+
+    def _split_cached(self, track_ids: List[str]) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+        """Separa los IDs ya presentes en el FeatureStore de los que hay que pedir al API."""
+        if self.feature_store is None:
+            return {}, list(dict.fromkeys(t for t in track_ids if t))
+        out, known_missing = self.feature_store.lookup(self.name, track_ids)
+        missing = [tid for tid in dict.fromkeys(track_ids) if tid and tid not in out and tid not in known_missing]
+        return out, missing
+
+    def _store_fetched(self, fetched: Dict[str, Dict[str, Any]], unknown: Set[str]) -> None:
+        if self.feature_store is not None:
+            self.feature_store.put_many(self.name, fetched)
+            self.feature_store.put_missing(self.name, unknown)
+
+    @staticmethod
+    def _parse_features_chunk(chunk: List[str], data: Dict[str, Any]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """``{id: features}``; ``None`` para los IDs que Spotify respondió como ``null``."""
+        return {tid: (af or None) for tid, af in zip(chunk, data.get("audio_features") or [])}
+
+    @staticmethod
+    def _split_answers(
+        answers: Dict[str, Optional[Dict[str, Any]]], unknown: Set[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        out: Dict[str, Dict[str, Any]] = {}
+        for tid, af in answers.items():
+            if af:
+                out[tid] = af
+            else:
+                unknown.add(tid)
+        return out
+
+    def _batcher(self) -> Optional[MicroBatcher]:
+        if Config.AUDIO_FEATURES_BATCH_WINDOW_MS <= 0:
+            return None
+        return get_batcher(
+            (self.name, "audio_features", self.auth.client_id),
+            lambda: MicroBatcher(
+                self._fetch_features_batch,
+                max_batch=100,
+                window=Config.AUDIO_FEATURES_BATCH_WINDOW_MS / 1000.0,
+                max_concurrency=Config.AUDIO_FEATURES_BATCH_CONCURRENCY,
+                name="spotify-features",
+            ),
+            # el factory captura esta instancia (audio-features no depende del mercado):
+            # con otro secret (reload) se reemplaza; una instancia vieja pide directo
+            version=self.auth.fingerprint(),
+        )
+
+    @coalesce_ids("audio_features")
     def audio_features(self, track_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Audio-features por ID; consulta primero el FeatureStore y solo pide al API los faltantes."""
         if not track_ids:
             return {}
-        out: Dict[str, Dict[str, Any]] = {}
+        out, missing = self._split_cached(track_ids)
+        if missing:
+            unknown: Set[str] = set()
+            fetched = self._fetch_audio_features(missing, unknown)
+            self._store_fetched(fetched, unknown)
+            out.update(fetched)
+        return out
+
+    def _fetch_features_batch(self, chunk: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Una llamada a /audio-features (máximo 100 IDs). Un 5xx devuelve ``{}`` (sin respuesta)."""
+        r = TRANSPORT.get(
+            f"{self.API_BASE}/audio-features",
+            headers=self.auth.headers(),
+            params={"ids": ",".join(chunk)},
+        )
+        if r.status_code >= 500:
+            return {}
+        r.raise_for_status()
+        return self._parse_features_chunk(chunk, r.json() or {})
+
+    def _fetch_audio_features(self, track_ids: List[str], unknown: Optional[Set[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """Pide audio-features al API en lotes de 100.
+
+        Con micro-batching activo los IDs se suman a los de otros requests
+        concurrentes (ver ``microbatch``); si no, se pide chunk por chunk.
+        Si se pasa ``unknown``, se agregan los IDs que Spotify respondió como ``null``
+        (los chunks con error 5xx no cuentan como respondidos).
+        """
+        unknown = unknown if unknown is not None else set()
+        batcher = self._batcher()
+        if batcher is not None:
+            try:
+                return self._split_answers(batcher.fetch(track_ids), unknown)
+            except BatcherClosed:
+                pass  # reemplazado por un reload entre _batcher() y fetch: se pide directo
+        answers: Dict[str, Optional[Dict[str, Any]]] = {}
         for i in range(0, len(track_ids), 100):
-            chunk = track_ids[i:i+100]
-            r = requests.get(
-                f"{self.API_BASE}/audio-features",
-                headers=self.auth.headers(),
-                params={"ids": ",".join(chunk)},
-                timeout=20,
-            )
-            if r.status_code >= 500:
-                continue
-            r.raise_for_status()
-            for af in (r.json().get("audio_features") or []):
-                if not af:
-                    continue
-                out[af.get("id")] = af
+            answers.update(self._fetch_features_batch(track_ids[i:i+100]))
+        return self._split_answers(answers, unknown)
+
+    @coalesce_ids("audio_features")
+    async def aaudio_features(self, track_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Versión asíncrona: con micro-batching se espera el Future del lote; si no,
+        los chunks de 100 IDs se piden en paralelo."""
+        if not track_ids:
+            return {}
+        # el FeatureStore es SQLite (puede esperar el busy_timeout): fuera del event loop
+        out, missing = await asyncio.to_thread(self._split_cached, track_ids)
+        if not missing:
+            return out
+        unknown: Set[str] = set()
+        answers: Optional[Dict[str, Optional[Dict[str, Any]]]] = None
+        batcher = self._batcher()
+        if batcher is not None:
+            try:
+                answers = await asyncio.wait_for(asyncio.wrap_future(batcher.submit(missing)), batcher.timeout)
+            except BatcherClosed:
+                pass  # reemplazado por un reload: se pide directo
+        if answers is None:
+            headers = await asyncio.to_thread(self.auth.headers)
+            answers = {}
+
+            async def _chunk(chunk: List[str]) -> None:
+                r = await AIO_TRANSPORT.get(
+                    f"{self.API_BASE}/audio-features",
+                    headers=headers,
+                    params={"ids": ",".join(chunk)},
+                )
+                if r.status_code >= 500:
+                    return
+                r.raise_for_status()
+                answers.update(self._parse_features_chunk(chunk, r.json() or {}))
+
+            await asyncio.gather(*(_chunk(missing[i:i+100]) for i in range(0, len(missing), 100)))
+        fetched = self._split_answers(answers, unknown)
+        await asyncio.to_thread(self._store_fetched, fetched, unknown)
+        out.update(fetched)
         return out
 
+    def _search_params(self, title: str, artist: str, limit: int) -> Dict[str, Any]:
+        return {
+            "q": f"track:{title} artist:{artist}",
+            "type": "track",
+            "limit": max(1, min(limit, 50)),
+            "market": self.market,
+        }
+
+    @coalesce_search("search")
     def search_tracks(self, title: str, artist: str, limit: int = 1) -> List[Dict[str, Any]]:
         """Busca pistas por título + artista usando /v1/search (Client Credentials).
 
-        Devuelve una lista de objetos de pista de Spotify (raw) con álbum e imágenes.
+        Devuelve una lista de objetos de pista de Spotify (raw) con álbum e imágenes;
+        los errores del API se propagan (``UpstreamError``).
         """
         if not title or not artist:
             return []
-        q = f"track:{title} artist:{artist}"
-        try:
-            r = requests.get(
-                f"{self.API_BASE}/search",
-                headers=self.auth.headers(),
-                params={
-                    "q": q,
-                    "type": "track",
-                    "limit": max(1, min(limit, 50)),
-                    "market": self.market,
-                },
-                timeout=20,
-            )
-            if r.status_code >= 500:
-                return []
-            r.raise_for_status()
-            data = r.json() or {}
-            return (data.get("tracks") or {}).get("items") or []
-        except Exception:
-            return []
+        r = TRANSPORT.get(
+            f"{self.API_BASE}/search",
+            headers=self.auth.headers(),
+            params=self._search_params(title, artist, limit),
+        )
+        raise_for_upstream(self.name, r)
+        data = r.json() or {}
+        return (data.get("tracks") or {}).get("items") or []
 
+    @coalesce_search("search")
+    async def asearch_tracks(self, title: str, artist: str, limit: int = 1) -> List[Dict[str, Any]]:
+        if not title or not artist:
+            return []
+        # la renovación del token es bloqueante (HTTP y rate limit): fuera del event loop
+        headers = await asyncio.to_thread(self.auth.headers)
+        r = await AIO_TRANSPORT.get(
+            f"{self.API_BASE}/search",
+            headers=headers,
+            params=self._search_params(title, artist, limit),
+        )
+        raise_for_upstream(self.name, r)
+        data = r.json() or {}
+        return (data.get("tracks") or {}).get("items") or []
@@ -0,0 +1,267 @@
+"""Coalescencia de llamadas upstream idénticas en vuelo (single-flight).
+
+Si varios requests piden lo mismo a la vez (misma búsqueda título+artista o los
+mismos IDs de audio-features), solo el primero ("líder") llama al proveedor; el
+resto espera su resultado. No se guarda nada una vez terminada la llamada, por lo
+que no hay riesgo de servir datos viejos (para eso están ``cache`` y
+``feature_store``).
+
+El resultado compartido es un ``concurrent.futures.Future``: sirve tanto a
+threads como a corrutinas de cualquier event loop (el loop de fondo de
+``run_async`` o el de quien llame), vía ``asyncio.wrap_future``.
+
+- ``SingleFlight``: una llamada por clave. Si el líder es cancelado (p. ej.
+  perdió una carrera en ``race_first``) sus seguidores no heredan la
+  cancelación: vuelven a intentar y uno de ellos pasa a ser el líder.
+- ``BatchFlight``: para operaciones por lista de IDs; cada ID en vuelo se comparte
+  y solo los IDs nuevos generan llamada upstream.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import inspect
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+
+def _new_future() -> Future:
+    fut: Future = Future()
+    # en estado RUNNING un seguidor cancelado no puede cancelar la llamada compartida
+    fut.set_running_or_notify_cancel()
+    return fut
+
+
+class _LeaderCancelled(RuntimeError):
+    """La cancelación era del líder, no de quien espera el resultado."""
+
+
+def _shared_error(exc: BaseException) -> BaseException:
+    if isinstance(exc, asyncio.CancelledError):
+        return _LeaderCancelled("La llamada compartida fue cancelada")
+    return exc
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.shared = 0
+
+    def _claim(self, key: Hashable) -> Tuple[Future, bool]:
+        with self._lock:
+            fut = self._calls.get(key)
+            if fut is not None:
+                self.shared += 1
+                return fut, False
+            fut = self._calls[key] = _new_future()
+            self.leaders += 1
+            return fut, True
+
+    def _settle(self, key: Hashable, fut: Future, result: Any = None, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            if self._calls.get(key) is fut:
+                del self._calls[key]
+        if error is not None:
+            fut.set_exception(_shared_error(error))
+        else:
+            fut.set_result(result)
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        while True:
+            fut, leader = self._claim(key)
+            if leader:
+                break
+            try:
+                return fut.result()
+            except _LeaderCancelled:
+                continue
+        try:
+            result = fn()
+        except BaseException as exc:
+            self._settle(key, fut, error=exc)
+            raise
+        self._settle(key, fut, result)
+        return result
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        while True:
+            fut, leader = self._claim(key)
+            if leader:
+                break
+            try:
+                return await asyncio.wrap_future(fut)
+            except _LeaderCancelled:
+                continue
+        try:
+            result = await fn()
+        except BaseException as exc:
+            self._settle(key, fut, error=exc)
+            raise
+        self._settle(key, fut, result)
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        return {"leaders": self.leaders, "shared": self.shared, "in_flight": len(self._calls)}
+
+
+class BatchFlight:
+    """Single-flight por ID para funciones ``ids -> {id: valor}``."""
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.shared = 0
+
+    def _claim(self, scope: Hashable, ids: Sequence[str]) -> Tuple[List[str], Dict[str, Future], Optional[Future]]:
+        own: List[str] = []
+        waiting: Dict[str, Future] = {}
+        with self._lock:
+            fut: Optional[Future] = None
+            for tid in dict.fromkeys(ids):
+                other = self._calls.get((scope, tid))
+                if other is not None:
+                    waiting[tid] = other
+                    continue
+                if fut is None:
+                    fut = _new_future()
+                self._calls[(scope, tid)] = fut
+                own.append(tid)
+            self.shared += len(waiting)
+            if own:
+                self.leaders += 1
+        return own, waiting, fut
+
+    def _settle(self, scope: Hashable, own: List[str], fut: Optional[Future], result: Any = None, error: Optional[BaseException] = None) -> None:
+        if fut is None:
+            return
+        with self._lock:
+            for tid in own:
+                if self._calls.get((scope, tid)) is fut:
+                    del self._calls[(scope, tid)]
+        if error is not None:
+            fut.set_exception(_shared_error(error))
+        else:
+            fut.set_result(result)
+
+    @staticmethod
+    def _merge(out: Dict[str, Any], tid: str, fut: Future, failed: List[str]) -> None:
+        if fut.exception() is not None:
+            failed.append(tid)
+        elif tid in (fut.result() or {}):
+            out[tid] = fut.result()[tid]
+
+    def fetch(self, scope: Hashable, ids: Sequence[str], fn: Callable[[List[str]], Dict[str, Any]]) -> Dict[str, Any]:
+        """Resultado de ``fn`` para ``ids``; solo se piden los IDs que nadie está pidiendo ya.
+
+        Si la llamada de otro request falla, sus IDs se piden de nuevo aquí.
+        """
+        own, waiting, fut = self._claim(scope, ids)
+        out: Dict[str, Any] = {}
+        if own:
+            try:
+                result = fn(own)
+            except BaseException as exc:
+                self._settle(scope, own, fut, error=exc)
+                raise
+            self._settle(scope, own, fut, result)
+            out.update(result)
+        failed: List[str] = []
+        for tid, other in waiting.items():
+            try:
+                other.result()
+            except Exception:
+                pass
+            self._merge(out, tid, other, failed)
+        if failed:
+            out.update(fn(failed))
+        return out
+
+    async def afetch(
+        self, scope: Hashable, ids: Sequence[str], fn: Callable[[List[str]], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        own, waiting, fut = self._claim(scope, ids)
+        out: Dict[str, Any] = {}
+        if own:
+            try:
+                result = await fn(own)
+            except BaseException as exc:
+                self._settle(scope, own, fut, error=exc)
+                raise
+            self._settle(scope, own, fut, result)
+            out.update(result)
+        failed: List[str] = []
+        if waiting:
+            await asyncio.wait([asyncio.wrap_future(f) for f in set(waiting.values())])
+        for tid, other in waiting.items():
+            self._merge(out, tid, other, failed)
+        if failed:
+            out.update(await fn(failed))
+        return out
+
+    def stats(self) -> Dict[str, int]:
+        return {"leaders": self.leaders, "shared_ids": self.shared, "in_flight_ids": len(self._calls)}
+
+
+SEARCH_FLIGHT = SingleFlight()
+FEATURES_FLIGHT = BatchFlight()
+
+
+def coalesce_search(op: str) -> Callable:
+    """Decorador para ``search_tracks``/``asearch_tracks`` de un ``ServiceProvider``.
+
+    La clave es ``(flight_scope(), op, argumentos)``; los argumentos se normalizan
+    con la firma del método para que posicional y keyword coincidan.
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        signature = inspect.signature(fn)
+
+        def _key(self: Any, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Hashable:
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            values = tuple(v for name, v in bound.arguments.items() if name != "self")
+            return (self.flight_scope(), op, values)
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
+                return await SEARCH_FLIGHT.ado(_key(self, args, kwargs), lambda: fn(self, *args, **kwargs))
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
+            return SEARCH_FLIGHT.do(_key(self, args, kwargs), lambda: fn(self, *args, **kwargs))
+
+        return wrapper
+
+    return decorator
+
+
+def coalesce_ids(op: str) -> Callable:
+    """Decorador para ``audio_features``/``aaudio_features``: coalescencia por ID."""
+
+    def decorator(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(self: Any, track_ids: List[str]) -> Dict[str, Any]:
+                if not track_ids:
+                    return {}
+                return await FEATURES_FLIGHT.afetch((self.flight_scope(), op), track_ids, lambda ids: fn(self, ids))
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(self: Any, track_ids: List[str]) -> Dict[str, Any]:
+            if not track_ids:
+                return {}
+            return FEATURES_FLIGHT.fetch((self.flight_scope(), op), track_ids, lambda ids: fn(self, ids))
+
+        return wrapper
+
+    return decorator
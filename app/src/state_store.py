@@ -0,0 +1,158 @@
+"""Almacén de estado efímero con TTL (p. ej. ``state`` -> verifier PKCE del OAuth).
+
+El callback de OAuth puede llegar a un worker de gunicorn distinto del que
+inició el flujo, así que el estado debe ser compartido entre procesos:
+
+- ``memory``: dict + heap de expiraciones (limpieza amortizada, sin recorrer
+  todo el dict); solo sirve con un único proceso.
+- ``sqlite``: archivo local compartido por los workers de la misma máquina.
+- ``redis``: cualquier servidor compatible con Redis (requiere el paquete
+  ``redis``); para varias máquinas.
+
+``PKCE_STORE_BACKEND`` elige el backend (por defecto ``sqlite``).
+"""
+
+from __future__ import annotations
+
+import heapq
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import Config
+from .storage import SqliteStore
+
+
+class StateStore(ABC):
+    @abstractmethod
+    def put(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def pop(self, key: str) -> Optional[Dict[str, Any]]:
+        """Devuelve y elimina ``key`` (un solo uso); ``None`` si no existe o expiró."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def size(self) -> int:
+        raise NotImplementedError
+
+
+class MemoryStateStore(StateStore):
+    def __init__(self) -> None:
+        self._items: Dict[str, Tuple[Dict[str, Any], float]] = {}
+        self._expiry: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float) -> None:
+        # solo se tocan las entradas vencidas del tope del heap
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expiry)
+            item = self._items.get(key)
+            if item is not None and item[1] == expires_at:
+                del self._items[key]
+
+    def put(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        now = time.time()
+        expires_at = now + ttl
+        with self._lock:
+            self._evict(now)
+            self._items[key] = (value, expires_at)
+            heapq.heappush(self._expiry, (expires_at, key))
+
+    def pop(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._items.pop(key, None)
+        if item is None or item[1] < time.time():
+            return None
+        return item[0]
+
+    def size(self) -> int:
+        with self._lock:
+            self._evict(time.time())
+            return len(self._items)
+
+
+class SqliteStateStore(SqliteStore, StateStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS ephemeral_state (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS ephemeral_state_expiry ON ephemeral_state (expires_at);
+    """
+
+    def put(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        now = time.time()
+        # el índice por expires_at hace que la limpieza solo recorra filas vencidas
+        self.execute("DELETE FROM ephemeral_state WHERE expires_at < ?", (now,))
+        self.execute(
+            "INSERT OR REPLACE INTO ephemeral_state (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), now + ttl),
+        )
+
+    def pop(self, key: str) -> Optional[Dict[str, Any]]:
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value, expires_at FROM ephemeral_state WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM ephemeral_state WHERE key = ?", (key,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None or row["expires_at"] < time.time():
+            return None
+        return json.loads(row["value"])
+
+    def size(self) -> int:
+        rows = self.query("SELECT COUNT(*) AS n FROM ephemeral_state WHERE expires_at >= ?", (time.time(),))
+        return rows[0]["n"]
+
+
+class RedisStateStore(StateStore):
+    """Backend sobre un cliente compatible con Redis (``set(ex=)``, ``getdel``/pipeline)."""
+
+    def __init__(self, client: Any, prefix: str = "moodtune:state:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, prefix: str = "moodtune:state:") -> "RedisStateStore":
+        try:
+            import redis  # type: ignore[import-not-found]
+        except ImportError as exc:
+            raise RuntimeError("PKCE_STORE_BACKEND=redis requiere el paquete 'redis'") from exc
+        return cls(redis.Redis.from_url(url), prefix)
+
+    def put(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        self.client.set(self.prefix + key, json.dumps(value, ensure_ascii=False), ex=max(1, int(ttl)))
+
+    def pop(self, key: str) -> Optional[Dict[str, Any]]:
+        name = self.prefix + key
+        if hasattr(self.client, "getdel"):
+            raw = self.client.getdel(name)
+        else:
+            pipe = self.client.pipeline()
+            pipe.get(name)
+            pipe.delete(name)
+            raw = pipe.execute()[0]
+        return json.loads(raw) if raw else None
+
+    def size(self) -> int:
+        return sum(1 for _ in self.client.scan_iter(match=self.prefix + "*"))
+
+
+def build_state_store(backend: Optional[str] = None) -> StateStore:
+    backend = (backend or Config.PKCE_STORE_BACKEND or "sqlite").lower()
+    if backend == "memory":
+        return MemoryStateStore()
+    if backend == "sqlite":
+        return SqliteStateStore(Config.PKCE_STORE_PATH)
+    if backend == "redis":
+        return RedisStateStore.from_url(Config.PKCE_REDIS_URL)
+    raise ValueError(f"PKCE_STORE_BACKEND no soportado: {backend}")
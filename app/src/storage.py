@@ -0,0 +1,115 @@
+"""Helper SQLite compartido por los almacenes locales (caches, stores, colas).
+
+Cada thread usa su propia conexión y la base se abre en modo WAL con
+``busy_timeout``, de modo que varios workers de gunicorn pueden leer y escribir
+el mismo archivo de forma concurrente.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+class SqliteStore:
+    """Base para almacenes respaldados por un archivo SQLite.
+
+    Las subclases definen ``SCHEMA`` (statements idempotentes, ``IF NOT EXISTS``)
+    que se aplica al abrir cada conexión.
+    """
+
+    SCHEMA: str = ""
+
+    def __init__(self, path: str, busy_timeout_ms: int = 5000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._cached: Dict[str, Tuple[float, Optional[List[Tuple[Any, ...]]]]] = {}
+        self._cached_lock = threading.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        if self.path != ":memory:":
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000.0, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        if self.path != ":memory:":
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open()
+            if self.SCHEMA:
+                conn.executescript(self.SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> sqlite3.Cursor:
+        return self.connection().execute(sql, params)
+
+    def executemany(self, sql: str, rows: Iterable[Sequence[Any]]) -> None:
+        conn = self.connection()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(sql, rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def query(self, sql: str, params: Sequence[Any] = ()) -> List[sqlite3.Row]:
+        return self.execute(sql, params).fetchall()
+
+    def touch(self, max_rows: int) -> int:
+        """Recorre hasta ``max_rows`` filas de cada tabla en el orden de su B-tree.
+
+        Las páginas leídas quedan en el page cache del sistema operativo (y en el
+        ``mmap`` si está activo), compartido por las conexiones de todos los
+        threads y workers; el cache de páginas de SQLite es por conexión, así que
+        no se intenta precargar ese. Devuelve las filas leídas.
+        """
+        conn = self.connection()
+        tables = [
+            row["name"]
+            for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")
+        ]
+        read = 0
+        for table in tables:
+            for _ in conn.execute(f'SELECT * FROM "{table}" LIMIT ?', (max(0, max_rows),)):
+                read += 1
+        return read
+
+    def cached_rows(self, sql: str, ttl: float, params: Sequence[Any] = ()) -> Optional[List[Tuple[Any, ...]]]:
+        """Filas de una consulta costosa (p. ej. ``COUNT(*)``), recalculada a lo sumo
+        cada ``ttl`` segundos. Si falla, se conserva el último resultado (``None`` si no hay)."""
+        key = f"{sql}\x1f{params!r}"
+        cached = self._cached.get(key)
+        if cached is not None and time.monotonic() < cached[0]:
+            return cached[1]
+        with self._cached_lock:
+            cached = self._cached.get(key)
+            if cached is not None and time.monotonic() < cached[0]:
+                return cached[1]
+            rows = cached[1] if cached is not None else None
+            try:
+                rows = [tuple(row) for row in self.query(sql, params)]
+            except Exception:
+                logger.warning("No se pudo calcular %s en %s", sql, self.path, exc_info=True)
+            self._cached[key] = (time.monotonic() + ttl, rows)
+            return rows
+
+    def cached_scalar(self, sql: str, ttl: float, params: Sequence[Any] = ()) -> Optional[float]:
+        """Como ``cached_rows`` para una consulta de un solo valor."""
+        rows = self.cached_rows(sql, ttl, params)
+        return float(rows[0][0]) if rows and rows[0][0] is not None else None
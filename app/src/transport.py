@@ -0,0 +1,522 @@
+"""Capa HTTP compartida para servicios y proveedores.
+
+Mantiene una ``requests.Session`` con pool keep-alive por host upstream
+(api.spotify.com, itunes.apple.com, api.music.amazon.dev, ...) para no repetir
+el handshake TCP/TLS en cada llamada. Los timeouts (connect, read) se resuelven
+por host y cada pool cuenta cuántas conexiones abrió, de modo que
+``stats()`` permite comprobar el reuso real de conexiones.
+
+Cada petición pasa por el ``RateScheduler`` (presupuesto por host, ver
+``ratelimit``). Las respuestas 429 se reintentan respetando ``Retry-After`` y
+los 5xx de métodos idempotentes con backoff exponencial; si la espera supera
+``RATE_LIMIT_MAX_WAIT_SECONDS`` se devuelve la respuesta tal cual al llamador.
+Antes del turno se consulta el circuit breaker del host (ver ``circuit``): con
+el circuito abierto la petición falla de inmediato con ``CircuitOpenError``.
+
+Uso:
+    from ..transport import TRANSPORT
+    r = TRANSPORT.get("https://api.spotify.com/v1/search", params=...)
+
+Para el camino asíncrono (``asearch_tracks``/``aaudio_features``) existe
+``AIO_TRANSPORT``, basado en ``httpx.AsyncClient``, con los mismos timeouts por
+host. Cada event loop tiene su propio cliente; ``run_async`` ejecuta las
+corrutinas en un único event loop de larga vida por proceso (un thread de
+fondo), de modo que el cliente y sus conexiones keep-alive se reusan entre
+requests en lugar de abrirse y cerrarse en cada uno.
+
+Ambos transportes registran en ``metrics`` la latencia de cada intento por
+host y endpoint, el status, los reintentos, la espera del scheduler, los
+rechazos locales y los bytes enviados/recibidos.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from typing import Any, Awaitable, Dict, Optional, Tuple, TypeVar
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .circuit import BREAKERS, CircuitBreakers, CircuitOpenError
+from .config import Config
+from .metrics import METRICS, endpoint_of, observe_upstream
+from .ratelimit import SCHEDULER, RateLimited, RateScheduler, parse_retry_after
+
+
+Timeout = Tuple[float, float]
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "PUT", "DELETE", "OPTIONS"})
+RETRYABLE_5XX = frozenset({500, 502, 503, 504})
+
+
+class HostStats:
+    __slots__ = ("requests", "new_connections", "errors", "retries", "throttled", "_lock")
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.new_connections = 0
+        self.errors = 0
+        self.retries = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def incr(self, field: str) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reused_connections": max(0, self.requests - self.new_connections),
+            "errors": self.errors,
+            "retries": self.retries,
+            "throttled": self.throttled,
+        }
+
+
+def _counting_pool(base: type, stats: HostStats) -> type:
+    """Subclase del pool de urllib3 que cuenta las conexiones nuevas."""
+
+    class _CountingPool(base):  # type: ignore[misc, valid-type]
+        def _new_conn(self):
+            stats.incr("new_connections")
+            return super()._new_conn()
+
+    return _CountingPool
+
+
+class _PooledAdapter(HTTPAdapter):
+    def __init__(self, stats: HostStats, **kwargs: Any):
+        self._stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _counting_pool(HTTPConnectionPool, self._stats),
+            "https": _counting_pool(HTTPSConnectionPool, self._stats),
+        }
+
+
+def parse_host_timeouts(raw: Optional[str]) -> Dict[str, Timeout]:
+    """Parsea ``"host=connect:read,host2=connect:read"`` a un dict por host."""
+    out: Dict[str, Timeout] = {}
+    for part in (raw or "").split(","):
+        host, _, values = part.strip().partition("=")
+        if not host or not values:
+            continue
+        connect, _, read = values.partition(":")
+        try:
+            out[host.strip().lower()] = (float(connect), float(read or connect))
+        except ValueError:
+            continue
+    return out
+
+
+def retry_delay(
+    scheduler: RateScheduler,
+    host: str,
+    method: str,
+    status: int,
+    headers: Any,
+    attempt: int,
+    backoff: float,
+) -> Optional[float]:
+    """Segundos a esperar antes de reintentar, o ``None`` si no corresponde.
+
+    Un 429 bloquea el host en el scheduler durante ``Retry-After``; la espera
+    ocurre entonces en el siguiente ``acquire`` y aquí se devuelve 0.
+    """
+    if status == 429:
+        retry_after = parse_retry_after(headers.get("Retry-After"), default=backoff * (2 ** attempt))
+        scheduler.on_throttled(host, retry_after)
+        return 0.0 if retry_after <= scheduler.max_wait else None
+    if status in RETRYABLE_5XX and method.upper() in IDEMPOTENT_METHODS:
+        return backoff * (2 ** attempt) + random.random() * backoff / 2
+    return None
+
+
+def _body_size(body: Any) -> int:
+    return len(body) if isinstance(body, (bytes, str)) else 0
+
+
+def _response_size(resp: requests.Response) -> int:
+    length = resp.headers.get("Content-Length")
+    if length and length.isdigit():
+        return int(length)
+    content = getattr(resp, "_content", None)
+    return len(content) if isinstance(content, bytes) else 0
+
+
+def _rejected(host: str, reason: str) -> None:
+    METRICS.inc("moodtune_upstream_rejected_total", {"host": host, "reason": reason})
+
+
+def _before(breaker: Any, host: str) -> bool:
+    try:
+        return breaker.before() if breaker is not None else False
+    except CircuitOpenError:
+        _rejected(host, "circuit_open")
+        raise
+
+
+class HttpTransport:
+    """Sesiones HTTP con pool por host, timeouts por host y contadores de reuso."""
+
+    def __init__(
+        self,
+        pool_maxsize: int = 20,
+        keepalive: bool = True,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 20.0,
+        host_timeouts: Optional[Dict[str, Timeout]] = None,
+        max_retries: int = 2,
+        retry_backoff: float = 0.5,
+        scheduler: RateScheduler = SCHEDULER,
+        breakers: CircuitBreakers = BREAKERS,
+    ):
+        self.pool_maxsize = max(1, pool_maxsize)
+        self.keepalive = keepalive
+        self.default_timeout: Timeout = (connect_timeout, read_timeout)
+        self.host_timeouts = dict(host_timeouts or {})
+        self.max_retries = max(0, max_retries)
+        self.retry_backoff = retry_backoff
+        self.scheduler = scheduler
+        self.breakers = breakers
+        self._sessions: Dict[str, requests.Session] = {}
+        self._stats: Dict[str, HostStats] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> "HttpTransport":
+        return cls(
+            pool_maxsize=Config.HTTP_POOL_MAXSIZE,
+            keepalive=Config.HTTP_KEEPALIVE,
+            connect_timeout=Config.HTTP_CONNECT_TIMEOUT,
+            read_timeout=Config.HTTP_READ_TIMEOUT,
+            host_timeouts=parse_host_timeouts(Config.HTTP_HOST_TIMEOUTS),
+            max_retries=Config.HTTP_MAX_RETRIES,
+            retry_backoff=Config.HTTP_RETRY_BACKOFF_SECONDS,
+        )
+
+    @staticmethod
+    def host_of(url: str) -> str:
+        return (urlsplit(url).hostname or "").lower()
+
+    def _build_session(self, stats: HostStats) -> requests.Session:
+        session = requests.Session()
+        adapter = _PooledAdapter(
+            stats,
+            pool_connections=1,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=0,
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        if not self.keepalive:
+            session.headers["Connection"] = "close"
+        return session
+
+    def session(self, url: str) -> requests.Session:
+        host = self.host_of(url)
+        session = self._sessions.get(host)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(host)
+                if session is None:
+                    stats = self._stats.setdefault(host, HostStats())
+                    session = self._build_session(stats)
+                    self._sessions[host] = session
+        return session
+
+    def preconnect(self, url: str) -> bool:
+        """Abre una conexión keep-alive al host de ``url`` sin enviar peticiones.
+
+        ``True`` si se abrió una conexión nueva; ``False`` si el pool ya tenía una.
+        """
+        session = self.session(url)
+        adapter = session.get_adapter(url)
+        if hasattr(adapter, "get_connection_with_tls_context"):
+            prepared = requests.Request("GET", url).prepare()
+            pool = adapter.get_connection_with_tls_context(prepared, verify=session.verify, cert=session.cert)
+        else:
+            pool = adapter.get_connection(url)
+        conn = pool._get_conn(timeout=0)
+        try:
+            if conn.sock is not None:
+                return False
+            conn.timeout = self.timeout_for(url)[0]
+            conn.connect()
+            return True
+        except Exception:
+            conn.close()
+            raise
+        finally:
+            pool._put_conn(conn)
+
+    def timeout_for(self, url: str) -> Timeout:
+        return self.host_timeouts.get(self.host_of(url), self.default_timeout)
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        """Petición con turno del scheduler y reintentos de 429/5xx.
+
+        Puede lanzar ``RateLimited`` si el host no tiene presupuesto dentro de
+        ``RATE_LIMIT_MAX_WAIT_SECONDS`` y ``CircuitOpenError`` si su circuito
+        está abierto.
+        """
+        kwargs.setdefault("timeout", self.timeout_for(url))
+        host = self.host_of(url)
+        session = self.session(url)
+        stats = self._stats[host]
+        breaker = self.breakers.get(host)
+        attempt = 0
+        while True:
+            probe = _before(breaker, host)
+            ok: Optional[bool] = None
+            t0 = time.monotonic()
+            try:
+                try:
+                    self.scheduler.acquire(host)
+                except RateLimited:
+                    _rejected(host, "rate_limited")
+                    raise
+                stats.incr("requests")
+                waited, t0 = t0, time.monotonic()
+                METRICS.observe("moodtune_upstream_wait_seconds", t0 - waited, {"host": host})
+                try:
+                    resp = session.request(method, url, **kwargs)
+                except requests.RequestException:
+                    stats.incr("errors")
+                    observe_upstream(host, url, method, "error", time.monotonic() - t0)
+                    ok = False
+                    raise
+                ok = resp.status_code not in RETRYABLE_5XX
+                observe_upstream(
+                    host, url, method, str(resp.status_code), time.monotonic() - t0,
+                    sent=_body_size(resp.request.body), received=_response_size(resp),
+                )
+            finally:
+                if breaker is not None:
+                    breaker.record(ok, time.monotonic() - t0, probe)
+            if resp.status_code == 429:
+                stats.incr("throttled")
+            delay = retry_delay(self.scheduler, host, method, resp.status_code, resp.headers, attempt, self.retry_backoff)
+            if delay is None or attempt >= self.max_retries:
+                return resp
+            attempt += 1
+            stats.incr("retries")
+            METRICS.inc("moodtune_upstream_retries_total", {"host": host, "endpoint": endpoint_of(url)})
+            resp.close()
+            if delay > 0:
+                time.sleep(delay)
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("PUT", url, **kwargs)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {host: s.as_dict() for host, s in sorted(self._stats.items())}
+
+    def close(self) -> None:
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+class AsyncHttpTransport:
+    """Equivalente asíncrono de ``HttpTransport`` sobre ``httpx.AsyncClient``."""
+
+    def __init__(
+        self,
+        max_connections: int = 200,
+        keepalive: bool = True,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 20.0,
+        host_timeouts: Optional[Dict[str, Timeout]] = None,
+        max_retries: int = 2,
+        retry_backoff: float = 0.5,
+        scheduler: RateScheduler = SCHEDULER,
+        breakers: CircuitBreakers = BREAKERS,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max(1, max_connections),
+            max_keepalive_connections=max(1, max_connections) if keepalive else 0,
+        )
+        self.default_timeout: Timeout = (connect_timeout, read_timeout)
+        self.host_timeouts = dict(host_timeouts or {})
+        self.max_retries = max(0, max_retries)
+        self.retry_backoff = retry_backoff
+        self.scheduler = scheduler
+        self.breakers = breakers
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+        self._stats: Dict[str, HostStats] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> "AsyncHttpTransport":
+        return cls(
+            max_connections=Config.HTTP_ASYNC_MAX_CONNECTIONS,
+            keepalive=Config.HTTP_KEEPALIVE,
+            connect_timeout=Config.HTTP_CONNECT_TIMEOUT,
+            read_timeout=Config.HTTP_READ_TIMEOUT,
+            host_timeouts=parse_host_timeouts(Config.HTTP_HOST_TIMEOUTS),
+            max_retries=Config.HTTP_MAX_RETRIES,
+            retry_backoff=Config.HTTP_RETRY_BACKOFF_SECONDS,
+        )
+
+    def _client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(limits=self.limits)
+            self._clients[loop] = client
+        return client
+
+    def _host_stats(self, host: str) -> HostStats:
+        stats = self._stats.get(host)
+        if stats is None:
+            with self._lock:
+                stats = self._stats.setdefault(host, HostStats())
+        return stats
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        host = HttpTransport.host_of(url)
+        if "timeout" not in kwargs:
+            connect, read = self.host_timeouts.get(host, self.default_timeout)
+            kwargs["timeout"] = httpx.Timeout(read, connect=connect)
+        stats = self._host_stats(host)
+        breaker = self.breakers.get(host)
+        attempt = 0
+        while True:
+            probe = _before(breaker, host)
+            ok: Optional[bool] = None
+            t0 = time.monotonic()
+            try:
+                try:
+                    await self.scheduler.aacquire(host)
+                except RateLimited:
+                    _rejected(host, "rate_limited")
+                    raise
+                stats.incr("requests")
+                waited, t0 = t0, time.monotonic()
+                METRICS.observe("moodtune_upstream_wait_seconds", t0 - waited, {"host": host})
+                try:
+                    resp = await self._client().request(method, url, **kwargs)
+                except httpx.HTTPError:
+                    stats.incr("errors")
+                    observe_upstream(host, url, method, "error", time.monotonic() - t0)
+                    ok = False
+                    raise
+                ok = resp.status_code not in RETRYABLE_5XX
+                observe_upstream(
+                    host, url, method, str(resp.status_code), time.monotonic() - t0,
+                    sent=len(resp.request.content), received=resp.num_bytes_downloaded,
+                )
+            finally:
+                # una cancelación (p. ej. perder una carrera) no cuenta como fallo
+                if breaker is not None:
+                    breaker.record(ok, time.monotonic() - t0, probe)
+            if resp.status_code == 429:
+                stats.incr("throttled")
+            delay = retry_delay(self.scheduler, host, method, resp.status_code, resp.headers, attempt, self.retry_backoff)
+            if delay is None or attempt >= self.max_retries:
+                return resp
+            attempt += 1
+            stats.incr("retries")
+            METRICS.inc("moodtune_upstream_retries_total", {"host": host, "endpoint": endpoint_of(url)})
+            await resp.aclose()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def aclose_current(self) -> None:
+        """Cierra el cliente asociado al loop en ejecución, si existe."""
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            host: {"requests": s.requests, "errors": s.errors, "retries": s.retries, "throttled": s.throttled}
+            for host, s in sorted(self._stats.items())
+        }
+
+
+TRANSPORT = HttpTransport.from_config()
+AIO_TRANSPORT = AsyncHttpTransport.from_config()
+
+T = TypeVar("T")
+
+
+class _BackgroundLoop:
+    """Event loop de larga vida en un thread daemon, uno por proceso (se recrea tras un fork)."""
+
+    def __init__(self) -> None:
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> asyncio.AbstractEventLoop:
+        loop = self._loop
+        if loop is not None and self._pid == os.getpid():
+            return loop
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="async-loop", daemon=True).start()
+                self._loop, self._pid = loop, os.getpid()
+            return self._loop
+
+
+_LOOP = _BackgroundLoop()
+
+
+def run_async(coro: Awaitable[T]) -> T:
+    """Ejecuta ``coro`` en el loop de fondo y espera su resultado (p. ej. desde una vista Flask síncrona).
+
+    No debe llamarse desde una corrutina de ese mismo loop (se bloquearía esperándose a sí mismo).
+    """
+    loop = _LOOP.get()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        getattr(coro, "close", lambda: None)()
+        raise RuntimeError("run_async no puede llamarse desde el loop de fondo; usar await")
+    finished = threading.Event()
+
+    async def _main() -> T:
+        try:
+            return await coro
+        finally:
+            finished.set()
+
+    future = asyncio.run_coroutine_threadsafe(_main(), loop)
+    try:
+        return future.result()
+    except BaseException:
+        # p. ej. KeyboardInterrupt en la CLI: cancelar y dejar correr los finally de la corrutina
+        future.cancel()
+        finished.wait(5.0)
+        raise
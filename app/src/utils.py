@@ -1,17 +1,48 @@
+import json
 import random
 import time
-from typing import Callable
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
 
+NDJSON_MIMETYPE = "application/x-ndjson"
 
-def backoff_retry(fn: Callable, max_tries: int = 3, base_delay: float = 0.5, jitter: float = 0.25):
+
+def backoff_retry(
+    fn: Callable,
+    max_tries: int = 3,
+    base_delay: float = 0.5,
+    jitter: float = 0.25,
+    retry_if: Optional[Callable[[Exception], bool]] = None,
+):
+    """Reintenta ``fn`` con backoff exponencial.
+
+    - ``retry_if``: si devuelve ``False`` la excepción se propaga sin reintentar.
+    - Si la excepción trae ``retry_after`` (p. ej. ``RateLimited``) se espera ese
+      tiempo en lugar del backoff.
+    """
     last_exc = None
     for i in range(max_tries):
         try:
             return fn()
         except Exception as e:
             last_exc = e
-            if i == max_tries - 1:
+            if i == max_tries - 1 or (retry_if is not None and not retry_if(e)):
                 break
-            time.sleep(base_delay * (2 ** i) + random.random() * jitter)
+            delay = getattr(e, "retry_after", None)
+            if not isinstance(delay, (int, float)):
+                delay = base_delay * (2 ** i) + random.random() * jitter
+            time.sleep(delay)
     raise last_exc
 
+
+def wants_ndjson(req: Any, body: Dict[str, Any] | None = None) -> bool:
+    """True si el cliente pide streaming (``Accept: application/x-ndjson``, ``?stream=1`` o ``stream: true``)."""
+    if req.args.get("stream", "").lower() in ("1", "true"):
+        return True
+    if body and body.get("stream") is True:
+        return True
+    return req.accept_mimetypes.best == NDJSON_MIMETYPE
+
+
+def ndjson(records: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + "\n"
@@ -0,0 +1,135 @@
+"""Calentamiento del worker al arrancar (``create_app``).
+
+Sin esto, las primeras peticiones tras un deploy o un reciclado de worker pagan
+el trabajo diferido: construir servicios, pedir el primer token client
+credentials, el primer handshake TLS con cada proveedor y abrir los SQLite
+locales. Con ``WARMUP_ENABLED`` se hace antes de aceptar tráfico, en pasos:
+
+- ``services``: instancias del registro para los proveedores configurados;
+- ``tokens``: tokens client credentials (quedan en ``TOKEN_REGISTRY``);
+- ``connections``: una conexión keep-alive por host de catálogo en el pool;
+- ``caches``: abre los almacenes locales y recorre las primeras
+  ``WARMUP_CACHE_ROWS`` filas de cada tabla, para que sus páginas queden en el
+  page cache del sistema operativo (y en el ``mmap`` del índice de catálogo).
+
+Cada paso registra su duración (``report``); un fallo no impide el arranque,
+solo deja ese trabajo para la primera petición que lo necesite.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .cache import PLAYLIST_CACHE, RESOLVE_CACHE
+from .catalog_index import CATALOG_INDEX
+from .config import Config
+from .feature_store import FEATURE_STORE
+from .registry import SERVICES, ServiceRegistry
+from .transport import TRANSPORT, HttpTransport
+
+
+logger = logging.getLogger(__name__)
+
+STEPS = ("services", "tokens", "connections", "caches")
+
+
+def _services(registry: ServiceRegistry) -> Dict[str, Any]:
+    return registry.warm_up()
+
+
+def _tokens(registry: ServiceRegistry) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for name in registry.names():
+        if not name.startswith("credentials.") or not registry.configured(name):
+            continue
+        started = time.perf_counter()
+        try:
+            registry.get(name).token()
+            out[name] = {"ms": _ms(started)}
+        except Exception as exc:
+            out[name] = {"ms": _ms(started), "error": str(exc)}
+    return out
+
+
+def _connections(registry: ServiceRegistry, transport: HttpTransport) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for svc in registry.built("catalog.").values():
+        base = getattr(svc, "api_base", None) or svc.API_BASE
+        host = svc.upstream_host()
+        if not base or not host or host in out:
+            continue
+        started = time.perf_counter()
+        try:
+            opened = transport.preconnect(base)
+            out[host] = {"ms": _ms(started), "opened": opened}
+        except Exception as exc:
+            out[host] = {"ms": _ms(started), "error": str(exc)}
+    return out
+
+
+def _caches() -> Dict[str, Any]:
+    stores = {
+        "catalog_index": CATALOG_INDEX,
+        "audio_features": FEATURE_STORE,
+        "resolve_shared": RESOLVE_CACHE.shared,
+        "playlist_shared": PLAYLIST_CACHE.shared,
+    }
+    out: Dict[str, Any] = {}
+    for name, store in stores.items():
+        if store is None:
+            continue
+        started = time.perf_counter()
+        try:
+            # abre la conexión del thread (esquema, WAL, mmap) y lee las páginas de las tablas
+            rows = store.touch(Config.WARMUP_CACHE_ROWS)
+            out[name] = {"ms": _ms(started), "rows": rows}
+        except Exception as exc:
+            out[name] = {"ms": _ms(started), "error": str(exc)}
+    return out
+
+
+def _ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def run(
+    steps: Optional[List[str]] = None,
+    registry: ServiceRegistry = SERVICES,
+    transport: HttpTransport = TRANSPORT,
+) -> Dict[str, Any]:
+    """Ejecuta los pasos en orden y devuelve ``{paso: {ms, items}}`` más ``total_ms``."""
+    actions: Dict[str, Callable[[], Dict[str, Any]]] = {
+        "services": lambda: _services(registry),
+        "tokens": lambda: _tokens(registry),
+        "connections": lambda: _connections(registry, transport),
+        "caches": _caches,
+    }
+    report: Dict[str, Any] = {}
+    begun = time.perf_counter()
+    for step in steps if steps is not None else list(STEPS):
+        action = actions.get(step)
+        if action is None:
+            logger.warning("Paso de warm-up desconocido: %s", step)
+            continue
+        started = time.perf_counter()
+        try:
+            report[step] = {"ms": 0.0, "items": action()}
+        except Exception as exc:
+            report[step] = {"ms": 0.0, "error": str(exc)}
+        report[step]["ms"] = _ms(started)
+        logger.info("Warm-up %s: %.1f ms %s", step, report[step]["ms"], _summary(report[step]))
+    report["total_ms"] = _ms(begun)
+    return report
+
+
+def _summary(step: Dict[str, Any]) -> str:
+    if "error" in step:
+        return f"error={step['error']}"
+    parts: List[Tuple[str, Any]] = [(name, item.get("error") or f"{item['ms']} ms") for name, item in step["items"].items()]
+    return ", ".join(f"{name}={value}" for name, value in parts)
+
+
+def configured_steps() -> List[str]:
+    return [s.strip().lower() for s in (Config.WARMUP_STEPS or "").split(",") if s.strip()]
@@ -0,0 +1,238 @@
+"""Resolución masiva título+artista desde un archivo CSV o JSON lines.
+
+Usa el mismo núcleo que ``/catalog/resolve-batch`` (cache, índice local del
+catálogo, puntaje de coincidencia y presupuesto por host del scheduler) sobre
+el camino asíncrono, sin pasar por HTTP. La entrada se lee en streaming y solo
+hay ``--concurrency`` búsquedas en curso y una ventana acotada de filas en
+memoria, así que el consumo no depende del tamaño del archivo.
+
+La salida (JSON lines, una línea por fila, en el orden de entrada) se escribe
+de forma incremental y cada ``--checkpoint-every`` filas se guarda un
+checkpoint (filas escritas y tamaño de la salida). Si el proceso se corta,
+volver a ejecutar el mismo comando reanuda desde el último checkpoint.
+
+Uso:
+    python resolve_cli.py tracks.csv -o resolved.jsonl
+    python resolve_cli.py tracks.jsonl -o resolved.jsonl --mode hedge --concurrency 32
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, Optional, Tuple
+
+from app.src.config import Config
+from app.src.resolver import aresolve_multi, aresolve_normalized, catalog_service, resolve_options
+from app.src.transport import run_async
+
+
+logger = logging.getLogger("resolve_cli")
+
+Row = Tuple[int, Dict[str, Any]]
+
+
+def read_rows(path: str, fmt: str, skip: int = 0) -> Iterator[Row]:
+    """Itera ``(índice, registro)`` del archivo sin cargarlo completo."""
+    with open(path, newline="", encoding="utf-8") as fh:
+        if fmt == "csv":
+            records: Iterator[Dict[str, Any]] = csv.DictReader(fh)
+        else:
+            records = (json.loads(line) for line in fh if line.strip())
+        for index, record in enumerate(records):
+            if index >= skip:
+                yield index, record
+
+
+class Checkpoint:
+    """Filas ya escritas y tamaño de la salida en ese punto (escritura atómica)."""
+
+    def __init__(self, path: str, source: str):
+        self.path = path
+        self.source = os.path.abspath(source)
+
+    def load(self) -> Tuple[int, int]:
+        try:
+            with open(self.path, encoding="utf-8") as fh:
+                data = json.load(fh)
+        except FileNotFoundError:
+            return 0, 0
+        if data.get("input") != self.source:
+            raise SystemExit(f"El checkpoint {self.path} corresponde a otra entrada: {data.get('input')}")
+        return int(data["rows"]), int(data["offset"])
+
+    def save(self, rows: int, offset: int) -> None:
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"input": self.source, "rows": rows, "offset": offset, "updated_at": time.time()}, fh)
+        os.replace(tmp, self.path)
+
+    def clear(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class Progress:
+    def __init__(self, every: float, start: int = 0):
+        self.every = every
+        self.done = start
+        self.matched = 0
+        self.errors = 0
+        self.resumed = start
+        self._t0 = self._last = time.monotonic()
+
+    @property
+    def processed(self) -> int:
+        return self.done - self.resumed
+
+    def add(self, matched: bool, error: bool) -> None:
+        self.done += 1
+        self.matched += int(matched)
+        self.errors += int(error)
+        now = time.monotonic()
+        if now - self._last >= self.every:
+            self._last = now
+            self.report()
+
+    def report(self, final: bool = False) -> None:
+        elapsed = max(1e-6, time.monotonic() - self._t0)
+        logger.info(
+            "%s %d filas (%d con coincidencia, %d errores) %.1f filas/s",
+            "Terminado:" if final else "Progreso:",
+            self.done,
+            self.matched,
+            self.errors,
+            self.processed / elapsed,
+        )
+
+
+async def resolve_file(args: argparse.Namespace) -> Progress:
+    opts = resolve_options({
+        "mode": args.mode,
+        "providers": args.providers,
+        "hedge_ms": args.hedge_ms,
+        "min_score": args.min_score,
+    })
+    multi = opts["mode"] != "single"
+    svc = None if multi else catalog_service((args.provider or Config.DEFAULT_PROVIDER or "spotify").lower())
+    semaphore = asyncio.Semaphore(max(1, args.concurrency))
+
+    async def _resolve(title: str, artist: str) -> Dict[str, Any]:
+        attempt = 0
+        while True:
+            try:
+                async with semaphore:
+                    if multi:
+                        return {"items": (await aresolve_multi(title, artist, args.limit, opts))["items"]}
+                    return {"items": await aresolve_normalized(svc, title, artist, args.limit, opts["min_score"])}
+            except Exception as exc:
+                # RateLimited / CircuitOpenError traen retry_after: en un backfill conviene esperar
+                retry_after = getattr(exc, "retry_after", None)
+                if retry_after is None or attempt >= args.max_retries:
+                    return {"items": [], "error": str(exc) or exc.__class__.__name__}
+                attempt += 1
+                await asyncio.sleep(retry_after)
+
+    async def _row(record: Dict[str, Any]) -> Dict[str, Any]:
+        title = str(record.get(args.title_field) or "").strip()
+        artist = str(record.get(args.artist_field) or "").strip()
+        if not title or not artist:
+            return {"title": title, "artist": artist, "items": [], "error": "title y artist requeridos"}
+        return {"title": title, "artist": artist, **await _resolve(title, artist)}
+
+    checkpoint = Checkpoint(args.checkpoint or f"{args.output}.checkpoint", args.input)
+    if args.restart:
+        checkpoint.clear()
+    start, offset = checkpoint.load()
+    if start:
+        if not os.path.exists(args.output):
+            raise SystemExit(f"Hay checkpoint pero no existe {args.output}; usa --restart")
+        logger.info("Reanudando desde la fila %d", start)
+        out = open(args.output, "r+b")
+        # descarta lo escrito después del último checkpoint
+        out.truncate(offset)
+        out.seek(offset)
+    else:
+        out = open(args.output, "wb")
+
+    progress = Progress(args.progress_seconds, start)
+    window: Deque[Tuple[Row, "asyncio.Task[Dict[str, Any]]"]] = deque()
+    written = start
+
+    async def _drain_one() -> None:
+        nonlocal written
+        (index, record), task = window.popleft()
+        entry = await task
+        line = {"index": index, **entry, "input": record}
+        out.write((json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8"))
+        written = index + 1
+        progress.add(bool(entry["items"]), "error" in entry)
+        if written % args.checkpoint_every == 0:
+            out.flush()
+            checkpoint.save(written, out.tell())
+
+    try:
+        # la ventana ordenada acota la memoria: solo avanza cuando se escribe la fila más antigua
+        max_window = max(1, args.concurrency) * 4
+        for row in read_rows(args.input, args.format, skip=start):
+            window.append((row, asyncio.ensure_future(_row(row[1]))))
+            if len(window) >= max_window:
+                await _drain_one()
+        while window:
+            await _drain_one()
+    finally:
+        for _, task in window:
+            task.cancel()
+        out.flush()
+        checkpoint.save(written, out.tell())
+        out.close()
+    progress.report(final=True)
+    return progress
+
+
+def parse_args(argv: Optional[list] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Resolución masiva título+artista a tracks normalizados.")
+    parser.add_argument("input", help="Archivo CSV (con encabezados) o JSON lines")
+    parser.add_argument("-o", "--output", required=True, help="Salida JSON lines")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="Formato de entrada (por defecto según la extensión)")
+    parser.add_argument("--title-field", default="title")
+    parser.add_argument("--artist-field", default="artist")
+    parser.add_argument("--provider", help="Proveedor en modo single (default DEFAULT_PROVIDER)")
+    parser.add_argument("--mode", choices=("single", "race", "hedge"), default="single")
+    parser.add_argument("--providers", help="Proveedores para race/hedge, separados por coma (default RESOLVE_PROVIDERS)")
+    parser.add_argument("--hedge-ms", type=int)
+    parser.add_argument("--min-score", type=float)
+    parser.add_argument("--limit", type=int, default=1, help="Coincidencias por fila")
+    parser.add_argument("--concurrency", type=int, default=Config.RESOLVE_BATCH_ASYNC_CONCURRENCY)
+    parser.add_argument("--max-retries", type=int, default=3, help="Reintentos por fila ante rate limit o circuito abierto")
+    parser.add_argument("--checkpoint", help="Archivo de checkpoint (default <output>.checkpoint)")
+    parser.add_argument("--checkpoint-every", type=int, default=500)
+    parser.add_argument("--progress-seconds", type=float, default=10.0)
+    parser.add_argument("--restart", action="store_true", help="Ignora el checkpoint y empieza desde cero")
+    args = parser.parse_args(argv)
+    if args.format is None:
+        args.format = "csv" if args.input.lower().endswith(".csv") else "jsonl"
+    args.checkpoint_every = max(1, args.checkpoint_every)
+    return args
+
+
+def main(argv: Optional[list] = None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    args = parse_args(argv)
+    try:
+        progress = run_async(resolve_file(args))
+    except KeyboardInterrupt:
+        logger.warning("Interrumpido; volver a ejecutar el mismo comando reanuda desde el checkpoint")
+        return 130
+    return 1 if progress.errors and progress.errors == progress.processed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
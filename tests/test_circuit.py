@@ -0,0 +1,51 @@
+import time
+
+import pytest
+
+from app.src.circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+def _open_breaker(open_seconds=0.05):
+    breaker = CircuitBreaker("api.test", min_calls=2, failure_ratio=0.5, open_seconds=open_seconds)
+    for _ in range(2):
+        probe = breaker.before()
+        breaker.record(False, 0.01, probe)
+    assert breaker.state == OPEN
+    return breaker
+
+
+def test_abierto_rechaza_con_retry_after():
+    breaker = _open_breaker(open_seconds=30)
+    with pytest.raises(CircuitOpenError) as err:
+        breaker.before()
+    assert 0 < err.value.retry_after <= 30
+    assert breaker.rejected == 1
+
+
+def test_half_open_deja_pasar_una_sola_prueba():
+    breaker = _open_breaker()
+    time.sleep(0.06)
+    assert breaker.snapshot()["state"] == HALF_OPEN
+    assert breaker.before() is True
+    with pytest.raises(CircuitOpenError):
+        breaker.before()
+    breaker.record(True, 0.01, probe=True)
+    assert breaker.state == CLOSED
+    assert breaker.before() is False
+
+
+def test_prueba_fallida_reabre():
+    breaker = _open_breaker()
+    time.sleep(0.06)
+    probe = breaker.before()
+    breaker.record(False, 0.01, probe)
+    assert breaker.state == OPEN
+    assert breaker.opens == 2
+
+
+def test_prueba_sin_completar_libera_el_turno():
+    breaker = _open_breaker()
+    time.sleep(0.06)
+    probe = breaker.before()
+    breaker.record(None, 0.0, probe)
+    assert breaker.before() is True
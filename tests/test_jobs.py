@@ -0,0 +1,35 @@
+import time
+
+import pytest
+
+from app.src.jobs import JobQueue, LeaseLost
+
+
+def test_job_con_lease_vencido_se_retoma(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    job_id = queue.enqueue("playlist", {"name": "x"}, secrets={"provider_access_token": "t"})
+    first = queue.claim("w1", lease_seconds=0.01)
+    assert first["job_id"] == job_id and first["secrets"] == {"provider_access_token": "t"}
+    assert queue.claim("w2", lease_seconds=30) is None
+
+    time.sleep(0.02)
+    second = queue.claim("w2", lease_seconds=30)
+    assert second["job_id"] == job_id and second["attempts"] == 2
+    with pytest.raises(LeaseLost):
+        queue.progress(job_id, "w1", {"chunks": 1}, lease_seconds=30)
+    assert not queue.complete(job_id, "w1", {})
+    assert queue.complete(job_id, "w2", {"playlist_id": "p"})
+    assert queue.get(job_id, include_payload=True)["payload"] == {}
+
+
+def test_job_agota_intentos_tras_leases_vencidos(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    job_id = queue.enqueue("playlist", {"name": "x"}, secrets={"provider_access_token": "t"})
+    for _ in range(2):
+        assert queue.claim("w", lease_seconds=0.01, max_attempts=2) is not None
+        time.sleep(0.02)
+    assert queue.claim("w", lease_seconds=30, max_attempts=2) is None
+    job = queue.get(job_id, include_payload=True)
+    assert job["status"] == "failed" and job["attempts"] == 2
+    assert job["payload"] == {}
+    assert queue.query("SELECT secrets FROM jobs WHERE id = ?", (job_id,))[0]["secrets"] is None
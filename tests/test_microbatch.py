@@ -0,0 +1,63 @@
+import threading
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import pytest
+
+from app.src.microbatch import BatcherClosed, MicroBatcher, get_batcher
+
+
+def _echo(ids):
+    return {tid: tid.upper() for tid in ids}
+
+
+def test_agrupa_llamadores_concurrentes():
+    calls = []
+
+    def fetch(ids):
+        calls.append(sorted(ids))
+        return _echo(ids)
+
+    batcher = MicroBatcher(fetch, window=0.05)
+    futures = [batcher.submit(["a", "b"]), batcher.submit(["b", "c"])]
+    assert [f.result(5) for f in futures] == [{"a": "A", "b": "B"}, {"b": "B", "c": "C"}]
+    assert calls == [["a", "b", "c"]]
+    batcher.close()
+
+
+def test_close_despacha_lo_pendiente_y_rechaza_nuevos():
+    release = threading.Event()
+
+    def fetch(ids):
+        release.wait(5)
+        return _echo(ids)
+
+    batcher = MicroBatcher(fetch, window=0.0)
+    pending = batcher.submit(["a"])
+    batcher.close()
+    with pytest.raises(BatcherClosed):
+        batcher.submit(["b"])
+    release.set()
+    assert pending.result(5) == {"a": "A"}
+
+
+def test_fetch_tiene_timeout_por_defecto():
+    batcher = MicroBatcher(lambda ids: threading.Event().wait(5) or {}, window=0.0, timeout=0.05)
+    with pytest.raises(FutureTimeout):
+        batcher.fetch(["a"])
+    batcher.close()
+
+
+def test_reload_reemplaza_y_la_version_vieja_no_vuelve():
+    key = ("test", "reload")
+    old = get_batcher(key, lambda: MicroBatcher(_echo), version="v1")
+    assert get_batcher(key, lambda: MicroBatcher(_echo), version="v1") is old
+
+    new = get_batcher(key, lambda: MicroBatcher(_echo), version="v2")
+    assert new is not old
+    with pytest.raises(BatcherClosed):
+        old.submit(["a"])
+    # una instancia que aún usa la configuración vieja no desplaza a la vigente
+    assert get_batcher(key, lambda: MicroBatcher(_echo), version="v1") is None
+    assert get_batcher(key, lambda: MicroBatcher(_echo), version="v2") is new
+    assert new.fetch(["x"]) == {"x": "X"}
+    new.close()
@@ -0,0 +1,24 @@
+import time
+
+from app.src.playlist_progress import PlaylistProgress
+
+
+def test_playlist_lease_vencido_se_retoma(tmp_path):
+    progress = PlaylistProgress(str(tmp_path / "progress.db"))
+    progress.begin("k", "spotify", "d", 100)
+    assert progress.acquire("k", "a", lease_seconds=30) is None
+    left = progress.acquire("k", "b", lease_seconds=30)
+    assert left is not None and 0 < left <= 30
+
+    assert progress.renew("k", "a", lease_seconds=0.01)
+    time.sleep(0.02)
+    assert progress.acquire("k", "b", lease_seconds=30) is None
+    assert not progress.renew("k", "a", lease_seconds=30)
+
+
+def test_playlist_release_libera_el_lease(tmp_path):
+    progress = PlaylistProgress(str(tmp_path / "progress.db"))
+    progress.begin("k", "spotify", "d", 100)
+    assert progress.acquire("k", "a", lease_seconds=30) is None
+    progress.release("k", "a")
+    assert progress.acquire("k", "b", lease_seconds=30) is None
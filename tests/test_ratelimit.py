@@ -0,0 +1,59 @@
+import threading
+import time
+from email.utils import formatdate
+
+import pytest
+
+from app.src.ratelimit import RateLimited, RateScheduler, TokenBucket, parse_retry_after
+
+
+def test_parse_retry_after_segundos_y_fecha():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(None, default=2.0) == 2.0
+    assert parse_retry_after("basura", default=1.5) == 1.5
+    assert 25 < parse_retry_after(formatdate(time.time() + 30, usegmt=True)) <= 30
+
+
+def test_block_for_aplica_a_todas_las_reservas():
+    bucket = TokenBucket(rate=0, burst=1)
+    assert bucket.reserve() == 0.0
+    bucket.block_for(5)
+    assert 4.9 < bucket.reserve() <= 5
+    bucket.block_for(1)  # un Retry-After menor no acorta el bloqueo vigente
+    assert bucket.reserve() > 4.9
+
+
+def test_429_descarta_si_la_espera_supera_max_wait():
+    scheduler = RateScheduler({"api.test": (10.0, 1.0)}, max_wait=1.0)
+    scheduler.acquire("api.test")
+    scheduler.on_throttled("api.test", 5.0)
+    with pytest.raises(RateLimited) as err:
+        scheduler.acquire("api.test")
+    assert err.value.retry_after > 4.9
+    assert scheduler.stats()["throttled"] == 1
+    assert scheduler.stats()["shed"] == 1
+
+
+def test_descartar_devuelve_el_token():
+    scheduler = RateScheduler({"api.test": (1.0, 1.0)}, max_wait=0.5)
+    bucket = scheduler.bucket("api.test")
+    scheduler.acquire("api.test")
+    for _ in range(3):
+        with pytest.raises(RateLimited):
+            scheduler.acquire("api.test")
+    assert bucket.tokens > -1
+
+
+def test_contadores_no_pierden_incrementos_entre_threads():
+    scheduler = RateScheduler()
+
+    def throttle():
+        for _ in range(1000):
+            scheduler.on_throttled("api.test", 0.0)
+
+    threads = [threading.Thread(target=throttle) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert scheduler.stats()["throttled"] == 8000
@@ -0,0 +1,51 @@
+import asyncio
+
+from app.src.singleflight import SingleFlight
+
+
+def test_seguidor_no_hereda_la_cancelacion_del_lider():
+    flight = SingleFlight()
+    calls = []
+
+    async def slow():
+        calls.append("lider")
+        await asyncio.sleep(10)
+        return "lider"
+
+    async def fast():
+        calls.append("seguidor")
+        return "ok"
+
+    async def main():
+        leader = asyncio.create_task(flight.ado("k", slow))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.ado("k", fast))
+        await asyncio.sleep(0)
+        leader.cancel()
+        result = await follower
+        try:
+            await leader
+        except asyncio.CancelledError:
+            pass
+        return result, leader.cancelled()
+
+    result, cancelled = asyncio.run(main())
+    assert cancelled
+    assert result == "ok"
+    assert calls == ["lider", "seguidor"]
+    assert flight.stats() == {"leaders": 2, "shared": 1, "in_flight": 0}
+
+
+def test_error_del_lider_se_comparte():
+    flight = SingleFlight()
+
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream")
+
+    async def main():
+        return await asyncio.gather(flight.ado("k", boom), flight.ado("k", boom), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flight.stats()["leaders"] == 1